@@ -1,12 +1,7 @@
-import mysql.connector
-
-# Conectar a MySQL
-conexion = mysql.connector.connect(
-    host="localhost",
-    user="root",  # Cambia por tu usuario de MySQL
-    password="123456789",  # Cambia por tu contraseña de MySQL
-    database="bdfenix"  # Cambia por el nombre de tu base de datos
-)
+from conexion_mysql import conectar
+
+# Conectar a MySQL (configuración central en conexion_mysql.py)
+conexion = conectar()
 
 cursor = conexion.cursor()
 print("Conexión exitosa ✅")
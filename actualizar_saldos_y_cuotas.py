@@ -2,25 +2,15 @@
 # Guardar como: actualizar_saldos_y_cuotas.py
 
 from conexion_mysql import conectar
+from fases import marcar_fase # Tiempos por fase (pipeline.py)
+import generar_cuotas # Regeneración de cuotas en el mismo proceso
 import sys
-import subprocess
-import os
 from decimal import Decimal # Para la tolerancia
 
-print("\n--- Script: actualizar_saldos_y_cuotas.py ---")
-print("Actualizando saldos de facturas y regenerando cuotas...")
-
 # --- Configuración ---
-NOMBRE_SCRIPT_GENERAR_CUOTAS = "generar_cuotas.py" # <-- Nombre exacto del script a llamar
 # Tolerancia para considerar una factura como pagada en el UPDATE
 TOLERANCIA_SALDO_UPDATE = Decimal('0.01')
 
-# --- Variables ---
-conexion = None
-cursor = None
-proceso_exitoso_actualizacion = False
-proceso_exitoso_cuotas = False
-
 # --- Consulta SQL para actualizar Facturas ---
 sql_update_facturas = """
 UPDATE facturas f
@@ -43,101 +33,100 @@ SET
                     END;
 """
 
-try:
-    # 1. CONECTAR A DB
-    print("[DB] Conectando a la base de datos...")
-    conexion = conectar()
-    if not conexion:
-        raise Exception("No se pudo conectar a la base de datos.")
-    cursor = conexion.cursor() # No necesitamos dictionary=True para UPDATE
-    print("[OK] Conexión establecida.")
-
-    # 2. EJECUTAR ACTUALIZACIÓN DE FACTURAS
-    print("[DB] Actualizando total_cobrado, pendiente_cobrar y estado_pago en la tabla 'facturas'...")
-    # Pasamos la tolerancia como parámetro
-    cursor.execute(sql_update_facturas, {'tolerancia': TOLERANCIA_SALDO_UPDATE})
-    num_filas_afectadas = cursor.rowcount # MySQL devuelve filas 'matched' no necesariamente 'changed'
-    print(f"[OK] Consulta UPDATE ejecutada. Filas encontradas/afectadas: {num_filas_afectadas}")
-
-    # 3. COMMIT de la actualización de facturas
-    print("[DB] Realizando COMMIT de la actualización de facturas...")
-    conexion.commit()
-    print("(+) Commit realizado.")
-    proceso_exitoso_actualizacion = True
-
-except Exception as e_update:
-    print(f"\n[ERROR] Error durante la actualización de saldos de facturas: {e_update}")
+# --- Lógica Principal ---
+def ejecutar(conexion=None, encadenar_cuotas=True):
+    """
+    Recalcula total_cobrado, pendiente_cobrar y estado_pago de 'facturas' a partir de
+    'pago_conciliados' y, si `encadenar_cuotas`, regenera las cuotas con generar_cuotas.ejecutar().
+    Si se recibe `conexion` (p.ej. desde pipeline.py) se usa y NO se cierra al terminar.
+    Devuelve un dict con 'exito', las filas actualizadas y el resultado de cuotas ('cuotas', o None).
+    """
+    print("\n--- Script: actualizar_saldos_y_cuotas.py ---")
+    print("Actualizando saldos de facturas y regenerando cuotas...")
+
+    conexion_propia = conexion is None
+    cursor = None
     proceso_exitoso_actualizacion = False
-    if conexion:
-        try:
-            print("[DB] Intentando realizar ROLLBACK...")
-            conexion.rollback()
-            print("(-) Rollback realizado.")
-        except Exception as rb_err:
-            print(f"[WARN] Error durante el rollback: {rb_err}")
-
-finally:
-    # Cerrar cursor y conexión temporalmente antes de llamar al subprocess
-    if cursor: cursor.close(); print("[DB] Cursor cerrado.")
-    if conexion and conexion.is_connected(): conexion.close(); print("[DB] Conexión cerrada.")
-
+    num_filas_afectadas = 0
+    resultado_cuotas = None
 
-# 4. LLAMAR AL SCRIPT DE GENERAR CUOTAS (si la actualización fue exitosa)
-if proceso_exitoso_actualizacion:
-    print("\n----------------------------------------------------")
-    print(f">> Ejecutando script de generación de cuotas: '{NOMBRE_SCRIPT_GENERAR_CUOTAS}'...")
-    print("----------------------------------------------------")
-    script_full_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), NOMBRE_SCRIPT_GENERAR_CUOTAS)
-
-    if not os.path.exists(script_full_path):
-        print(f"[ERROR] FATAL: No se encontró el script '{NOMBRE_SCRIPT_GENERAR_CUOTAS}' en {script_full_path}.")
-        proceso_exitoso_cuotas = False
-    else:
+    try:
         try:
-            child_env = os.environ.copy()
-            child_env['PYTHONIOENCODING'] = 'utf-8'
-            resultado_subprocess = subprocess.run(
-                [sys.executable, script_full_path],
-                check=True, # Lanzará excepción si generar_cuotas falla
-                capture_output=True, text=True,
-                encoding='utf-8', errors='replace', env=child_env
-            )
-            print(f"\n--- Salida del Script '{NOMBRE_SCRIPT_GENERAR_CUOTAS}' ---")
-            print(resultado_subprocess.stdout)
-            if resultado_subprocess.stderr:
-                 print(f"\n--- Errores Impresos por '{NOMBRE_SCRIPT_GENERAR_CUOTAS}' ---")
-                 print(resultado_subprocess.stderr)
-            print(f"\n[OK] Script '{NOMBRE_SCRIPT_GENERAR_CUOTAS}' ejecutado exitosamente.")
-            proceso_exitoso_cuotas = True
-
-        except subprocess.CalledProcessError as e:
-            print(f"[ERROR] FATAL: El script '{NOMBRE_SCRIPT_GENERAR_CUOTAS}' falló durante su ejecución.")
-            print(f"   Código de retorno: {e.returncode}")
-            print(f"\n--- Salida de '{NOMBRE_SCRIPT_GENERAR_CUOTAS}' (stdout) ---")
-            print(e.stdout)
-            print(f"\n--- Errores de '{NOMBRE_SCRIPT_GENERAR_CUOTAS}' (stderr) ---")
-            print(e.stderr)
-            proceso_exitoso_cuotas = False
-        except Exception as e_subproc:
-            print(f"[ERROR] FATAL inesperado al intentar ejecutar '{NOMBRE_SCRIPT_GENERAR_CUOTAS}': {e_subproc}")
-            proceso_exitoso_cuotas = False
-
-else:
-    print("\n----------------------------------------------------")
-    print("[WARN] La actualización de saldos de facturas falló.")
-    print(f"   Se OMITE la ejecución del script '{NOMBRE_SCRIPT_GENERAR_CUOTAS}'.")
-    print("----------------------------------------------------")
-    proceso_exitoso_cuotas = False # Marcar como fallo si la actualización previa falló
-
-
-# 5. SALIDA FINAL DEL SCRIPT
-print("\n====================================================")
-if proceso_exitoso_actualizacion and proceso_exitoso_cuotas:
-    print(">>> PROCESO COMPLETO (Actualización Saldos y Regeneración Cuotas) FINALIZADO EXITOSAMENTE <<<")
-    sys.exit(0)
-elif proceso_exitoso_actualizacion and not proceso_exitoso_cuotas:
-    print(">>> PROCESO INCOMPLETO: Saldos de facturas actualizados, pero falló la regeneración de Cuotas. <<<")
-    sys.exit(1)
-else:
-    print(">>> PROCESO FALLIDO: La actualización de saldos de facturas falló. No se regeneraron cuotas. <<<")
-    sys.exit(1)
\ No newline at end of file
+            # 1. CONECTAR A DB
+            if conexion_propia:
+                print("[DB] Conectando a la base de datos...")
+                conexion = conectar()
+                if not conexion:
+                    raise Exception("No se pudo conectar a la base de datos.")
+            cursor = conexion.cursor() # No necesitamos dictionary=True para UPDATE
+            print("[OK] Conexión establecida.")
+
+            # 2. EJECUTAR ACTUALIZACIÓN DE FACTURAS
+            marcar_fase("escritura_bd")
+            print("[DB] Actualizando total_cobrado, pendiente_cobrar y estado_pago en la tabla 'facturas'...")
+            # Pasamos la tolerancia como parámetro
+            cursor.execute(sql_update_facturas, {'tolerancia': TOLERANCIA_SALDO_UPDATE})
+            num_filas_afectadas = cursor.rowcount # MySQL devuelve filas 'matched' no necesariamente 'changed'
+            print(f"[OK] Consulta UPDATE ejecutada. Filas encontradas/afectadas: {num_filas_afectadas}")
+
+            # 3. COMMIT de la actualización de facturas
+            marcar_fase("commit")
+            print("[DB] Realizando COMMIT de la actualización de facturas...")
+            conexion.commit()
+            print("(+) Commit realizado.")
+            proceso_exitoso_actualizacion = True
+
+        except Exception as e_update:
+            print(f"\n[ERROR] Error durante la actualización de saldos de facturas: {e_update}")
+            proceso_exitoso_actualizacion = False
+            if conexion:
+                try:
+                    print("[DB] Intentando realizar ROLLBACK...")
+                    conexion.rollback()
+                    print("(-) Rollback realizado.")
+                except Exception as rb_err:
+                    print(f"[WARN] Error durante el rollback: {rb_err}")
+
+        finally:
+            # La conexión se mantiene abierta para la generación de cuotas
+            if cursor: cursor.close(); print("[DB] Cursor cerrado.")
+
+        # 4. GENERAR CUOTAS EN EL MISMO PROCESO (si la actualización fue exitosa)
+        if encadenar_cuotas and proceso_exitoso_actualizacion:
+            print("\n----------------------------------------------------")
+            print(">> Ejecutando generación de cuotas (generar_cuotas.ejecutar)...")
+            print("----------------------------------------------------")
+            resultado_cuotas = generar_cuotas.ejecutar(conexion)
+        elif encadenar_cuotas:
+            print("\n----------------------------------------------------")
+            print("[WARN] La actualización de saldos de facturas falló.")
+            print("   Se OMITE la generación de cuotas.")
+            print("----------------------------------------------------")
+    finally:
+        if conexion_propia and conexion and conexion.is_connected(): conexion.close(); print("[DB] Conexión cerrada.")
+
+    # 5. RESULTADO DE LA ETAPA
+    proceso_exitoso_cuotas = resultado_cuotas is not None and resultado_cuotas["exito"]
+    print("\n====================================================")
+    if not encadenar_cuotas:
+        exito = proceso_exitoso_actualizacion
+        print(">>> ACTUALIZACIÓN DE SALDOS FINALIZADA " + ("EXITOSAMENTE <<<" if exito else "CON ERRORES <<<"))
+    elif proceso_exitoso_actualizacion and proceso_exitoso_cuotas:
+        exito = True
+        print(">>> PROCESO COMPLETO (Actualización Saldos y Regeneración Cuotas) FINALIZADO EXITOSAMENTE <<<")
+    elif proceso_exitoso_actualizacion:
+        exito = False
+        print(">>> PROCESO INCOMPLETO: Saldos de facturas actualizados, pero falló la regeneración de Cuotas. <<<")
+    else:
+        exito = False
+        print(">>> PROCESO FALLIDO: La actualización de saldos de facturas falló. No se regeneraron cuotas. <<<")
+    return {
+        "exito": exito,
+        "actualizacion_exitosa": proceso_exitoso_actualizacion,
+        "facturas_actualizadas": num_filas_afectadas,
+        "cuotas": resultado_cuotas,
+    }
+
+if __name__ == "__main__":
+    resultado = ejecutar()
+    sys.exit(0 if resultado["exito"] else 1)
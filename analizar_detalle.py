@@ -1,4 +1,4 @@
-import pandas as pd
+import lectura_excel # Lectura de Excel con caché columnar
 
 # --- Configura esto ---
 archivo_excel = "C:/mysql_import/Asiento contable (account.move) - detalle.xlsx" # <-- ¡¡TU RUTA Y NOMBRE EXACTOS!!
@@ -9,7 +9,7 @@ numero_filas_mostrar = 8 # Puedes ajustar cuántas filas de ejemplo quieres ver
 print(f"--- Analizando: {archivo_excel} (Hoja: {nombre_hoja}) ---")
 
 try:
-    df = pd.read_excel(archivo_excel, sheet_name=nombre_hoja, engine="openpyxl")
+    df = lectura_excel.leer_excel(archivo_excel, nombre_hoja)
 
     print("\n1. Nombres de las Columnas:")
     print(df.columns.tolist())
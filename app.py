@@ -1,47 +1,20 @@
 # -*- coding: utf-8 -*-
 # Guardar como: app.py
 
-# Importar session explícitamente si no está
-from flask import Flask, render_template, request, jsonify, flash, redirect, url_for, session
+from flask import Flask, render_template, request, jsonify, flash, redirect, url_for, Response, stream_with_context
 from flask_session import Session
-import subprocess
-import sys
+from pipeline import AVAILABLE_SCRIPTS
+import cola_trabajos
+import historial
+import metricas
+import json
 import os
-# Quitar threading y queue si no los usas
+import time
 
 # --- Configuración ---
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-AVAILABLE_SCRIPTS = {
-    "importar_clientes": {
-        "name": "1. Importar Clientes", # <-- Nombre para el botón
-        "script_path": "importar_cliente.py"  # <-- Nombre exacto del archivo .py
-    },
-    # --- FIN NUEVA ENTRADA ---
-    "importar_facturas": {
-        "name": "2. Importar/Actualizar Facturas (Cabeceras)", # <-- Número actualizado
-        "script_path": "importar_facturas.py"
-    },
-    "importar_detalles": {
-        "name": "3. Importar Detalles de Factura (Líneas)", # <-- Número actualizado
-        "script_path": "importar_detalle_facturas.py"
-    },
-    "importar_pagos": {
-        "name": "4. Importar Pagos (Registros)", # <-- Número actualizado
-        "script_path": "importar_pagos.py"
-    },
-    "importar_conciliaciones": {
-        "name": "5. Importar Aplicaciones de Pago (Conciliaciones)", # <-- Número actualizado
-        "script_path": "importar_conciliaciones.py"
-    },
-    "generar_cuotas": {
-        "name": "6. Generar/Actualizar Cuotas (Depende de Facturas y Pagos)", # <-- Número actualizado
-        "script_path": "generar_cuotas.py"
-    },
-        "actualizar_saldos": {
-        "name": "7. Actualizar saldos y cuotas (Ejecutar después de importar pagos/concil.)",
-        "script_path": "actualizar_saldos_y_cuotas.py"
-    }
-}
+# Las etapas (nombre, script y módulo) se definen en pipeline.py; cola_trabajos.py las ejecuta en
+# segundo plano y las rutas solo encolan y consultan el estado del trabajo
 
 # --- Inicialización de Flask y Flask-Session ---
 app = Flask(__name__)
@@ -51,80 +24,130 @@ app.config["SESSION_PERMANENT"] = False
 app.config["SESSION_USE_SIGNER"] = True
 Session(app)
 
+# --- Funciones Auxiliares ---
+def quiere_json():
+    """True si la petición viene de JavaScript (fetch) en lugar de un formulario."""
+    return request.accept_mimetypes.best == "application/json" or request.headers.get("X-Requested-With") == "XMLHttpRequest"
+
+def responder_encolado(id_trabajo, nuevo, nombre):
+    """Respuesta inmediata al POST: 202 con el id (JSON) o redirección a la página del trabajo."""
+    if quiere_json():
+        return jsonify({"id": id_trabajo, "nuevo": nuevo, "estado_url": url_for('estado_trabajo', id_trabajo=id_trabajo)}), 202
+    if nuevo:
+        flash(f"'{nombre}' quedó en cola.", "info")
+    else:
+        flash(f"'{nombre}' ya estaba en cola o en ejecución; se muestra ese trabajo.", "info")
+    return redirect(url_for('ver_trabajo', id_trabajo=id_trabajo))
+
 # --- Rutas ---
 
+@app.before_request
+def asegurar_despachador():
+    # Idempotente: tras reiniciar el servidor retoma los trabajos que quedaron en cola
+    cola_trabajos.iniciar_despachador()
+
 @app.route('/')
 def index():
-    """Muestra la página principal y los resultados si existen."""
-    # Recuperar resultados de la sesión (si los hay)
-    script_result = session.pop('script_result', None) # pop borra el resultado después de leerlo
-    return render_template('index.html', scripts=AVAILABLE_SCRIPTS, script_result=script_result)
+    """Muestra la página principal con los últimos trabajos (el resultado de cada uno está en /trabajo/<id>)."""
+    return render_template('index.html', scripts=AVAILABLE_SCRIPTS, script_result=None,
+                           trabajos=cola_trabajos.listar_trabajos(10))
 
 @app.route('/run_script', methods=['POST'])
 def run_script_route():
-    """Ejecuta el script y guarda el resultado en la sesión."""
+    """Encola la etapa y vuelve de inmediato; la página del trabajo consulta su estado."""
     script_key = request.form.get('script_key')
 
     if not script_key or script_key not in AVAILABLE_SCRIPTS:
+        if quiere_json():
+            return jsonify({"error": "Script no válido."}), 400
         flash("Error: Script no válido.", "error")
         return redirect(url_for('index'))
 
-    script_info = AVAILABLE_SCRIPTS[script_key]
-    script_name = script_info["name"]
-    script_file = script_info["script_path"]
-    script_full_path = os.path.join(BASE_DIR, script_file)
-
-    if not os.path.exists(script_full_path):
-        flash(f"Error: No se encontró el archivo '{script_file}'.", "error")
+    script_name = AVAILABLE_SCRIPTS[script_key]["name"]
+    id_trabajo, nuevo = cola_trabajos.encolar([script_key], script_name)
+    print(f"--- Encolado: {script_name} (trabajo {id_trabajo}{'' if nuevo else ', ya existente'}) ---")
+    return responder_encolado(id_trabajo, nuevo, script_name)
+
+@app.route('/run_all', methods=['POST'])
+def run_all_route():
+    """Encola la secuencia completa 1-7; las etapas independientes corren a la vez (pipeline.ejecutar_en_paralelo)."""
+    nombre = "Secuencia completa (1-7)"
+    id_trabajo, nuevo = cola_trabajos.encolar(list(AVAILABLE_SCRIPTS), nombre, paralelo=True)
+    print(f"--- Encolado: {nombre} (trabajo {id_trabajo}{'' if nuevo else ', ya existente'}) ---")
+    return responder_encolado(id_trabajo, nuevo, nombre)
+
+@app.route('/trabajos')
+def lista_trabajos():
+    """Últimos trabajos en JSON (sin la salida completa)."""
+    trabajos = cola_trabajos.listar_trabajos(request.args.get('limite', 20, type=int))
+    return jsonify([{clave: valor for clave, valor in trabajo.items() if clave not in ("salida", "error")} for trabajo in trabajos])
+
+@app.route('/trabajos/<id_trabajo>')
+def estado_trabajo(id_trabajo):
+    """Estado de un trabajo en JSON; lo consulta periódicamente la página del trabajo."""
+    trabajo = cola_trabajos.obtener_trabajo(id_trabajo)
+    if not trabajo:
+        return jsonify({"error": "Trabajo no encontrado."}), 404
+    return jsonify(trabajo)
+
+@app.route('/trabajos/<id_trabajo>/salida')
+def salida_trabajo(id_trabajo):
+    """
+    Salida del trabajo en vivo como Server-Sent Events: un evento por línea con su número como id
+    (EventSource reconecta con Last-Event-ID y sigue donde quedó), 'descartadas' si se perdieron
+    líneas del búfer circular y 'fin' con el estado final del trabajo.
+    """
+    if not cola_trabajos.obtener_trabajo(id_trabajo):
+        return jsonify({"error": "Trabajo no encontrado."}), 404
+    ultimo = request.headers.get('Last-Event-ID', type=int)
+    desde = ultimo + 1 if ultimo is not None else request.args.get('desde', 0, type=int)
+
+    def eventos():
+        esperada = desde
+        for numero, linea in cola_trabajos.seguir_salida(id_trabajo, desde):
+            if numero is None:
+                yield ": latido\n\n" # Mantiene viva la conexión (y detecta si el navegador se fue)
+                continue
+            if numero > esperada:
+                yield f"event: descartadas\ndata: {numero - esperada}\n\n"
+            esperada = numero + 1
+            yield f"id: {numero}\ndata: {linea}\n\n"
+        trabajo = cola_trabajos.obtener_trabajo(id_trabajo)
+        fin = {"estado": trabajo["estado"], "exito": trabajo["exito"]} if trabajo else {}
+        yield f"event: fin\ndata: {json.dumps(fin)}\n\n"
+
+    return Response(stream_with_context(eventos()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/trabajo/<id_trabajo>')
+def ver_trabajo(id_trabajo):
+    """Página del trabajo: muestra su estado y se actualiza sola hasta que termina."""
+    trabajo = cola_trabajos.obtener_trabajo(id_trabajo)
+    if not trabajo:
+        flash("Error: Trabajo no encontrado.", "error")
         return redirect(url_for('index'))
-
-    print(f"--- Ejecutando: {script_name} ({script_file}) ---")
-    flash(f"Iniciando ejecución de: {script_name}...", "info") # Flash corto sí funciona
-
-    result_data = {
-        "script_name": script_name,
-        "stdout": "(No se ejecutó)",
-        "stderr": "",
-        "returncode": -1,
-        "success": False
-    }
-
-    try:
-        child_env = os.environ.copy()
-        child_env['PYTHONIOENCODING'] = 'utf-8'
-        process = subprocess.run(
-            [sys.executable, script_full_path],
-            check=False, capture_output=True, text=True,
-            encoding='utf-8', errors='replace', env=child_env
-        )
-
-        # Guardar toda la info del resultado
-        result_data["stdout"] = process.stdout if process.stdout else "(Sin salida estándar)"
-        result_data["stderr"] = process.stderr if process.stderr else ""
-        result_data["returncode"] = process.returncode
-        result_data["success"] = (process.returncode == 0)
-
-        # Imprimir en consola Flask para depuración
-        print(f"--- Salida de {script_file} ---")
-        print(result_data["stdout"])
-        if result_data["stderr"]: print(f"--- Errores de {script_file} ---\n{result_data['stderr']}")
-        print(f"--- Código de retorno: {result_data['returncode']} ---")
-
-    except Exception as e:
-        print(f"[ERROR] Excepción al ejecutar subproceso para '{script_file}': {e}")
-        result_data["stderr"] = f"Error interno del servidor al ejecutar el script: {e}"
-        result_data["success"] = False
-
-    # --- CAMBIO: Guardar resultado en sesión en lugar de flash ---
-    session['script_result'] = result_data
-    # Añadir un flash corto para indicar finalización
-    if result_data["success"]:
-        flash(f"'{script_name}' finalizó.", "success")
-    else:
-        flash(f"'{script_name}' finalizó con errores.", "error")
-    # -----------------------------------------------------------
-
-    return redirect(url_for('index')) # Redirige a la misma página principal
+    return render_template('trabajo.html', trabajo=trabajo)
+
+@app.route('/historial.json')
+def historial_json():
+    """Corridas de etapas (más recientes primero). Filtros: ?clave=, ?dias=, ?limite=."""
+    dias = request.args.get('dias', type=int)
+    corridas = historial.listar_corridas(request.args.get('clave') or None,
+                                         request.args.get('limite', historial.LIMITE_DEFECTO, type=int),
+                                         desde=time.time() - dias * 86400 if dias else None)
+    return jsonify(corridas)
+
+@app.route('/historial')
+def ver_historial():
+    """Tabla de corridas con tiempos por fase y gráfico de rendimiento (filas/s) por etapa."""
+    clave = request.args.get('clave') or None
+    corridas = historial.listar_corridas(clave, request.args.get('limite', historial.LIMITE_DEFECTO, type=int))
+    return render_template('historial.html', corridas=corridas, scripts=AVAILABLE_SCRIPTS, clave=clave)
+
+@app.route('/metrics')
+def metrics():
+    """Métricas por etapa en formato de texto de Prometheus (ver metricas.py)."""
+    return Response(metricas.generar_metricas(), mimetype='text/plain; version=0.0.4; charset=utf-8')
 
 # --- Ejecutar la aplicación ---
 if __name__ == '__main__':
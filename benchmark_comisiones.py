@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+# Guardar como: benchmark_comisiones.py
+
+# Compara el bucle antiguo de calcular_comisiones (búsqueda lineal de la conciliación y
+# reordenamiento de cuotas por cada registro del historial) contra motor_comisiones.py
+# (índices precalculados) sobre datos sintéticos, y verifica que ambos generan las mismas
+# comisiones. También compara la búsqueda de la tasa por antigüedad: recorrido lineal de
+# las reglas contra bisect y numpy.searchsorted sobre la tabla compilada.
+# Uso: python benchmark_comisiones.py [num_facturas]
+
+import copy
+import random
+import sys
+import time
+from datetime import date, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+import numpy as np
+
+from motor_comisiones import (compilar_reglas, buscar_tasa_comision, buscar_tasas_comision,
+                              indexar_conciliaciones, indexar_cuotas, calcular_aplicaciones)
+
+# --- Configuración ---
+NUM_FACTURAS = 10000
+SEMILLA = 42
+NUM_BUSQUEDAS = 200_000
+FECHA_INICIO_QUINCENA = date(2025, 4, 16)
+REGLAS_COMISION = [
+    {'dias_desde': None, 'dias_hasta': 0, 'porcentaje': Decimal('0.05'), 'descripcion': 'Al día'},
+    {'dias_desde': 1, 'dias_hasta': 30, 'porcentaje': Decimal('0.03'), 'descripcion': '1 a 30 días'},
+    {'dias_desde': 31, 'dias_hasta': 60, 'porcentaje': Decimal('0.01'), 'descripcion': '31 a 60 días'},
+    {'dias_desde': 61, 'dias_hasta': None, 'porcentaje': Decimal('0'), 'descripcion': 'Más de 60 días'},
+]
+
+# --- Versión antigua (copiada de reporte_comisiones.py) ---
+def buscar_tasa_lineal(dias_vencido, reglas_comision):
+    for regla in reglas_comision:
+        dias_desde = regla['dias_desde'] if regla['dias_desde'] is not None else -float('inf')
+        dias_hasta = regla['dias_hasta'] if regla['dias_hasta'] is not None else float('inf')
+        if dias_desde <= dias_vencido <= dias_hasta:
+            return regla['porcentaje'], regla.get('descripcion', f"{dias_desde} a {dias_hasta} días")
+    print(f"ADVERTENCIA: No se encontró regla de comisión aplicable para {dias_vencido} días. Verifique la tabla 'comision_por_antiguedad'. Se asignará 0%.")
+    return Decimal(0), "Sin Regla Aplicable"
+
+def calcular_antiguo(historial_conciliaciones, cuotas_list, conciliaciones, pagos_dict, ids_pagos_periodo, reglas_comision):
+    resultados_comision = []
+    cuotas_por_factura = {}
+    for c in cuotas_list:
+        id_factura = c['id_factura']
+        if id_factura not in cuotas_por_factura: cuotas_por_factura[id_factura] = {}
+        c['pendiente_actual'] = Decimal(c['monto_cuota'] or '0.0')
+        c['monto_cuota'] = Decimal(c['monto_cuota'] or '0.0')
+        cuotas_por_factura[id_factura][c['nro_cuota']] = c
+
+    for pago_info in historial_conciliaciones:
+        id_pago_hist = pago_info['id_pago']
+        id_factura_hist = pago_info['id_factura']
+        monto_aplicado_hist = Decimal(pago_info['monto_aplicado'] or '0.0')
+        fecha_pago_hist = pago_info['fecha_pago']
+        if monto_aplicado_hist <= 0: continue
+        if id_factura_hist not in cuotas_por_factura: continue
+        cuotas_factura_actual = sorted(cuotas_por_factura[id_factura_hist].values(), key=lambda x: x['nro_cuota'])
+        monto_restante_pago = monto_aplicado_hist
+        for cuota in cuotas_factura_actual:
+            if monto_restante_pago <= 0: break
+            pendiente_cuota = cuota['pendiente_actual']
+            if pendiente_cuota > 0:
+                monto_a_aplicar_a_cuota = min(monto_restante_pago, pendiente_cuota)
+                if id_pago_hist in ids_pagos_periodo:
+                    conciliacion_actual = next((c for c in conciliaciones if c['id_pago'] == id_pago_hist and c['id_factura'] == id_factura_hist), None)
+                    if not conciliacion_actual: continue
+                    fecha_vencimiento_cuota = cuota['fecha_vencimiento']
+                    dias_vencido = (fecha_pago_hist - fecha_vencimiento_cuota).days
+                    porcentaje_comision, desc_rango = buscar_tasa_lineal(dias_vencido, reglas_comision)
+                    comision_generada = Decimal(0)
+                    if porcentaje_comision > 0: comision_generada = (monto_a_aplicar_a_cuota * porcentaje_comision).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+                    resultados_comision.append({
+                        'ID Vendedor': conciliacion_actual['id_vendedor'], 'ID Cliente': conciliacion_actual['id_cliente_factura'],
+                        'ID Pago': id_pago_hist, 'Fecha Pago': fecha_pago_hist,
+                        'Monto Total Pago': pagos_dict[id_pago_hist]['monto_total_pago'],
+                        'ID Factura': id_factura_hist, 'Numero Factura': conciliacion_actual['num_factura'],
+                        'Nro Cuota': cuota['nro_cuota'], 'Fecha Vencimiento Cuota': fecha_vencimiento_cuota,
+                        'Monto Total Cuota': cuota['monto_cuota'], 'Monto Aplicado a Cuota': monto_a_aplicar_a_cuota,
+                        'Dias Vencido al Pago': dias_vencido, 'Rango Comision Aplicado': desc_rango,
+                        'Porcentaje Comision': porcentaje_comision, 'Comision Generada': comision_generada,
+                        'ID Conciliacion': conciliacion_actual['id_conciliacion']
+                    })
+                cuota['pendiente_actual'] -= monto_a_aplicar_a_cuota
+                monto_restante_pago -= monto_a_aplicar_a_cuota
+    return resultados_comision
+
+# --- Funciones Auxiliares ---
+def generar_datos(num_facturas, generador):
+    """Facturas con 1-4 cuotas y varios pagos parciales cada una; ~1/3 de los pagos cae en una quincena con mucho movimiento."""
+    cuotas_list, historial, conciliaciones, pagos_dict = [], [], [], {}
+    id_cuota = id_pago = id_conciliacion = 0
+    for id_factura in range(1, num_facturas + 1):
+        emision = FECHA_INICIO_QUINCENA - timedelta(days=generador.randint(10, 180))
+        total = Decimal(0)
+        for nro_cuota in range(1, generador.randint(1, 4) + 1):
+            id_cuota += 1
+            monto = Decimal(generador.randint(1000, 500000)) / 100
+            total += monto
+            cuotas_list.append({'id': id_cuota, 'id_factura': id_factura, 'nro_cuota': nro_cuota,
+                                'fecha_vencimiento': emision + timedelta(days=30 * nro_cuota),
+                                'monto_cuota': str(monto), 'pendiente_cobrar': str(monto)})
+        for _ in range(generador.randint(1, 5)):
+            id_pago += 1
+            id_conciliacion += 1
+            monto = (total * Decimal(generador.randint(10, 60)) / 100).quantize(Decimal('0.01'))
+            fecha = FECHA_INICIO_QUINCENA + timedelta(days=generador.randint(-30, 14))
+            pagos_dict[id_pago] = {'fecha_pago': fecha, 'monto_total_pago': monto}
+            historial.append({'id_pago': id_pago, 'id_factura': id_factura, 'monto_aplicado': str(monto), 'fecha_pago': fecha})
+            if fecha >= FECHA_INICIO_QUINCENA:
+                conciliaciones.append({'id_conciliacion': id_conciliacion, 'id_pago': id_pago, 'id_factura': id_factura,
+                                       'monto_aplicado': str(monto), 'fecha_aplicacion': fecha, 'id_vendedor': generador.randint(1, 20),
+                                       'num_factura': f"NV-{id_factura:06d}", 'id_cliente_factura': generador.randint(1, 900)})
+    historial.sort(key=lambda h: (h['fecha_pago'], h['id_pago']))
+    ids_pagos_periodo = {c['id_pago'] for c in conciliaciones}
+    pagos_dict = {id_pago: datos for id_pago, datos in pagos_dict.items() if id_pago in ids_pagos_periodo}
+    return cuotas_list, historial, conciliaciones, pagos_dict, ids_pagos_periodo
+
+def medir(descripcion, funcion):
+    inicio = time.perf_counter()
+    resultado = funcion()
+    duracion = time.perf_counter() - inicio
+    print(f"  {descripcion:<45} {duracion:8.3f} s")
+    return resultado, duracion
+
+# --- Lógica Principal ---
+if __name__ == "__main__":
+    num_facturas = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_FACTURAS
+    cuotas_list, historial, conciliaciones, pagos_dict, ids_pagos_periodo = generar_datos(num_facturas, random.Random(SEMILLA))
+    print(f"[INFO] {num_facturas} facturas, {len(cuotas_list)} cuotas, {len(historial)} registros de historial, "
+          f"{len(conciliaciones)} conciliaciones del período.\n")
+
+    print("[INFO] Cálculo de comisiones:")
+    viejo, t_viejo = medir("Bucle antiguo (búsqueda lineal)", lambda: calcular_antiguo(
+        historial, copy.deepcopy(cuotas_list), conciliaciones, pagos_dict, ids_pagos_periodo, REGLAS_COMISION))
+    def nuevo_motor():
+        cuotas_por_factura = indexar_cuotas(copy.deepcopy(cuotas_list))
+        return calcular_aplicaciones(historial, cuotas_por_factura, indexar_conciliaciones(conciliaciones),
+                                     pagos_dict, ids_pagos_periodo, compilar_reglas(REGLAS_COMISION))
+    nuevo, t_nuevo = medir("motor_comisiones (índices)", nuevo_motor)
+    print(f"  Aceleración: x{t_viejo / t_nuevo:.1f}")
+
+    todo_ok = viejo == nuevo
+    if todo_ok: print(f"[OK] Resultados idénticos ({len(nuevo)} registros de comisión).")
+    else: print(f"[ERROR] Hay diferencias entre la versión antigua ({len(viejo)}) y la nueva ({len(nuevo)}).")
+
+    print("\n[INFO] Búsqueda de tasa por antigüedad:")
+    tabla = compilar_reglas(REGLAS_COMISION)
+    dias = [random.Random(SEMILLA).randint(-60, 200) for _ in range(NUM_BUSQUEDAS)]
+    viejo, t_viejo = medir("Recorrido lineal de reglas", lambda: [buscar_tasa_lineal(d, REGLAS_COMISION) for d in dias])
+    nuevo, t_nuevo = medir("bisect (tabla compilada)", lambda: [buscar_tasa_comision(d, tabla) for d in dias])
+    vector, t_vector = medir("numpy.searchsorted (columna completa)", lambda: buscar_tasas_comision(np.array(dias), tabla))
+    print(f"  Aceleración bisect: x{t_viejo / t_nuevo:.1f} | searchsorted: x{t_viejo / t_vector:.1f}")
+    iguales = viejo == nuevo == list(zip(*vector))
+    todo_ok &= iguales
+    print("[OK] Tasas idénticas." if iguales else "[ERROR] Las tasas no coinciden.")
+
+    print()
+    if todo_ok:
+        print("[OK] Resultados idénticos entre la versión antigua y la nueva.")
+    else:
+        print("[ERROR] Hay diferencias entre la versión antigua y la nueva.")
+        sys.exit(1)
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+# Guardar como: benchmark_limpieza.py
+
+# Compara la limpieza antigua (funciones escalares con Series.apply) contra el módulo
+# vectorizado limpieza.py sobre columnas sintéticas de 500.000 celdas, y verifica que
+# ambos caminos producen los mismos valores.
+# Uso: python benchmark_limpieza.py [num_celdas]
+
+import sys
+import time
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+import numpy as np
+import pandas as pd
+
+from limpieza import limpiar_numero, limpiar_entero, limpiar_monto_escalado, escalado_a_texto
+
+# --- Configuración ---
+NUM_CELDAS = 500_000
+SEMILLA = 42
+
+# --- Versiones antiguas (copiadas de los scripts de importación) ---
+def limpiar_float(valor):
+    try:
+        if pd.isna(valor) or str(valor).strip().lower() in ["<na>", "nan", "none", "", "#n/a"]: return 0.0
+        return float(str(valor).replace(',', '.'))
+    except (ValueError, TypeError): return 0.0
+
+def limpiar_decimal(valor):
+    if pd.isna(valor): return Decimal('0.0')
+    try:
+        valor_str = str(valor).replace(',', '.').strip()
+        if valor_str.lower() in ["<na>", "nan", "none", "", "#n/a", "false"]: return Decimal('0.0')
+        dec_valor = Decimal(valor_str)
+        if not dec_valor.is_finite(): return Decimal('0.0')
+        return dec_valor
+    except (InvalidOperation, ValueError, TypeError): return Decimal('0.0')
+
+def limpiar_int(valor):
+    if pd.isna(valor): return None
+    try: return int(float(str(valor).replace(',', '.')))
+    except (ValueError, TypeError): return None
+
+# --- Funciones Auxiliares ---
+def generar_columna(num_celdas, generador):
+    """Columna de texto como la leída con dtype=str: montos con coma o punto, vacíos y basura."""
+    montos = generador.uniform(-100000, 100000, num_celdas).round(3)
+    texto = pd.Series(montos.astype(str))
+    con_coma = generador.random(num_celdas) < 0.3
+    texto[con_coma] = texto[con_coma].str.replace('.', ',', regex=False)
+    sorteo = generador.random(num_celdas)
+    texto[sorteo < 0.05] = None
+    texto[(sorteo >= 0.05) & (sorteo < 0.07)] = 'nan'
+    texto[(sorteo >= 0.07) & (sorteo < 0.08)] = '#N/A'
+    texto[(sorteo >= 0.08) & (sorteo < 0.09)] = 'abc'
+    return texto.astype(object)
+
+def medir(descripcion, funcion):
+    inicio = time.perf_counter()
+    resultado = funcion()
+    duracion = time.perf_counter() - inicio
+    print(f"  {descripcion:<45} {duracion:8.3f} s")
+    return resultado, duracion
+
+def comparar(nombre, antiguo, nuevo):
+    diferencias = int((antiguo != nuevo).sum())
+    estado = "[OK]" if diferencias == 0 else "[ERROR]"
+    print(f"{estado} {nombre}: {diferencias} diferencias")
+    return diferencias == 0
+
+# --- Lógica Principal ---
+if __name__ == "__main__":
+    num_celdas = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_CELDAS
+    generador = np.random.default_rng(SEMILLA)
+    columna = generar_columna(num_celdas, generador)
+    columna_ids = pd.Series(generador.integers(1, 10_000_000, num_celdas).astype(str)).where(generador.random(num_celdas) > 0.05)
+    print(f"[INFO] Columnas de {num_celdas} celdas generadas.\n")
+
+    todo_ok = True
+
+    print("[INFO] Números (limpiar_float):")
+    viejo, t_viejo = medir("apply(limpiar_float)", lambda: columna.apply(limpiar_float))
+    nuevo, t_nuevo = medir("limpiar_numero", lambda: limpiar_numero(columna))
+    print(f"  Aceleración: x{t_viejo / t_nuevo:.1f}")
+    iguales = np.isclose(viejo.astype('float64'), nuevo)
+    # 'abc' y 'false' caen a 0 en ambos; los NaN textuales también
+    todo_ok &= comparar("limpiar_numero", pd.Series(~iguales), pd.Series(False, index=columna.index))
+
+    print("\n[INFO] Montos en centavos (limpiar_decimal + quantize):")
+    def antiguo_centavos():
+        return columna.apply(limpiar_decimal).apply(lambda d: str(d.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)))
+    viejo, t_viejo = medir("apply(limpiar_decimal) + quantize", antiguo_centavos)
+    nuevo, t_nuevo = medir("limpiar_monto_escalado + escalado_a_texto", lambda: escalado_a_texto(limpiar_monto_escalado(columna)))
+    print(f"  Aceleración: x{t_viejo / t_nuevo:.1f}")
+    # Decimal('-0.00') se imprime con signo; el valor es el mismo
+    todo_ok &= comparar("limpiar_monto_escalado", viejo.str.replace('-0.00', '0.00', regex=False), nuevo)
+
+    print("\n[INFO] IDs (limpiar_int):")
+    viejo, t_viejo = medir("apply(limpiar_int)", lambda: columna_ids.apply(limpiar_int))
+    nuevo, t_nuevo = medir("limpiar_entero", lambda: limpiar_entero(columna_ids))
+    print(f"  Aceleración: x{t_viejo / t_nuevo:.1f}")
+    nuevo_obj = nuevo.astype(object).where(nuevo.notna(), None)
+    todo_ok &= comparar("limpiar_entero", viejo.fillna(-1).astype('int64'), nuevo_obj.fillna(-1).astype('int64'))
+
+    print()
+    if todo_ok:
+        print("[OK] Resultados idénticos entre la versión antigua y la vectorizada.")
+    else:
+        print("[ERROR] Hay diferencias entre la versión antigua y la vectorizada.")
+        sys.exit(1)
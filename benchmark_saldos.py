@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# Guardar como: benchmark_saldos.py
+
+# Compara el reparto antiguo de pagos sobre cuotas a fecha de corte (bucle con Decimal por
+# cuota, copiado de los reportes de cuotas pendientes) contra saldos_cuotas.saldos_a_fecha()
+# (vectorizado sobre centavos enteros) con datos sintéticos, y verifica que ambos listan las
+# mismas cuotas pendientes con los mismos montos y totales.
+# Uso: python benchmark_saldos.py [num_facturas]
+
+import random
+import sys
+import time
+from decimal import Decimal
+
+import pandas as pd
+
+from saldos_cuotas import saldos_a_fecha, a_reporte
+
+# --- Configuración ---
+NUM_FACTURAS = 100_000
+SEMILLA = 42
+TOLERANCIA_PENDIENTE = Decimal('0.01')
+
+# --- Versión antigua (copiada de reporte_cuotas_pendiente_fechas.py) ---
+def calcular_antiguo(todas_las_cuotas, pagos_por_factura):
+    resultados_pendientes = []
+    current_factura_id = None
+    monto_pagado_factura_a_distribuir = Decimal('0.0')
+    cuotas_factura_actual = []
+
+    def procesar(cuotas_factura, restante_a_aplicar):
+        for c_proc in cuotas_factura:
+            monto_cuota_actual = max(Decimal('0.0'), Decimal(c_proc['monto_cuota'] or 0))
+            pagado_esta_cuota = max(Decimal('0.0'), min(monto_cuota_actual, restante_a_aplicar))
+            pendiente_esta_cuota = max(Decimal('0.0'), monto_cuota_actual - pagado_esta_cuota)
+            if pendiente_esta_cuota <= TOLERANCIA_PENDIENTE:
+                pendiente_esta_cuota = Decimal('0.0')
+                pagado_esta_cuota = monto_cuota_actual
+            restante_a_aplicar = max(Decimal('0.0'), restante_a_aplicar - pagado_esta_cuota)
+            if pendiente_esta_cuota > Decimal('0.0'):
+                resultados_pendientes.append((c_proc['id_factura'], c_proc['nro_cuota'], monto_cuota_actual, pagado_esta_cuota, pendiente_esta_cuota))
+
+    for cuota in todas_las_cuotas:
+        factura_id = cuota['id_factura']
+        if factura_id != current_factura_id and current_factura_id is not None:
+            procesar(cuotas_factura_actual, monto_pagado_factura_a_distribuir)
+            cuotas_factura_actual = []
+        if factura_id != current_factura_id:
+            current_factura_id = factura_id
+            monto_pagado_factura_a_distribuir = pagos_por_factura.get(current_factura_id, Decimal('0.0'))
+        cuotas_factura_actual.append(cuota)
+    if current_factura_id is not None and cuotas_factura_actual:
+        procesar(cuotas_factura_actual, monto_pagado_factura_a_distribuir)
+    return resultados_pendientes
+
+# --- Funciones Auxiliares ---
+def generar_datos(num_facturas, generador):
+    """Facturas de 1-6 cuotas (algunas en cero o NULL) con pagos parciales, totales, excedentes o negativos."""
+    cuotas, pagos = [], {}
+    for id_factura in range(1, num_facturas + 1):
+        total = Decimal(0)
+        for nro_cuota in range(1, generador.randint(1, 6) + 1):
+            sorteo = generador.random()
+            monto = None if sorteo < 0.02 else Decimal(0) if sorteo < 0.04 else Decimal(generador.randint(100, 500000)) / 100
+            total += monto or 0
+            cuotas.append({'id_factura': id_factura, 'nro_cuota': nro_cuota, 'monto_cuota': monto})
+        sorteo = generador.random()
+        if sorteo < 0.3: continue # Sin pagos
+        elif sorteo < 0.35: pagos[id_factura] = Decimal(-generador.randint(1, 1000)) / 100
+        elif sorteo < 0.45: pagos[id_factura] = total - Decimal('0.01') # Cuota final con saldo en la tolerancia
+        else: pagos[id_factura] = (total * Decimal(generador.randint(0, 130)) / 100).quantize(Decimal('0.01'))
+    return cuotas, pagos
+
+def medir(descripcion, funcion):
+    inicio = time.perf_counter()
+    resultado = funcion()
+    duracion = time.perf_counter() - inicio
+    print(f"  {descripcion:<45} {duracion:8.3f} s")
+    return resultado, duracion
+
+# --- Lógica Principal ---
+if __name__ == "__main__":
+    num_facturas = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_FACTURAS
+    cuotas, pagos = generar_datos(num_facturas, random.Random(SEMILLA))
+    df_cuotas = pd.DataFrame(cuotas)
+    print(f"[INFO] {num_facturas} facturas, {len(cuotas)} cuotas, {len(pagos)} facturas con pagos.\n")
+
+    viejo, t_viejo = medir("Bucle antiguo (Decimal por cuota)", lambda: calcular_antiguo(cuotas, pagos))
+    def vectorizado():
+        df = saldos_a_fecha(df_cuotas, pagos)
+        return df[df['pendiente']]
+    nuevo, t_nuevo = medir("saldos_a_fecha (centavos vectorizado)", vectorizado)
+    print(f"  Aceleración: x{t_viejo / t_nuevo:.1f}")
+
+    filas_nuevas = [(f, n, Decimal(str(m)), Decimal(str(p)), Decimal(str(s))) for f, n, m, p, s in
+                    nuevo[['id_factura', 'nro_cuota', 'monto_cuota', 'monto_pagado', 'monto_pendiente']].itertuples(index=False)]
+    _, totales = a_reporte(nuevo)
+    totales_viejos = [sum((fila[i] for fila in viejo), Decimal('0.0')) for i in (2, 3, 4)]
+    todo_ok = viejo == filas_nuevas and totales_viejos == [totales['total_monto_cuota'], totales['total_monto_pagado'], totales['total_monto_pendiente']]
+
+    print()
+    if todo_ok:
+        print(f"[OK] Resultados idénticos ({len(viejo)} cuotas pendientes, pendiente total {totales['total_monto_pendiente']}).")
+    else:
+        print(f"[ERROR] Hay diferencias entre la versión antigua ({len(viejo)}) y la nueva ({len(filas_nuevas)}).")
+        sys.exit(1)
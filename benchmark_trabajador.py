@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+# Guardar como: benchmark_trabajador.py
+
+# Mide la latencia de arranque de un trabajo de app.py: con un trabajador recién lanzado
+# (intérprete nuevo que importa pandas, numpy, openpyxl, mysql.connector y las etapas, lo que
+# pagaba cada botón cuando se lanzaba un proceso por trabajo) contra un trabajador caliente de
+# cola_trabajos.py ya precargado (módulos, pool de MySQL y pool de procesos de etapas).
+# Se miden tres trabajos: uno sin etapas (costo fijo por paso), la etapa importar_clientes
+# en secuencia (importa su módulo y conecta) y la misma etapa en paralelo (como /run_all, en
+# el pool de procesos de etapas). Sin MySQL o sin el Excel la etapa falla al conectar o leer,
+# pero el costo de importar y arrancar se mide igual. Usa una base trabajos.db temporal.
+# Uso: python benchmark_trabajador.py [repeticiones]
+
+import os
+import sys
+import tempfile
+import json
+import time
+import uuid
+
+# --- Configuración ---
+REPETICIONES = 5
+TRABAJOS = [ # (descripción, etapas, paralelo)
+    ("Trabajo sin etapas", [], 0),
+    ("Etapa importar_clientes", ["importar_clientes"], 0),
+    ("Etapa importar_clientes en paralelo", ["importar_clientes"], 1),
+]
+os.environ["IMPORTAR_ODOO_TRABAJOS"] = os.path.join(tempfile.mkdtemp(prefix="benchmark_trabajos_"), "trabajos.db")
+
+import cola_trabajos
+from cola_trabajos import Trabajador, SalidaTrabajo, conectar_bd, EN_CURSO
+
+# --- Funciones Auxiliares ---
+def crear_trabajo(claves, paralelo):
+    """Inserta un trabajo ya 'en_curso' (como lo deja el despachador al reclamarlo)."""
+    id_trabajo = uuid.uuid4().hex
+    conexion = conectar_bd()
+    try:
+        conexion.execute("INSERT INTO trabajos (id, nombre, claves, paralelo, estado, creado, iniciado) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         (id_trabajo, "benchmark", json.dumps(claves), paralelo, EN_CURSO, time.time(), time.time()))
+    finally:
+        conexion.close()
+    return id_trabajo
+
+def medir_trabajo(trabajador, claves, paralelo):
+    """Segundos desde que se asigna el trabajo hasta que el trabajador marca su fin."""
+    salida = SalidaTrabajo()
+    inicio = time.perf_counter()
+    trabajador.asignar(crear_trabajo(claves, paralelo), salida)
+    while not salida.leer(salida.total, espera=1)[2]: pass
+    duracion = time.perf_counter() - inicio
+    trabajador.liberar()
+    return duracion
+
+# --- Lógica Principal ---
+if __name__ == "__main__":
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else REPETICIONES
+    print(f"[INFO] {repeticiones} trabajos por modo. Base temporal: {cola_trabajos.RUTA_BD_TRABAJOS}\n")
+
+    caliente = Trabajador()
+    caliente.listo.wait()
+    for descripcion, claves, paralelo in TRABAJOS:
+        frios = []
+        for _ in range(repeticiones):
+            trabajador = Trabajador()
+            frios.append(medir_trabajo(trabajador, claves, paralelo))
+            trabajador.detener()
+            trabajador.proceso.wait()
+        calientes = [medir_trabajo(caliente, claves, paralelo) for _ in range(repeticiones)]
+
+        promedio_frio, promedio_caliente = sum(frios) / len(frios), sum(calientes) / len(calientes)
+        print(f"[INFO] {descripcion}:")
+        print(f"  {'Proceso nuevo por trabajo':<40} {promedio_frio:8.3f} s (promedio)")
+        print(f"  {'Trabajador caliente (precargado)':<40} {promedio_caliente:8.3f} s (promedio)")
+        print(f"  Aceleración: x{promedio_frio / promedio_caliente:.1f}\n")
+    caliente.detener()
+    caliente.proceso.wait()
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+# Guardar como: carga_masiva.py
+
+# Utilidades de escritura masiva compartidas por los scripts de importación.
+# En lugar de un SELECT + INSERT/UPDATE por fila, las filas ya preparadas se
+# envían en bloques multi-fila y se fusionan en la tabla destino con pocas sentencias.
+
+# --- Configuración ---
+TAM_LOTE_DEFECTO = 1000 # Filas por sentencia INSERT multi-fila (ajustar según max_allowed_packet)
+
+# --- Funciones Auxiliares ---
+def _primer_valor(fila):
+    """Devuelve la primera columna de una fila (cursor normal o dictionary=True)."""
+    if fila is None: return None
+    if isinstance(fila, dict): return next(iter(fila.values()), None)
+    return fila[0]
+
+def dividir_en_lotes(filas, tam_lote=TAM_LOTE_DEFECTO):
+    """Divide una lista en bloques de tamaño `tam_lote`."""
+    for inicio in range(0, len(filas), tam_lote):
+        yield filas[inicio:inicio + tam_lote]
+
+def insertar_por_lotes(cursor, tabla, columnas, filas, tam_lote=TAM_LOTE_DEFECTO, sufijo_sql=""):
+    """
+    Inserta `filas` (lista de tuplas en el orden de `columnas`) con sentencias
+    INSERT multi-fila. `sufijo_sql` permite añadir p.ej. 'ON DUPLICATE KEY UPDATE ...'.
+    Devuelve el número de filas enviadas.
+    """
+    if not filas: return 0
+    columnas_sql = ', '.join(columnas)
+    placeholders_fila = '(' + ', '.join(['%s'] * len(columnas)) + ')'
+    enviadas = 0
+    for lote in dividir_en_lotes(filas, tam_lote):
+        sql = f"INSERT INTO {tabla} ({columnas_sql}) VALUES {', '.join([placeholders_fila] * len(lote))} {sufijo_sql}"
+        valores = [valor for fila in lote for valor in fila]
+        cursor.execute(sql, valores)
+        enviadas += len(lote)
+    return enviadas
+
+def _fusionar_lote(cursor, tabla, tabla_tmp, columnas, lote, clave):
+    """Fusiona un lote (ya sin claves repetidas) vía la tabla temporal. Devuelve cuántas claves ya existían."""
+    cursor.execute(f"DELETE FROM {tabla_tmp}") # DELETE y no TRUNCATE: sin commit implícito ni perder el SAVEPOINT
+    insertar_por_lotes(cursor, tabla_tmp, columnas, lote, len(lote))
+
+    cursor.execute(f"SELECT COUNT(DISTINCT t.{clave}) FROM {tabla_tmp} t JOIN {tabla} f ON f.{clave} = t.{clave}")
+    claves_existentes = int(_primer_valor(cursor.fetchone()) or 0)
+
+    columnas_update = [col for col in columnas if col != clave]
+    if claves_existentes > 0 and columnas_update:
+        set_sql = ', '.join([f"f.{col} = t.{col}" for col in columnas_update])
+        cursor.execute(f"UPDATE {tabla} f JOIN {tabla_tmp} t ON f.{clave} = t.{clave} SET {set_sql}")
+
+    columnas_sql = ', '.join(columnas)
+    columnas_tmp_sql = ', '.join([f"t.{col}" for col in columnas])
+    cursor.execute(f"""
+        INSERT INTO {tabla} ({columnas_sql})
+        SELECT {columnas_tmp_sql}
+        FROM {tabla_tmp} t LEFT JOIN {tabla} f ON f.{clave} = t.{clave}
+        WHERE f.{clave} IS NULL
+    """)
+    return claves_existentes
+
+def fusionar_por_staging(cursor, tabla, columnas, filas, clave, tam_lote=TAM_LOTE_DEFECTO, errores=None):
+    """
+    Fusiona `filas` en `tabla` usando una tabla temporal (staging), por lotes de `tam_lote`:
+      1. Carga el lote en una tabla TEMPORARY con la misma estructura.
+      2. UPDATE ... JOIN para las claves que ya existen.
+      3. INSERT ... SELECT (anti-join) para las claves nuevas.
+    Cada lote va dentro de un SAVEPOINT: si falla (p.ej. un valor demasiado largo o fuera de
+    rango en modo estricto) se deshace y se reintenta fila a fila, así una fila mala no tumba
+    la importación completa. Las filas que fallan solas se omiten y se agregan a `errores`
+    (lista de (fila, excepción)) si se recibe, igual que el antiguo bucle las contaba como error.
+    No requiere índice UNIQUE sobre `clave`. Si una clave se repite en `filas`
+    gana la última aparición (igual que el antiguo UPDATE fila a fila).
+    Devuelve (insertados, actualizados) contados por fila de entrada, con la
+    misma semántica que el bucle anterior: la primera aparición de una clave
+    nueva es un INSERT, cualquier otra aparición cuenta como UPDATE.
+    """
+    if not filas: return 0, 0
+    if clave not in columnas: raise ValueError(f"La clave '{clave}' debe estar incluida en las columnas a fusionar.")
+
+    # Deduplicar por clave conservando la última aparición
+    pos_clave = columnas.index(clave)
+    filas_unicas = list({fila[pos_clave]: fila for fila in filas}.values())
+
+    tabla_tmp = f"tmp_carga_{tabla}"
+    savepoint = f"sp_{tabla_tmp}"
+    insertados = existentes = 0
+    claves_fallidas = set()
+    cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {tabla_tmp}")
+    cursor.execute(f"CREATE TEMPORARY TABLE {tabla_tmp} LIKE {tabla}")
+    try:
+        for lote in dividir_en_lotes(filas_unicas, tam_lote):
+            cursor.execute(f"SAVEPOINT {savepoint}")
+            try:
+                claves_existentes = _fusionar_lote(cursor, tabla, tabla_tmp, columnas, lote, clave)
+                cursor.execute(f"RELEASE SAVEPOINT {savepoint}")
+                existentes += claves_existentes
+                insertados += len(lote) - claves_existentes
+                continue
+            except Exception as e_lote:
+                print(f"\n[WARN] Falló la fusión de un lote de {len(lote)} filas en '{tabla}' ({e_lote}). Reintentando fila a fila...")
+                cursor.execute(f"ROLLBACK TO SAVEPOINT {savepoint}")
+            for fila in lote:
+                try:
+                    claves_existentes = _fusionar_lote(cursor, tabla, tabla_tmp, columnas, [fila], clave)
+                    cursor.execute(f"RELEASE SAVEPOINT {savepoint}")
+                    cursor.execute(f"SAVEPOINT {savepoint}")
+                    existentes += claves_existentes
+                    insertados += 1 - claves_existentes
+                except Exception as e:
+                    cursor.execute(f"ROLLBACK TO SAVEPOINT {savepoint}")
+                    claves_fallidas.add(fila[pos_clave])
+                    if errores is not None: errores.append((fila, e))
+            cursor.execute(f"RELEASE SAVEPOINT {savepoint}")
+    finally:
+        cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {tabla_tmp}")
+
+    # Las apariciones repetidas de una clave cuentan como UPDATE (salvo las de claves que fallaron)
+    repetidas = sum(1 for fila in filas if fila[pos_clave] not in claves_fallidas) - (len(filas_unicas) - len(claves_fallidas))
+    return insertados, existentes + repetidas
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+# Guardar como: catalogos.py
+
+# Catálogos pequeños de la BD (plazos de pago, clientes, vendedores) cargados UNA vez
+# por proceso y compartidos entre los scripts de importación. Evita consultas fila a fila
+# dentro de los bucles de procesamiento. Cuando pipeline.py ejecuta varias etapas en el
+# mismo proceso, la etapa que modifica una tabla invalida su catálogo tras el COMMIT.
+
+import pandas as pd
+
+# --- Caché en memoria (por proceso) ---
+_cache = {}
+
+# --- Funciones Auxiliares ---
+def invalidar_cache(*nombres):
+    """Descarta catálogos cacheados (todos si no se indica ninguno)."""
+    if not nombres:
+        _cache.clear()
+        return
+    for nombre in nombres:
+        _cache.pop(nombre, None)
+
+def _filas_como_dict(cursor, columnas):
+    """fetchall() como lista de dicts, sea el cursor normal o dictionary=True."""
+    filas = cursor.fetchall()
+    if filas and not isinstance(filas[0], dict):
+        filas = [dict(zip(columnas, fila)) for fila in filas]
+    return filas
+
+def obtener_plazos_pago(cursor, recargar=False):
+    """
+    Devuelve un DataFrame con los plazos de pago indexado por `idodoo`
+    (columnas: dias_credito, cant_cuotas, dias_cuota). Se consulta una sola vez por proceso.
+    """
+    if recargar or 'plazos_pago' not in _cache:
+        print("[DB] Cargando catálogo de plazos de pago...")
+        cursor.execute("SELECT idodoo, dias_credito, cant_cuotas, dias_cuota FROM plazos_pago WHERE idodoo IS NOT NULL")
+        filas = cursor.fetchall()
+        columnas = ['idodoo', 'dias_credito', 'cant_cuotas', 'dias_cuota']
+        if filas and isinstance(filas[0], dict):
+            df_plazos = pd.DataFrame(filas, columns=columnas)
+        else:
+            df_plazos = pd.DataFrame([tuple(f) for f in filas], columns=columnas)
+        for col in columnas:
+            df_plazos[col] = pd.to_numeric(df_plazos[col], errors='coerce').astype('Int64')
+        # Si hubiera idodoo repetidos, el antiguo fetchone() tomaba el primero
+        df_plazos = df_plazos.dropna(subset=['idodoo']).drop_duplicates(subset=['idodoo'], keep='first')
+        _cache['plazos_pago'] = df_plazos.set_index('idodoo')
+        print(f"[OK] {len(df_plazos)} plazos de pago en caché.")
+    return _cache['plazos_pago']
+
+def resolver_plazos_pago(df, plazos, col_id_plazo='id_plazospago', col_fecha_factura='fecha_factura', col_fecha_vencimiento='fecha_vencimiento'):
+    """
+    Calcula de forma vectorizada las columnas dias_credito, cant_cuotas y dias_cuotas
+    de cada factura a partir del catálogo `plazos` (ver obtener_plazos_pago).
+    Reglas (idénticas a la antigua consulta por fila):
+      - Con plazo de pago encontrado: valores del catálogo (NULL -> 0, salvo cant_cuotas).
+      - Con plazo de pago NO encontrado: cant_cuotas NULL, días en 0.
+      - Sin plazo de pago: 1 cuota, dias_credito = vencimiento - factura, dias_cuotas = dias_credito.
+    `col_id_plazo` debe contener el ID de plazo ya limpio (entero o nulo).
+    """
+    ids_plazo = pd.to_numeric(df[col_id_plazo], errors='coerce')
+    tiene_plazo = ids_plazo.notna() & (ids_plazo != 0)
+
+    encontrado = plazos.reindex(ids_plazo.astype('Int64'))
+    encontrado.index = df.index
+
+    # Días de crédito cuando no hay plazo: diferencia entre fechas (0 si falta alguna)
+    f_factura = pd.to_datetime(df[col_fecha_factura], errors='coerce')
+    f_vencimiento = pd.to_datetime(df[col_fecha_vencimiento], errors='coerce')
+    dias_por_fechas = (f_vencimiento - f_factura).dt.days.fillna(0).astype('Int64')
+
+    df['dias_credito'] = encontrado['dias_credito'].fillna(0).where(tiene_plazo, dias_por_fechas).astype('Int64')
+    df['dias_cuotas'] = encontrado['dias_cuota'].fillna(0).where(tiene_plazo, dias_por_fechas).astype('Int64')
+    df['cant_cuotas'] = encontrado['cant_cuotas'].where(tiene_plazo, 1).astype('Int64')
+    return df
+
+def obtener_mapa_clientes(cursor, recargar=False):
+    """Diccionario {idodoo (int): id} de la tabla clientes. Se consulta una sola vez por proceso."""
+    if recargar or 'clientes' not in _cache:
+        print("[DB] Cargando catálogo de clientes...")
+        cursor.execute("SELECT id, idodoo FROM clientes WHERE idodoo IS NOT NULL")
+        filas = _filas_como_dict(cursor, ['id', 'idodoo'])
+        _cache['clientes'] = {int(f['idodoo']): f['id'] for f in filas if str(f['idodoo']).isdigit()}
+        print(f"[OK] {len(_cache['clientes'])} clientes en caché.")
+    return _cache['clientes']
+
+def obtener_mapa_vendedores(cursor, recargar=False):
+    """Diccionario {nombre en minúsculas: idVendedores} de la tabla vendedores."""
+    if recargar or 'vendedores' not in _cache:
+        print("[DB] Cargando catálogo de vendedores...")
+        cursor.execute("SELECT idVendedores, nombre FROM vendedores WHERE nombre IS NOT NULL")
+        filas = _filas_como_dict(cursor, ['idVendedores', 'nombre'])
+        _cache['vendedores'] = {str(f['nombre']).lower(): f['idVendedores'] for f in filas if f['nombre']}
+        print(f"[OK] {len(_cache['vendedores'])} vendedores en caché.")
+    return _cache['vendedores']
@@ -0,0 +1,505 @@
+# -*- coding: utf-8 -*-
+# Guardar como: cola_trabajos.py
+
+# Cola de trabajos en segundo plano para app.py. Cada botón encola un trabajo (una etapa o la
+# secuencia completa) en una tabla SQLite local y la petición HTTP vuelve de inmediato; un hilo
+# despachador entrega cada trabajo a un proceso trabajador libre (la salida de un proceso es
+# una sola, así que cada trabajador corre un trabajo a la vez) y la página consulta el estado.
+# Estados: en_cola -> en_curso -> terminado (con exito 1/0). Dos trabajos que tocan la misma
+# etapa nunca corren a la vez: el segundo espera en cola, y pulsar de nuevo un botón cuyo
+# trabajo sigue en cola o en curso devuelve ese mismo trabajo en lugar de duplicarlo.
+# La salida del proceso (stdout y stderr, también la de sus procesos hijos) se lee línea a línea
+# en un búfer circular acotado (SalidaTrabajo) que app.py transmite en vivo; al terminar solo se
+# guardan en la tabla las últimas LINEAS_SALIDA líneas.
+# Los trabajadores son procesos "calientes": arrancan una vez con pandas, numpy, openpyxl,
+# mysql.connector, los módulos de las etapas y el pool de MySQL ya cargados, y reciben ids de
+# trabajo por stdin, así cada botón no vuelve a pagar el arranque del intérprete, las librerías
+# ni las conexiones. El pool sigue abierto entre trabajos (pool_reset_session limpia la sesión
+# de cada conexión al devolverla y mysql.connector reconecta las que el servidor cerró); los
+# catálogos en caché sí se descartan tras cada trabajo. Los trabajos en paralelo (/run_all)
+# usan un pool de procesos de etapas propio del trabajador, arrancado y precargado igual
+# (pipeline.crear_pool_procesos) y reutilizado en cada trabajo.
+# Cada TRABAJOS_POR_TRABAJADOR trabajos el proceso se recicla (memoria y estado de módulos).
+# Uso interno: python -u cola_trabajos.py --trabajador RUTA_BD (lo lanza el despachador).
+
+import importlib
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+from collections import deque
+from concurrent.futures import wait
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+import time
+import traceback
+import uuid
+
+import historial
+
+# --- Configuración ---
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RUTA_BD_TRABAJOS = os.environ.get("IMPORTAR_ODOO_TRABAJOS", os.path.join(BASE_DIR, "trabajos.db"))
+MAX_TRABAJOS_SIMULTANEOS = 2 # Procesos de trabajo a la vez (etapas distintas)
+INTERVALO_DESPACHO = 0.5 # Segundos entre revisiones de la cola
+LATIDO_MAXIMO = 30 # Segundos sin latido tras los que un trabajo 'en_curso' se da por interrumpido
+LINEAS_SALIDA = 2000 # Líneas de salida que se conservan por trabajo (búfer circular y tabla)
+ESPERA_SALIDA = 15 # Segundos máximos de espera por líneas nuevas antes de devolver un latido
+TRABAJOS_POR_TRABAJADOR = 50 # Trabajos que atiende un proceso trabajador antes de reemplazarlo
+MODULOS_PRECARGA = ["numpy", "pandas", "openpyxl", "mysql.connector"] # Además de pipeline y sus etapas
+MARCA_LISTO = "@@trabajador-listo@@" # Líneas de control del trabajador (no van a la salida del trabajo)
+MARCA_FIN = "@@fin-trabajo@@ "
+EN_COLA, EN_CURSO, TERMINADO = "en_cola", "en_curso", "terminado"
+
+SQL_CREAR_TABLA = """
+    CREATE TABLE IF NOT EXISTS trabajos (
+        id TEXT PRIMARY KEY,
+        nombre TEXT NOT NULL,
+        claves TEXT NOT NULL,          -- Lista JSON de etapas de pipeline.AVAILABLE_SCRIPTS
+        paralelo INTEGER NOT NULL DEFAULT 0,
+        estado TEXT NOT NULL,
+        exito INTEGER,
+        creado REAL NOT NULL,
+        iniciado REAL,
+        terminado REAL,
+        pid INTEGER,
+        latido REAL,                   -- Último aviso del despachador que vigila el proceso
+        salida TEXT NOT NULL DEFAULT '',
+        error TEXT NOT NULL DEFAULT '',
+        etapas TEXT,                   -- Lista JSON: nombre, exito, duracion, resultado
+        lineas INTEGER NOT NULL DEFAULT 0 -- Líneas de salida producidas (en 'salida' van las últimas)
+    )
+"""
+# Columnas agregadas después de crear la tabla (bases trabajos.db ya existentes)
+COLUMNAS_AGREGADAS = {"lineas": "INTEGER NOT NULL DEFAULT 0"}
+
+# Hilo despachador (uno por proceso web), sus trabajadores, trabajos en curso y su salida en vivo
+_despachador = None
+_candado_despachador = threading.Lock()
+_trabajadores = []
+_procesos = {}
+_salidas = {}
+_pool_etapas = None # Solo en el proceso trabajador: pool de procesos de etapas (ver _obtener_pool_etapas)
+
+class SalidaTrabajo:
+    """Búfer circular con las últimas líneas de salida de un trabajo; la línea n-ésima tiene el número n."""
+
+    def __init__(self, maximo=LINEAS_SALIDA):
+        self.lineas = deque(maxlen=maximo)
+        self.total = 0
+        self.terminada = False
+        self.condicion = threading.Condition()
+
+    def agregar(self, linea):
+        with self.condicion:
+            self.lineas.append(linea)
+            self.total += 1
+            self.condicion.notify_all()
+
+    def cerrar(self):
+        with self.condicion:
+            self.terminada = True
+            self.condicion.notify_all()
+
+    def leer(self, desde, espera=None):
+        """
+        Devuelve (primera, lineas, terminada): las líneas con número >= `desde` que siguen en el
+        búfer, empezando en el número `primera` (> desde si las anteriores ya se descartaron).
+        Sin líneas nuevas espera hasta `espera` segundos a que llegue alguna.
+        """
+        with self.condicion:
+            if espera and self.total <= desde and not self.terminada:
+                self.condicion.wait(espera)
+            primera = max(desde, self.total - len(self.lineas))
+            return primera, list(islice(self.lineas, primera - (self.total - len(self.lineas)), None)), self.terminada
+
+    def texto(self):
+        with self.condicion:
+            return "\n".join(self.lineas)
+
+# --- Funciones Auxiliares ---
+def conectar_bd(ruta=None):
+    """Conexión SQLite en autocommit (las transacciones se abren a mano con BEGIN IMMEDIATE)."""
+    conexion = sqlite3.connect(ruta or RUTA_BD_TRABAJOS, timeout=30, isolation_level=None)
+    conexion.row_factory = sqlite3.Row
+    conexion.execute("PRAGMA journal_mode=WAL") # Lecturas del sondeo sin bloquear al despachador
+    conexion.execute(SQL_CREAR_TABLA)
+    existentes = {fila["name"] for fila in conexion.execute("PRAGMA table_info(trabajos)")}
+    for columna, definicion in COLUMNAS_AGREGADAS.items():
+        if columna not in existentes:
+            conexion.execute(f"ALTER TABLE trabajos ADD COLUMN {columna} {definicion}")
+    return conexion
+
+def _a_dict(fila):
+    trabajo = dict(fila)
+    trabajo["claves"] = json.loads(trabajo["claves"])
+    trabajo["paralelo"] = bool(trabajo["paralelo"])
+    trabajo["etapas"] = json.loads(trabajo["etapas"]) if trabajo["etapas"] else []
+    if trabajo["exito"] is not None: trabajo["exito"] = bool(trabajo["exito"])
+    fin = trabajo["terminado"] or time.time()
+    trabajo["duracion"] = round(fin - trabajo["iniciado"], 1) if trabajo["iniciado"] else None
+    return trabajo
+
+def _finalizar(conexion, id_trabajo, exito, error="", etapas=None, estado=TERMINADO):
+    """
+    Registra el resultado del trabajo si aún no tiene uno (gana el primero). El trabajador lo
+    guarda con estado 'en_curso' y el despachador lo pasa a 'terminado' junto con la salida.
+    """
+    conexion.execute(
+        "UPDATE trabajos SET estado = ?, exito = ?, terminado = ?, error = ?, etapas = ? WHERE id = ? AND exito IS NULL",
+        (estado, int(exito), time.time(), error, json.dumps(etapas or [], default=str), id_trabajo))
+
+def encolar(claves, nombre, paralelo=False):
+    """
+    Encola un trabajo con las etapas `claves` y devuelve (id_trabajo, nuevo). Si ya hay un
+    trabajo con las mismas etapas en cola o en curso se devuelve ese (nuevo=False).
+    """
+    iniciar_despachador()
+    claves_json = json.dumps(list(claves))
+    conexion = conectar_bd()
+    try:
+        conexion.execute("BEGIN IMMEDIATE")
+        existente = conexion.execute("SELECT id FROM trabajos WHERE claves = ? AND estado IN (?, ?) ORDER BY creado LIMIT 1",
+                                     (claves_json, EN_COLA, EN_CURSO)).fetchone()
+        if existente:
+            conexion.execute("COMMIT")
+            return existente["id"], False
+        id_trabajo = uuid.uuid4().hex
+        conexion.execute("INSERT INTO trabajos (id, nombre, claves, paralelo, estado, creado) VALUES (?, ?, ?, ?, ?, ?)",
+                         (id_trabajo, nombre, claves_json, int(paralelo), EN_COLA, time.time()))
+        conexion.execute("COMMIT")
+        return id_trabajo, True
+    finally:
+        conexion.close()
+
+def obtener_trabajo(id_trabajo):
+    """Dict del trabajo (claves y etapas ya decodificadas, duracion en s) o None si no existe."""
+    conexion = conectar_bd()
+    try:
+        fila = conexion.execute("SELECT * FROM trabajos WHERE id = ?", (id_trabajo,)).fetchone()
+        return _a_dict(fila) if fila else None
+    finally:
+        conexion.close()
+
+def listar_trabajos(limite=20):
+    """Últimos trabajos, del más reciente al más antiguo."""
+    conexion = conectar_bd()
+    try:
+        return [_a_dict(fila) for fila in conexion.execute("SELECT * FROM trabajos ORDER BY creado DESC LIMIT ?", (limite,))]
+    finally:
+        conexion.close()
+
+def recuperar_interrumpidos(conexion):
+    """
+    Cierra como fallidos los trabajos 'en_curso' cuyo despachador dejó de dar latidos (p. ej. tras
+    reiniciar el servidor), para que no bloqueen sus etapas para siempre.
+    """
+    limite = time.time() - LATIDO_MAXIMO
+    for fila in conexion.execute("SELECT id, pid FROM trabajos WHERE estado = ? AND latido < ?", (EN_CURSO, limite)).fetchall():
+        print(f"[WARN] Trabajo {fila['id']} interrumpido (proceso {fila['pid']} sin latido).")
+        _finalizar(conexion, fila["id"], False, error="El trabajo se interrumpió sin registrar su resultado.")
+        conexion.execute("UPDATE trabajos SET estado = ? WHERE id = ?", (TERMINADO, fila["id"]))
+
+def _etapas_ocupadas(claves):
+    """Etapas que toca un trabajo: sus claves más las que esas etapas encadenan (AVAILABLE_SCRIPTS['encadena'])."""
+    from pipeline import AVAILABLE_SCRIPTS
+    etapas = set(claves)
+    etapas.update(AVAILABLE_SCRIPTS[clave]["encadena"] for clave in claves if AVAILABLE_SCRIPTS.get(clave, {}).get("encadena"))
+    return etapas
+
+def _reclamar_siguiente(conexion):
+    """
+    Pasa a 'en_curso' el trabajo en cola más antiguo que no comparte etapas con ninguno en curso
+    ni con otro anterior aún en cola (así la secuencia completa no queda postergada para siempre).
+    Se cuentan también las etapas encadenadas: importar_facturas solo ya regenera las cuotas.
+    La transacción IMMEDIATE hace la reserva atómica aunque haya varios procesos web.
+    """
+    conexion.execute("BEGIN IMMEDIATE")
+    try:
+        en_curso = conexion.execute("SELECT claves FROM trabajos WHERE estado = ?", (EN_CURSO,)).fetchall()
+        if len(en_curso) >= MAX_TRABAJOS_SIMULTANEOS:
+            return None
+        ocupadas = set()
+        for fila in en_curso: ocupadas.update(_etapas_ocupadas(json.loads(fila["claves"])))
+        for fila in conexion.execute("SELECT * FROM trabajos WHERE estado = ? ORDER BY creado", (EN_COLA,)).fetchall():
+            claves = _etapas_ocupadas(json.loads(fila["claves"]))
+            if claves & ocupadas:
+                ocupadas.update(claves)
+                continue
+            ahora = time.time()
+            conexion.execute("UPDATE trabajos SET estado = ?, iniciado = ?, latido = ? WHERE id = ?", (EN_CURSO, ahora, ahora, fila["id"]))
+            return _a_dict(fila)
+        return None
+    finally:
+        conexion.execute("COMMIT")
+
+def _ejecutar_trabajo(ruta_bd, id_trabajo):
+    """
+    Cuerpo del proceso de trabajo: corre las etapas con pipeline.py imprimiendo directamente en
+    stdout (que lee el despachador) y guarda en la tabla el resultado, errores y contadores.
+    """
+    error, etapas, exito = "", [], False
+    conexion = conectar_bd(ruta_bd)
+    try:
+        fila = conexion.execute("SELECT claves, paralelo FROM trabajos WHERE id = ?", (id_trabajo,)).fetchone()
+        from pipeline import ejecutar_secuencia, ejecutar_en_paralelo
+        claves = json.loads(fila["claves"])
+        if fila["paralelo"]:
+            resultados = ejecutar_en_paralelo(claves, pool=_obtener_pool_etapas())
+        else:
+            resultados = ejecutar_secuencia(claves)
+        if len(resultados) == 1:
+            error = resultados[0]["error"]
+        else:
+            error = "\n".join(f"{etapa['nombre']}: {etapa['error']}" for etapa in resultados if etapa["error"])
+        exito = bool(resultados) and all(etapa["exito"] for etapa in resultados)
+        etapas = [{"nombre": etapa["nombre"], "exito": etapa["exito"], "duracion": round(etapa["duracion"], 1),
+                   "fases": etapa.get("fases", {}), "filas_entrada": etapa.get("filas_entrada"),
+                   "filas_salida": etapa.get("filas_salida"), "filas_omitidas": etapa.get("filas_omitidas", {}),
+                   "sentencias_bd": etapa.get("sentencias_bd"), "espera_bloqueos": etapa.get("espera_bloqueos"),
+                   "resultado": etapa["resultado"]} for etapa in resultados]
+        try:
+            historial.registrar_etapas(resultados, id_trabajo, ruta_bd)
+        except Exception as e:
+            print(f"[WARN] No se pudo registrar el historial del trabajo: {e}")
+    except Exception:
+        error = f"Error interno al ejecutar el trabajo:\n{traceback.format_exc()}"
+        print(error)
+    try:
+        _finalizar(conexion, id_trabajo, exito, error=error, etapas=etapas, estado=EN_CURSO)
+    finally:
+        conexion.close()
+
+class Trabajador:
+    """
+    Proceso trabajador caliente (python -u cola_trabajos.py --trabajador RUTA_BD) con stdout y
+    stderr unidos en una tubería. Un hilo lector pasa cada línea al búfer del trabajo asignado y
+    cierra ese búfer al ver MARCA_FIN; las líneas fuera de un trabajo van a la consola de Flask.
+    """
+
+    def __init__(self, ruta_bd=None):
+        entorno = dict(os.environ, PYTHONUNBUFFERED="1", PYTHONIOENCODING="utf-8")
+        self.proceso = subprocess.Popen(
+            [sys.executable, "-u", os.path.abspath(__file__), "--trabajador", ruta_bd or RUTA_BD_TRABAJOS],
+            cwd=BASE_DIR, env=entorno, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT, text=True, encoding="utf-8", errors="replace")
+        self.pid = self.proceso.pid
+        self.listo = threading.Event()
+        self.id_trabajo = None # Trabajo asignado (None = libre)
+        self.salida = None
+        self.atendidos = 0
+        self.lector = threading.Thread(target=self._leer, name=f"trabajador-{self.pid}", daemon=True)
+        self.lector.start()
+
+    def _leer(self):
+        try:
+            for linea in self.proceso.stdout:
+                linea = linea.rstrip("\r\n")
+                if linea == MARCA_LISTO:
+                    self.listo.set()
+                elif linea.startswith(MARCA_FIN):
+                    if self.salida: self.salida.cerrar()
+                elif self.listo.is_set() and self.salida is not None and not self.salida.terminada:
+                    self.salida.agregar(linea)
+                else:
+                    print(f"[trabajador {self.pid}] {linea}")
+        finally:
+            if self.salida: self.salida.cerrar() # El proceso terminó (o murió) a mitad de un trabajo
+
+    def vivo(self):
+        return self.proceso.poll() is None
+
+    def asignar(self, id_trabajo, salida):
+        """Envía el trabajo al proceso; su salida irá a `salida` hasta la marca de fin."""
+        self.id_trabajo, self.salida = id_trabajo, salida
+        self.atendidos += 1
+        self.proceso.stdin.write(id_trabajo + "\n")
+        self.proceso.stdin.flush()
+
+    def liberar(self):
+        self.id_trabajo = self.salida = None
+
+    def detener(self):
+        """Cierra stdin: el proceso sale de su bucle al terminar lo que esté haciendo."""
+        try:
+            self.proceso.stdin.close()
+        except OSError:
+            pass
+
+def _obtener_pool_etapas():
+    """Pool de procesos de etapas del trabajador (spawn, precargados); se crea la primera vez."""
+    global _pool_etapas
+    if _pool_etapas is None:
+        import pipeline
+        _pool_etapas = pipeline.crear_pool_procesos(precargar=True)
+    return _pool_etapas
+
+def _precargar():
+    """
+    En el proceso trabajador, una sola vez: importa librerías y etapas, abre el pool de MySQL y
+    arranca el pool de procesos de etapas (los procesos 'spawn' no heredan nada del trabajador,
+    así que cada uno precarga lo mismo por su cuenta, en paralelo).
+    """
+    inicio = time.perf_counter()
+    for nombre in MODULOS_PRECARGA:
+        importlib.import_module(nombre)
+    import pipeline
+    pool = _obtener_pool_etapas()
+    # Una tarea por proceso enviadas juntas: el pool arranca un proceso por cada tarea sin uno libre
+    arranques = [pool.submit(os.getpid) for _ in range(pipeline.MAX_PROCESOS_DEFECTO)]
+    pipeline.precargar_etapas()
+    wait(arranques)
+    print(f"[INFO] Trabajador {os.getpid()} precargado en {time.perf_counter() - inicio:.1f} s.")
+
+def _limpiar_estado():
+    """
+    Tras cada trabajo: descarta los catálogos en caché. El pool de MySQL se conserva (las
+    conexiones ya volvieron limpias al pool); el pool de etapas se descarta solo si se rompió
+    (murió uno de sus procesos) y el próximo trabajo en paralelo crea otro.
+    """
+    global _pool_etapas
+    from catalogos import invalidar_cache
+    invalidar_cache()
+    if _pool_etapas is None: return
+    try:
+        _pool_etapas.submit(os.getpid).result()
+    except BrokenProcessPool:
+        print("[WARN] El pool de procesos de etapas se rompió; se creará uno nuevo.")
+        _pool_etapas.shutdown(wait=False, cancel_futures=True)
+        _pool_etapas = None
+
+def _cerrar_trabajador():
+    """Al salir del bucle: cierra el pool de etapas y las conexiones del pool de MySQL."""
+    from conexion_mysql import cerrar_pool
+    if _pool_etapas is not None: _pool_etapas.shutdown()
+    cerrar_pool()
+
+def bucle_trabajador(ruta_bd):
+    """Cuerpo del proceso trabajador: precarga y luego ejecuta cada id de trabajo que llega por stdin."""
+    try:
+        _precargar()
+    except Exception:
+        traceback.print_exc() # Los trabajos mostrarán el mismo error al importar su etapa
+    print(MARCA_LISTO, flush=True)
+    for linea in sys.stdin:
+        id_trabajo = linea.strip()
+        if not id_trabajo: continue
+        try:
+            _ejecutar_trabajo(ruta_bd, id_trabajo)
+        except Exception:
+            traceback.print_exc()
+        try:
+            _limpiar_estado()
+        except Exception:
+            traceback.print_exc()
+        sys.stderr.flush()
+        print(f"{MARCA_FIN}{id_trabajo}", flush=True)
+    _cerrar_trabajador()
+
+def despachar():
+    """
+    Una vuelta del despachador: recoge trabajos terminados, repone trabajadores (se arrancan
+    antes de que haga falta, para que ya estén precargados) y asigna los trabajos que quepan.
+    """
+    conexion = conectar_bd()
+    try:
+        for id_trabajo, trabajador in list(_procesos.items()):
+            salida = _salidas[id_trabajo]
+            if not salida.terminada and trabajador.vivo(): continue
+            if not trabajador.vivo():
+                trabajador.lector.join(5) # Los hijos de la etapa podrían mantener abierta la tubería un poco más
+            del _procesos[id_trabajo]
+            # Si el proceso murió sin escribir su resultado (código != 0 o matado) se cierra aquí
+            _finalizar(conexion, id_trabajo, False, error=f"El proceso del trabajo terminó con código {trabajador.proceso.poll()}.")
+            conexion.execute("UPDATE trabajos SET estado = ?, salida = ?, lineas = ? WHERE id = ?",
+                             (TERMINADO, salida.texto(), salida.total, id_trabajo))
+            salida.cerrar()
+            del _salidas[id_trabajo] # Desde aquí seguir_salida() lee la tabla
+            trabajador.liberar()
+            if trabajador.atendidos >= TRABAJOS_POR_TRABAJADOR: trabajador.detener()
+        if _procesos:
+            conexion.execute(f"UPDATE trabajos SET latido = ? WHERE id IN ({', '.join('?' * len(_procesos))})",
+                             (time.time(), *_procesos))
+        recuperar_interrumpidos(conexion)
+
+        # Reponer trabajadores muertos o reciclados
+        for trabajador in [t for t in _trabajadores if t.id_trabajo is None and (not t.vivo() or t.atendidos >= TRABAJOS_POR_TRABAJADOR)]:
+            trabajador.detener()
+            _trabajadores.remove(trabajador)
+        while len(_trabajadores) < MAX_TRABAJOS_SIMULTANEOS:
+            trabajador = Trabajador()
+            _trabajadores.append(trabajador)
+            print(f"[INFO] Trabajador {trabajador.pid} iniciado (precargando módulos).")
+
+        while (libres := [t for t in _trabajadores if t.id_trabajo is None]) and (trabajo := _reclamar_siguiente(conexion)):
+            trabajador = libres[0]
+            salida = SalidaTrabajo()
+            try:
+                trabajador.asignar(trabajo["id"], salida)
+            except Exception as e:
+                print(f"[ERROR] No se pudo enviar el trabajo {trabajo['id']} al trabajador {trabajador.pid}: {e}")
+                trabajador.liberar()
+                trabajador.detener()
+                _trabajadores.remove(trabajador)
+                _finalizar(conexion, trabajo["id"], False, error=f"No se pudo iniciar el trabajo: {e}")
+                continue
+            _salidas[trabajo["id"]] = salida
+            _procesos[trabajo["id"]] = trabajador
+            conexion.execute("UPDATE trabajos SET pid = ? WHERE id = ?", (trabajador.pid, trabajo["id"]))
+            print(f"[INFO] Trabajo {trabajo['id']} ({trabajo['nombre']}) asignado al trabajador {trabajador.pid}.")
+    finally:
+        conexion.close()
+
+def seguir_salida(id_trabajo, desde=0, espera=ESPERA_SALIDA):
+    """
+    Generador con la salida del trabajo a partir de la línea número `desde`: produce tuplas
+    (numero, linea) según van llegando y (None, None) como latido tras `espera` s sin líneas.
+    Si el número salta es que esas líneas ya salieron del búfer circular. Termina cuando el
+    trabajo termina. Un trabajo lanzado por otro proceso web solo muestra su salida al final.
+    """
+    while True:
+        salida = _salidas.get(id_trabajo)
+        if salida is not None:
+            primera, lineas, terminada = salida.leer(desde, espera)
+            for numero, linea in enumerate(lineas, primera):
+                yield numero, linea
+            desde = primera + len(lineas)
+            if terminada and desde >= salida.total: return
+            if not lineas: yield None, None
+            continue
+        trabajo = obtener_trabajo(id_trabajo)
+        if trabajo is None: return
+        if trabajo["estado"] == TERMINADO:
+            lineas = trabajo["salida"].split("\n") if trabajo["lineas"] else []
+            primera = trabajo["lineas"] - len(lineas)
+            for numero in range(max(desde, primera), trabajo["lineas"]):
+                yield numero, lineas[numero - primera]
+            return
+        yield None, None # En cola (o en otro proceso web): esperar
+        time.sleep(min(espera, 2))
+
+def _bucle_despachador():
+    while True:
+        try:
+            despachar()
+        except Exception as e:
+            print(f"[ERROR] Despachador de trabajos: {e}")
+        time.sleep(INTERVALO_DESPACHO)
+
+def iniciar_despachador():
+    """Arranca (una sola vez por proceso) el hilo que despacha la cola."""
+    global _despachador
+    with _candado_despachador:
+        if _despachador is None or not _despachador.is_alive():
+            _despachador = threading.Thread(target=_bucle_despachador, name="despachador-trabajos", daemon=True)
+            _despachador.start()
+
+# --- Lógica Principal ---
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--trabajador":
+        bucle_trabajador(sys.argv[2])
+    else:
+        print("Uso interno: python -u cola_trabajos.py --trabajador RUTA_BD")
+        sys.exit(2)
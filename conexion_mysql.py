@@ -1,11 +1,281 @@
+# -*- coding: utf-8 -*-
+# Guardar como: conexion_mysql.py
+
+# Conexión central a MySQL para todos los scripts.
+# conectar() entrega conexiones de un pool (MySQLConnectionPool) creado una sola vez por
+# proceso; al hacer conexion.close() la conexión vuelve al pool en lugar de cerrarse.
+#
+# La configuración se toma, en este orden (cada nivel sobrescribe al anterior):
+#   1. Valores por defecto de CONFIG_DEFECTO.
+#   2. Archivo INI 'conexion_mysql.ini' junto a este script (o la ruta en DB_CONFIG_INI),
+#      secciones [mysql] y [pool]. Ejemplo:
+#          [mysql]
+#          host = localhost
+#          user = root
+#          password = 123456789
+#          database = bdfenix
+#          [pool]
+#          pool_size = 5
+#          compress = false
+#          use_pure = true
+#          autocommit = false
+#   3. Variables de entorno DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, DB_NAME, DB_POOL_NAME,
+#      DB_POOL_SIZE, DB_COMPRESS, DB_USE_PURE, DB_AUTOCOMMIT.
+#
+# SesionLectura agrupa las consultas de un reporte en una sola conexión (opcionalmente dentro
+# de una transacción de solo lectura con snapshot consistente) y solo reconecta si una
+# consulta falla por pérdida de conexión. consultar_por_ids() parte los IN (...) con miles de
+# ids en lotes de tamaño fijo (sentencias acotadas por max_allowed_packet y de forma repetida).
+# contadores_sesion() lee de performance_schema las sentencias ejecutadas y el tiempo de espera
+# por bloqueos de la sesión (pipeline.py mide así cada etapa para el historial y /metrics).
+
+import configparser
+import os
+
 import mysql.connector
+from mysql.connector import pooling
+
+# --- Configuración ---
+CONFIG_DEFECTO = {
+    "host": "localhost",
+    "port": 3306,
+    "user": "root",  # Cambia por tu usuario de MySQL
+    "password": "123456789",  # Cambia por tu contraseña de MySQL
+    "database": "bdfenix",  # Cambia por el nombre de tu base de datos
+    "pool_name": "importar_odoo",
+    "pool_size": 5, # Máximo 32 (límite de mysql-connector)
+    "compress": False, # Compresión del protocolo (útil si la BD es remota)
+    "use_pure": None, # None = automático (extensión en C si está instalada), True = Python puro, False = exigir extensión en C
+    "autocommit": False, # Los scripts hacen commit/rollback explícito
+}
+ARCHIVO_INI_DEFECTO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "conexion_mysql.ini")
+VARIABLES_ENTORNO = {
+    "DB_HOST": "host", "DB_PORT": "port", "DB_USER": "user", "DB_PASSWORD": "password",
+    "DB_NAME": "database", "DB_POOL_NAME": "pool_name", "DB_POOL_SIZE": "pool_size",
+    "DB_COMPRESS": "compress", "DB_USE_PURE": "use_pure", "DB_AUTOCOMMIT": "autocommit",
+}
+CLAVES_ENTERAS = {"port", "pool_size"}
+CLAVES_BOOLEANAS = {"compress", "use_pure", "autocommit"}
+
+# Ajustes de sesión para cargas masivas (se deshacen al devolver la conexión al pool)
+SESION_CARGA_MASIVA = {"foreign_key_checks": 0, "unique_checks": 0}
+SESION_NORMAL = {"foreign_key_checks": 1, "unique_checks": 1} # Para restaurar una conexión compartida
+
+# Reintentos de SesionLectura ante errores de conexión (servidor caído, conexión perdida)
+REINTENTOS_LECTURA = 3
+ESPERA_REINTENTO = 1 # Segundos entre intentos de reconexión
+ERRORES_CONEXION = (mysql.connector.errors.OperationalError, mysql.connector.errors.InterfaceError)
+TAM_LOTE_IDS = 1000 # Ids por cláusula IN (...) en SesionLectura.consultar_por_ids
+# Sentencias y espera por bloqueos (SUM_LOCK_TIME, en picosegundos) acumuladas por el hilo de esta sesión
+SQL_CONTADORES_SESION = """
+    SELECT COALESCE(SUM(COUNT_STAR), 0), COALESCE(SUM(SUM_LOCK_TIME), 0)
+    FROM performance_schema.events_statements_summary_by_thread_by_event_name
+    WHERE THREAD_ID = (SELECT THREAD_ID FROM performance_schema.threads WHERE PROCESSLIST_ID = CONNECTION_ID())
+"""
+
+# --- Estado por proceso ---
+_config = None
+_pool = None
+
+# --- Funciones Auxiliares ---
+def _convertir(clave, valor):
+    """Convierte valores de texto (INI / entorno) al tipo de la clave."""
+    if clave in CLAVES_ENTERAS: return int(valor)
+    if clave in CLAVES_BOOLEANAS:
+        return valor if isinstance(valor, bool) else str(valor).strip().lower() in ("1", "true", "si", "sí", "yes", "on")
+    return valor
+
+def cargar_configuracion(recargar=False):
+    """Devuelve el dict de configuración (defecto < INI < entorno). Se lee una vez por proceso."""
+    global _config
+    if _config is not None and not recargar:
+        return _config
+
+    config = dict(CONFIG_DEFECTO)
+    archivo_ini = os.environ.get("DB_CONFIG_INI", ARCHIVO_INI_DEFECTO)
+    if os.path.exists(archivo_ini):
+        lector = configparser.ConfigParser()
+        lector.read(archivo_ini, encoding="utf-8")
+        for seccion in ("mysql", "pool"):
+            if lector.has_section(seccion):
+                for clave, valor in lector.items(seccion):
+                    if clave in config: config[clave] = _convertir(clave, valor)
+    for variable, clave in VARIABLES_ENTORNO.items():
+        if variable in os.environ:
+            config[clave] = _convertir(clave, os.environ[variable])
+
+    _config = config
+    return _config
+
+def _parametros_conexion(config):
+    """Parámetros para mysql.connector a partir de la configuración."""
+    parametros = {
+        "host": config["host"], "port": config["port"], "user": config["user"],
+        "password": config["password"], "database": config["database"],
+        "compress": config["compress"], "autocommit": config["autocommit"],
+    }
+    if config["use_pure"] is not None:
+        parametros["use_pure"] = config["use_pure"]
+    return parametros
+
+def obtener_pool():
+    """Crea (una sola vez por proceso) y devuelve el pool de conexiones."""
+    global _pool
+    if _pool is None:
+        config = cargar_configuracion()
+        _pool = pooling.MySQLConnectionPool(
+            pool_name=config["pool_name"],
+            pool_size=config["pool_size"],
+            pool_reset_session=True, # Limpia variables de sesión al devolver la conexión
+            **_parametros_conexion(config)
+        )
+    return _pool
+
+def cerrar_pool():
+    """
+    Cierra las conexiones libres del pool del proceso y lo descarta; el próximo conectar() crea
+    uno nuevo. Lo usan los trabajadores de cola_trabajos.py al terminar, para no dejar las
+    pool_size conexiones abiertas en el servidor hasta que este note que el proceso salió.
+    """
+    global _pool
+    if _pool is None: return
+    try:
+        _pool._remove_connections()
+    except Exception as e:
+        print(f"[WARN] Error al cerrar las conexiones del pool: {e}")
+    _pool = None
+
+def aplicar_sesion(conexion, ajustes):
+    """Ejecuta SET SESSION para cada ajuste {variable: valor}."""
+    if not ajustes: return
+    cursor = conexion.cursor()
+    try:
+        for variable, valor in ajustes.items():
+            cursor.execute(f"SET SESSION {variable} = %s", (valor,))
+    finally:
+        cursor.close()
 
 # 📌 Función para conectar con MySQL
-def conectar():
-    conexion = mysql.connector.connect(
-    host="localhost",
-    user="root",  # Cambia por tu usuario de MySQL
-    password="123456789",  # Cambia por tu contraseña de MySQL
-    database="bdfenix"  # Cambia por el nombre de tu base de datos
-    )
+def conectar(carga_masiva=False, sesion=None):
+    """
+    Devuelve una conexión del pool. conexion.close() la devuelve al pool.
+    Con `carga_masiva=True` desactiva foreign_key_checks y unique_checks en la sesión
+    (solo para INSERT masivos en tablas ya limpiadas; no usar con ON DUPLICATE KEY).
+    `sesion` permite pasar otros ajustes de sesión {variable: valor}.
+    Si el pool está agotado se abre una conexión directa con la misma configuración.
+    """
+    try:
+        conexion = obtener_pool().get_connection()
+    except pooling.PoolError:
+        print("[WARN] Pool de conexiones agotado. Abriendo conexión directa.")
+        conexion = mysql.connector.connect(**_parametros_conexion(cargar_configuracion()))
+
+    ajustes = dict(SESION_CARGA_MASIVA) if carga_masiva else {}
+    ajustes.update(sesion or {})
+    aplicar_sesion(conexion, ajustes)
     return conexion
+
+def contadores_sesion(conexion):
+    """
+    Devuelve (sentencias, segundos_espera_bloqueos) acumulados por la sesión de `conexion`, o
+    None si performance_schema no está disponible. La propia consulta cuenta como sentencia en
+    la lectura siguiente: al restar dos lecturas, descontar 1.
+    """
+    cursor = None
+    try:
+        cursor = conexion.cursor()
+        cursor.execute(SQL_CONTADORES_SESION)
+        sentencias, picosegundos = cursor.fetchone()
+        return int(sentencias), float(picosegundos) / 1e12
+    except mysql.connector.Error:
+        return None
+    finally:
+        if cursor:
+            try: cursor.close()
+            except mysql.connector.Error: pass
+
+class SesionLectura:
+    """
+    Conexión única para las lecturas de un reporte. Uso:
+        with SesionLectura(instantanea=True) as sesion:
+            filas = sesion.consultar("SELECT ...", (param,))
+            reglas = sesion.ejecutar(obtener_reglas_comision) # funcion(cursor)
+    Con `instantanea=True` todas las consultas ven el mismo estado de la BD
+    (START TRANSACTION WITH CONSISTENT SNAPSHOT, READ ONLY). No hay ping previo a cada
+    consulta: solo si una falla por error de conexión se reconecta y se repite (hasta
+    `reintentos` veces). Tras una reconexión el snapshot es nuevo (se avisa con [WARN]).
+    Si se recibe `conexion` se usa y NO se cierra al salir.
+    """
+
+    def __init__(self, instantanea=False, reintentos=REINTENTOS_LECTURA, conexion=None):
+        self.instantanea = instantanea
+        self.reintentos = reintentos
+        self.conexion = conexion
+        self._conexion_propia = conexion is None
+        self.consultas = 0
+        self.reconexiones = 0
+
+    def __enter__(self):
+        if self._conexion_propia: self.conexion = conectar()
+        self._iniciar_transaccion()
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        try:
+            if self.instantanea and self.conexion.in_transaction: self.conexion.rollback() # Solo lectura: nada que confirmar
+        except Exception as e: print(f"[WARN] Error al cerrar la transacción de lectura: {e}")
+        if self._conexion_propia and self.conexion.is_connected(): self.conexion.close()
+        return False
+
+    def _iniciar_transaccion(self):
+        if self.instantanea:
+            if self.conexion.in_transaction: self.conexion.rollback()
+            self.conexion.start_transaction(consistent_snapshot=True, readonly=True)
+
+    def ejecutar(self, funcion):
+        """Ejecuta funcion(cursor) con un cursor dictionary+buffered; reintenta solo si se perdió la conexión."""
+        for intento in range(self.reintentos + 1):
+            cursor = None
+            try:
+                cursor = self.conexion.cursor(dictionary=True, buffered=True)
+                resultado = funcion(cursor)
+                self.consultas += 1
+                return resultado
+            except ERRORES_CONEXION as e:
+                if intento == self.reintentos: raise
+                print(f"[WARN] Error de conexión ({e}). Reconectando (intento {intento + 1}/{self.reintentos})...")
+                self.conexion.reconnect(attempts=self.reintentos, delay=ESPERA_REINTENTO)
+                self.reconexiones += 1
+                if self.instantanea: print("[WARN] El snapshot de lectura se reinicia tras la reconexión.")
+                self._iniciar_transaccion()
+            finally:
+                if cursor:
+                    try: cursor.close()
+                    except Exception: pass
+
+    def consultar(self, consulta, parametros=()):
+        """Ejecuta `consulta` y devuelve todas las filas como dicts."""
+        def _consultar(cursor):
+            cursor.execute(consulta, parametros)
+            return cursor.fetchall()
+        return self.ejecutar(_consultar)
+
+    def consultar_por_ids(self, consulta, ids, tam_lote=TAM_LOTE_IDS, orden=None):
+        """
+        Ejecuta `consulta` (con el marcador {ids} dentro de un IN) en lotes de `tam_lote` ids y
+        devuelve todas las filas. El último lote se completa repitiendo su último id, así todas
+        las sentencias tienen el mismo texto y número de parámetros. Los lotes van en serie por
+        la misma conexión para no salir del snapshot. ORDER BY solo ordena dentro de cada lote:
+        si el orden global importa, pasar `orden` (clave de sorted) para reordenar el total.
+        """
+        ids = sorted(set(ids))
+        if not ids: return []
+        tam_lote = min(tam_lote, len(ids))
+        sentencia = consulta.format(ids=", ".join(["%s"] * tam_lote))
+        filas = []
+        for inicio in range(0, len(ids), tam_lote):
+            lote = ids[inicio:inicio + tam_lote]
+            lote += [lote[-1]] * (tam_lote - len(lote))
+            filas.extend(self.consultar(sentencia, tuple(lote)))
+        if orden is not None: filas.sort(key=orden)
+        return filas
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+# Guardar como: fases.py
+
+# Cronómetro por fases de una etapa. pipeline.ejecutar_etapa() lo inicia y recoge los tiempos;
+# cada script marca con marcar_fase("...") dónde empieza cada fase y la anterior se cierra sola
+# (sin reindentar bloques). Fases usadas: conexion, lectura_bd, leer_excel, limpieza,
+# escritura_bd, commit, resumen. Si una fase se repite (p. ej. generar_cuotas encadenado dentro
+# de Importar_facturas) sus tiempos se suman. Con el script ejecutado suelto no hace nada.
+
+import time
+
+# --- Configuración ---
+FASE_INICIAL = "conexion"
+
+# Fase en curso de la etapa que corre en este proceso (None = no se está midiendo)
+_tiempos = None
+_fase_actual = None
+_inicio_fase = 0.0
+
+# --- Funciones Auxiliares ---
+def iniciar(fase=FASE_INICIAL):
+    """Empieza a medir una etapa nueva (descarta lo que hubiera sin recoger)."""
+    global _tiempos, _fase_actual, _inicio_fase
+    _tiempos = {}
+    _fase_actual, _inicio_fase = fase, time.perf_counter()
+
+def marcar_fase(fase):
+    """Cierra la fase en curso y empieza `fase`."""
+    global _fase_actual, _inicio_fase
+    if _tiempos is None: return
+    ahora = time.perf_counter()
+    _tiempos[_fase_actual] = _tiempos.get(_fase_actual, 0.0) + ahora - _inicio_fase
+    _fase_actual, _inicio_fase = fase, ahora
+
+def recoger():
+    """Cierra la fase en curso y devuelve {fase: segundos} en orden de aparición."""
+    global _tiempos
+    if _tiempos is None: return {}
+    marcar_fase(None)
+    tiempos = {fase: round(segundos, 3) for fase, segundos in _tiempos.items()}
+    _tiempos = None
+    return tiempos
@@ -1,226 +1,360 @@
 # -*- coding: utf-8 -*-
 # Guardar como: generar_cuotas.py
 
-from datetime import timedelta, date, datetime
-from conexion_mysql import conectar  # Usa la misma conexión
+from datetime import date, datetime
+from conexion_mysql import conectar, aplicar_sesion, SESION_CARGA_MASIVA, SESION_NORMAL  # Usa la misma conexión
+from fases import marcar_fase # Tiempos por fase (pipeline.py)
+from carga_masiva import dividir_en_lotes, insertar_por_lotes
+from limpieza import limpiar_monto_escalado, escalado_a_texto
+import numpy as np
+import pandas as pd
+import argparse
+import hashlib
 import sys # Para sys.exit()
 
-print("\n--- Script: generar_cuotas.py ---")
-
-# --- Variables ---
-conexion = None
-cursor = None
-proceso_exitoso = False # Bandera de éxito para este script
-
-# --- Contadores ---
-facturas_leidas = 0
-facturas_omitidas_data = 0
-facturas_procesadas = 0
-cuotas_generadas_total = 0
-cuotas_pagadas = 0
-cuotas_pendientes = 0
-cuotas_parciales = 0
-cuotas_vencidas = 0
-cuotas_por_vencer = 0
-errores_calculo_fecha = 0
-cuotas_eliminadas = 0 # Para contar las borradas con DELETE
-
-try:
-    # 1. CONECTAR A DB
-    print("[DB] Conectando a la base de datos (para cuotas)...")
-    conexion = conectar()
-    if not conexion:
-        print("[ERROR] Fatal: No se pudo conectar a la base de datos.")
-        sys.exit(1) # Salir si no hay conexión
-
-    cursor = conexion.cursor(dictionary=True)
-    print("[OK] Conexión establecida.")
-
-    # 2. OBTENER FECHA Y FACTURAS ELEGIBLES
-    hoy = date.today()
-    print(f"[INFO] Fecha actual para comparación de vencimiento: {hoy}")
-
-    print("[INFO] Obteniendo facturas elegibles de la base de datos...")
-    sql_select_facturas = """
-        SELECT id AS id_factura, id_cliente, num_factura, total_factura,
-               total_cobrado, cant_cuotas, dias_cuotas,
-               COALESCE(fecha_entrega, fecha_factura) AS fecha_base, id_vendedor
-        FROM facturas
-        WHERE cant_cuotas IS NOT NULL AND cant_cuotas > 0
-          AND COALESCE(fecha_entrega, fecha_factura) IS NOT NULL
-          AND dias_cuotas IS NOT NULL AND dias_cuotas >= 0
+# --- Configuración ---
+# Modo incremental (por defecto): solo se regeneran las cuotas de las facturas cuya
+# huella (hash de los campos que determinan las cuotas) cambió desde la última ejecución.
+# Con --full (o modo_completo=True en ejecutar) se borra toda la tabla 'cuotas' y se regenera todo, como antes.
+TABLA_HUELLAS = "cuotas_huella"
+# Campos de la factura que determinan sus cuotas (id_cliente y num_factura se copian a cada cuota)
+CAMPOS_HUELLA = ["total_factura", "total_cobrado", "cant_cuotas", "dias_cuotas", "fecha_base",
+                 "id_vendedor", "id_cliente", "num_factura"]
+
+# --- Funciones Auxiliares ---
+def calcular_huella(factura):
+    """Hash MD5 de los campos que determinan las cuotas de una factura."""
+    texto = "|".join("" if factura.get(campo) is None else str(factura.get(campo)) for campo in CAMPOS_HUELLA)
+    return hashlib.md5(texto.encode("utf-8")).hexdigest()
+
+COLUMNAS_CUOTA = ["id_factura", "id_cliente", "num_factura", "nro_cuota", "monto_cuota", "monto_cobrado",
+                  "pendiente_cobrar", "estado", "fecha_vencimiento", "id_vendedor", "estado_vencimiento"]
+_MAX_DIA = (np.datetime64("9999-12-31", "D") - np.datetime64("1970-01-01", "D")).astype("int64") # Último día representable por date
+
+def construir_calendario_cuotas(facturas, hoy):
     """
-    cursor.execute(sql_select_facturas)
-    facturas = cursor.fetchall()
-    facturas_leidas = len(facturas)
-    print(f"[INFO] {facturas_leidas} facturas encontradas para generar cuotas.")
-
-    if facturas_leidas == 0:
-        print("[INFO] No hay facturas elegibles para generar cuotas. Proceso de cuotas completado.")
-        proceso_exitoso = True # Se considera éxito si no había nada que hacer
-        # No necesitamos hacer commit ni rollback si no hicimos nada
-    else:
-        # 3. LIMPIAR TABLA CUOTAS
-        print("[DB] Limpiando tabla 'cuotas' existente...")
-        cursor.execute("DELETE FROM cuotas")
-        cuotas_eliminadas = cursor.rowcount # Obtener número de filas borradas
-        print(f"[OK] Tabla 'cuotas' limpiada ({cuotas_eliminadas} registros eliminados).")
-
-        # 4. GENERAR CUOTAS
-        print(f"[INFO] Procesando {facturas_leidas} facturas para generar cuotas...")
-        for i, factura in enumerate(facturas):
-            #print(f"\rProcesando factura {i+1}/{facturas_leidas} (ID: {factura.get('id_factura', 'N/A')})...", end="")
-
-            # Validar datos de la factura
-            fecha_base_raw = factura.get("fecha_base")
+    Construye TODAS las cuotas de `facturas` (lista de dicts de la consulta) con arrays:
+    cada factura se repite cant_cuotas veces y los montos se calculan en centavos enteros.
+      - Cuota base = total / cant_cuotas redondeado a centavos; la última
+        cuota lleva el resto para que la suma sea exactamente el total.
+      - total_cobrado se reparte en cascada desde la primera cuota: lo cobrado en cada cuota es
+        lo que queda tras cubrir las anteriores, limitado al monto de la cuota (suma acumulada).
+      - Vencimiento = fecha base + nro_cuota * dias_cuotas.
+    Devuelve (df_cuotas, facturas_validas) donde df_cuotas tiene COLUMNAS_CUOTA (montos en centavos)
+    y facturas_validas es el DataFrame de facturas usadas (omitidas las de datos inválidos).
+    """
+    df = pd.DataFrame(facturas, dtype=object, columns=["id_factura", "id_cliente", "num_factura", "total_factura", "total_cobrado",
+                                         "cant_cuotas", "dias_cuotas", "fecha_base", "id_vendedor"])
+    # Validar datos clave (mismas reglas que el antiguo bucle)
+    cant_cuotas = pd.to_numeric(df["cant_cuotas"], errors="coerce")
+    dias_cuotas = pd.to_numeric(df["dias_cuotas"], errors="coerce")
+    fecha_base = pd.to_datetime(df["fecha_base"], errors="coerce").dt.normalize() # Solo la parte de fecha
+    total_escalado = limpiar_monto_escalado(df["total_factura"]) # <NA> si el monto no cabe en int64
+    cobrado_escalado = limpiar_monto_escalado(df["total_cobrado"])
+    validas = df["total_factura"].notna() & total_escalado.notna() & cobrado_escalado.notna() & \
+              (cant_cuotas > 0) & fecha_base.notna() & dias_cuotas.notna()
+    df = df[validas].reset_index(drop=True)
+    if df.empty:
+        return pd.DataFrame(columns=COLUMNAS_CUOTA), df
+
+    num_cuotas = cant_cuotas[validas].to_numpy(dtype="int64")
+    dias = dias_cuotas[validas].to_numpy(dtype="int64")
+    dia_base = fecha_base[validas].to_numpy().astype("datetime64[D]").astype("int64")
+    total = total_escalado[validas].to_numpy(dtype="int64")
+    cobrado_factura = np.maximum(cobrado_escalado[validas].to_numpy(dtype="int64"), 0)
+
+    # Una fila por cuota
+    fila_factura = np.repeat(np.arange(len(df)), num_cuotas)
+    inicio = np.cumsum(num_cuotas) - num_cuotas
+    nro = np.arange(len(fila_factura)) - np.repeat(inicio, num_cuotas) + 1
+    n = num_cuotas[fila_factura]
+    total_rep = total[fila_factura]
+
+    # Montos: base redondeada y resto en la última cuota. La base se redondea igual que antes
+    # (round() de Python sobre float), una vez por factura, para no mover ni un centavo.
+    base = np.array([round(round(t / 100 / c, 2) * 100) for t, c in zip(total.tolist(), num_cuotas.tolist())], dtype="int64")
+    base_rep = base[fila_factura]
+    monto = np.where(nro == n, total_rep - base_rep * (n - 1), base_rep)
+
+    # Cascada de lo cobrado: lo cubierto por las cuotas anteriores de la misma factura
+    monto_positivo = np.maximum(monto, 0) # Una cuota negativa nunca absorbe cobros
+    acumulado = np.cumsum(monto_positivo)
+    acumulado_antes_factura = np.repeat(acumulado[inicio] - monto_positivo[inicio], num_cuotas)
+    cubierto_previo = acumulado - monto_positivo - acumulado_antes_factura
+    cobrado = np.clip(cobrado_factura[fila_factura] - cubierto_previo, 0, monto_positivo)
+    pendiente = np.maximum(monto - cobrado, 0)
+
+    estado = np.where(pendiente == 0, "Pagada", np.where(cobrado > 0, "Parcial", "Pendiente"))
+
+    # Fechas de vencimiento (si se sale del rango de fechas se conserva la fecha base, como antes)
+    dia_vencimiento = dia_base[fila_factura] + nro * dias[fila_factura]
+    fuera_rango = dia_vencimiento > _MAX_DIA
+    dia_vencimiento = np.where(fuera_rango, dia_base[fila_factura], dia_vencimiento)
+    vencimiento = dia_vencimiento.astype("datetime64[D]")
+    anio = vencimiento.astype("datetime64[Y]").astype("int64") + 1970
+    vencida = vencimiento < np.datetime64(hoy, "D")
+    estado_vencimiento = np.where(vencida, np.char.add("Vencido ", anio.astype(str)), "Por vencer")
+
+    df_cuotas = pd.DataFrame({
+        "id_factura": df["id_factura"].to_numpy(dtype=object)[fila_factura],
+        "id_cliente": df["id_cliente"].to_numpy(dtype=object)[fila_factura],
+        "num_factura": df["num_factura"].to_numpy(dtype=object)[fila_factura],
+        "nro_cuota": nro,
+        "monto_cuota": monto,
+        "monto_cobrado": cobrado,
+        "pendiente_cobrar": pendiente,
+        "estado": estado,
+        "fecha_vencimiento": vencimiento.astype(object), # Objetos date para el conector
+        "id_vendedor": df["id_vendedor"].to_numpy(dtype=object)[fila_factura],
+        "estado_vencimiento": estado_vencimiento,
+    })
+    df_cuotas.attrs["errores_fecha"] = int(fuera_rango.sum())
+    return df_cuotas, df
+
+def borrar_por_facturas(cursor, tabla, ids_factura):
+    """DELETE ... WHERE id_factura IN (...) en bloques. Devuelve filas borradas."""
+    borradas = 0
+    for lote in dividir_en_lotes(list(ids_factura)):
+        placeholders = ", ".join(["%s"] * len(lote))
+        cursor.execute(f"DELETE FROM {tabla} WHERE id_factura IN ({placeholders})", tuple(lote))
+        borradas += cursor.rowcount
+    return borradas
+
+# --- Lógica Principal ---
+def ejecutar(conexion=None, modo_completo=False):
+    """
+    Genera las cuotas de las facturas elegibles (incremental salvo `modo_completo`).
+    Si se recibe `conexion` (p.ej. desde pipeline.py o Importar_facturas.py) se usa y NO se
+    cierra; los ajustes de sesión de carga masiva se restauran al terminar.
+    Devuelve un dict con 'exito' y los contadores del resumen.
+    """
+    print("\n--- Script: generar_cuotas.py ---")
+
+    conexion_propia = conexion is None
+    cursor = None
+    proceso_exitoso = False # Bandera de éxito para este script
+
+    # --- Contadores ---
+    facturas_leidas = 0
+    facturas_omitidas_data = 0
+    facturas_procesadas = 0
+    cuotas_generadas_total = 0
+    cuotas_pagadas = 0
+    cuotas_pendientes = 0
+    cuotas_parciales = 0
+    cuotas_vencidas = 0
+    cuotas_por_vencer = 0
+    errores_calculo_fecha = 0
+    cuotas_eliminadas = 0 # Para contar las borradas con DELETE
+    facturas_sin_cambios = 0 # Modo incremental: facturas cuyas cuotas se conservan
+    facturas_retiradas = 0 # Modo incremental: facturas que dejaron de ser elegibles
+    cuotas_estado_actualizado = 0 # Modo incremental: cuotas conservadas con estado_vencimiento refrescado
+
+    try:
+        # 1. CONECTAR A DB
+        if conexion_propia:
+            print("[DB] Conectando a la base de datos (para cuotas)...")
+            conexion = conectar(carga_masiva=True) # Sin foreign_key_checks/unique_checks durante el INSERT masivo de cuotas
+            if not conexion:
+                raise Exception("No se pudo conectar a la base de datos.")
+        else:
+            aplicar_sesion(conexion, SESION_CARGA_MASIVA)
+
+        cursor = conexion.cursor(dictionary=True)
+        print("[OK] Conexión establecida.")
+
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {TABLA_HUELLAS} (
+                id_factura INT NOT NULL PRIMARY KEY,
+                huella CHAR(32) NOT NULL,
+                fecha_generacion DATETIME NOT NULL
+            )
+        """)
+        huellas_guardadas = {}
+        if not modo_completo:
+            cursor.execute(f"SELECT id_factura, huella FROM {TABLA_HUELLAS}")
+            huellas_guardadas = {fila["id_factura"]: fila["huella"] for fila in cursor.fetchall()}
+            if not huellas_guardadas:
+                # Primera ejecución incremental: no sabemos qué cuotas existen, se regenera todo
+                print("[INFO] No hay huellas de cuotas guardadas. Se ejecutará en modo completo.")
+                modo_completo = True
+        print(f"[INFO] Modo de generación: {'COMPLETO' if modo_completo else 'INCREMENTAL'}")
+
+        # 2. OBTENER FECHA Y FACTURAS ELEGIBLES
+        marcar_fase("lectura_bd")
+        hoy = date.today()
+        print(f"[INFO] Fecha actual para comparación de vencimiento: {hoy}")
+
+        print("[INFO] Obteniendo facturas elegibles de la base de datos...")
+        sql_select_facturas = """
+            SELECT id AS id_factura, id_cliente, num_factura, total_factura,
+                   total_cobrado, cant_cuotas, dias_cuotas,
+                   COALESCE(fecha_entrega, fecha_factura) AS fecha_base, id_vendedor
+            FROM facturas
+            WHERE cant_cuotas IS NOT NULL AND cant_cuotas > 0
+              AND COALESCE(fecha_entrega, fecha_factura) IS NOT NULL
+              AND dias_cuotas IS NOT NULL AND dias_cuotas >= 0
+        """
+        cursor.execute(sql_select_facturas)
+        facturas = cursor.fetchall()
+        facturas_leidas = len(facturas)
+        print(f"[INFO] {facturas_leidas} facturas encontradas para generar cuotas.")
+
+        if facturas_leidas == 0 and (modo_completo or not huellas_guardadas):
+            print("[INFO] No hay facturas elegibles para generar cuotas. Proceso de cuotas completado.")
+            proceso_exitoso = True # Se considera éxito si no había nada que hacer
+            # No necesitamos hacer commit ni rollback si no hicimos nada
+        else:
+            # Huella actual de cada factura elegible
+            huellas_actuales = {factura["id_factura"]: calcular_huella(factura) for factura in facturas}
+
+            # 3. LIMPIAR TABLA CUOTAS (toda, o solo las facturas que cambiaron)
+            marcar_fase("escritura_bd")
+            if modo_completo:
+                print("[DB] Limpiando tabla 'cuotas' existente...")
+                cursor.execute("DELETE FROM cuotas")
+                cuotas_eliminadas = cursor.rowcount # Obtener número de filas borradas
+                cursor.execute(f"DELETE FROM {TABLA_HUELLAS}")
+                print(f"[OK] Tabla 'cuotas' limpiada ({cuotas_eliminadas} registros eliminados).")
+            else:
+                ids_retirados = set(huellas_guardadas) - set(huellas_actuales) # Ya no son elegibles (o se borraron)
+                ids_cambiados = {id_f for id_f, huella in huellas_actuales.items() if huellas_guardadas.get(id_f) != huella}
+                facturas_retiradas = len(ids_retirados)
+                facturas_sin_cambios = facturas_leidas - len(ids_cambiados)
+                print(f"[INFO] {len(ids_cambiados)} facturas nuevas o modificadas, {facturas_sin_cambios} sin cambios, {facturas_retiradas} ya no elegibles.")
+
+                ids_a_limpiar = ids_retirados | ids_cambiados
+                if ids_a_limpiar:
+                    print(f"[DB] Eliminando cuotas de {len(ids_a_limpiar)} facturas...")
+                    cuotas_eliminadas = borrar_por_facturas(cursor, "cuotas", ids_a_limpiar)
+                    borrar_por_facturas(cursor, TABLA_HUELLAS, ids_a_limpiar)
+                    print(f"[OK] {cuotas_eliminadas} cuotas eliminadas.")
+
+                # El estado de vencimiento depende de la fecha de hoy: se refresca en las cuotas conservadas
+                cursor.execute("""
+                    UPDATE cuotas
+                    SET estado_vencimiento = IF(fecha_vencimiento < %s, CONCAT('Vencido ', YEAR(fecha_vencimiento)), 'Por vencer')
+                """, (hoy,))
+                cuotas_estado_actualizado = cursor.rowcount
+                facturas = [factura for factura in facturas if factura["id_factura"] in ids_cambiados]
+
+            # 4. GENERAR CUOTAS (calendario completo con arrays + INSERT multi-fila)
+            print(f"[INFO] Procesando {len(facturas)} facturas para generar cuotas...")
+            df_cuotas, facturas_validas = construir_calendario_cuotas(facturas, hoy)
+            facturas_procesadas = len(facturas_validas)
+            facturas_omitidas_data = len(facturas) - facturas_procesadas
+            if not df_cuotas.empty:
+                errores_calculo_fecha = df_cuotas.attrs["errores_fecha"]
+                cuotas_pagadas = int((df_cuotas["estado"] == "Pagada").sum())
+                cuotas_parciales = int((df_cuotas["estado"] == "Parcial").sum())
+                cuotas_pendientes = int((df_cuotas["estado"] == "Pendiente").sum())
+                cuotas_por_vencer = int((df_cuotas["estado_vencimiento"] == "Por vencer").sum())
+                cuotas_vencidas = len(df_cuotas) - cuotas_por_vencer
+
+                # Montos como texto decimal exacto; enteros numpy -> int de Python para el conector
+                for col in ["monto_cuota", "monto_cobrado", "pendiente_cobrar"]:
+                    df_cuotas[col] = escalado_a_texto(df_cuotas[col])
+                df_cuotas["nro_cuota"] = df_cuotas["nro_cuota"].astype(object)
+                filas_cuotas = list(df_cuotas[COLUMNAS_CUOTA].astype(object).where(df_cuotas.notna(), None).itertuples(index=False, name=None))
+                print(f"[DB] Insertando {len(filas_cuotas)} cuotas en bloques...")
+                cuotas_generadas_total = insertar_por_lotes(cursor, "cuotas", COLUMNAS_CUOTA, filas_cuotas)
+
+            huellas_a_guardar = [(id_factura, huellas_actuales[id_factura], datetime.now())
+                                 for id_factura in facturas_validas["id_factura"].tolist()]
+
+            print("\n[INFO] Procesamiento de generación de cuotas completado.")
+
+            # Guardar huellas: las facturas omitidas por datos inválidos no se guardan y se reintentan en la próxima ejecución
+            insertar_por_lotes(cursor, TABLA_HUELLAS, ["id_factura", "huella", "fecha_generacion"], huellas_a_guardar)
+
+            # 5. COMMIT (si no hubo errores graves)
+            marcar_fase("commit")
+            # Decidimos hacer commit incluso si algunas facturas fallaron, pero las que sí se procesaron se guardan.
+            # Si quieres ser más estricto (rollback si *alguna* falló), cambia esta lógica.
+            print("\n[DB] Realizando COMMIT de los cambios de cuotas...")
+            conexion.commit()
+            proceso_exitoso = True # Marcamos éxito si llegamos aquí y hicimos commit
+            print("(+) Commit de cuotas realizado.")
+
+    except Exception as e_general_cuotas:
+        # Error general fuera del bucle de facturas
+        print(f"\n[ERROR] ERROR GENERAL INESPERADO (Generación Cuotas): {e_general_cuotas}")
+        proceso_exitoso = False
+        if conexion: # Intentar rollback si hubo conexión
             try:
-                # Validar datos clave antes de procesar
-                if not all([
-                    factura.get("total_factura") is not None,
-                    factura.get("cant_cuotas") and int(factura["cant_cuotas"]) > 0,
-                    fecha_base_raw,
-                    factura.get("dias_cuotas") is not None
-                ]):
-                    facturas_omitidas_data += 1
-                    continue # Saltar a la siguiente factura
-
-                # Procesar factura válida
-                facturas_procesadas += 1
-                monto_total_factura = float(factura["total_factura"])
-                num_cuotas = int(factura["cant_cuotas"])
-                dias_intervalo = int(factura["dias_cuotas"])
-                total_ya_cobrado = float(factura.get("total_cobrado", 0) or 0)
-
-                if num_cuotas == 0: continue # Seguridad extra
-
-                monto_cuota_base = round(monto_total_factura / num_cuotas, 2)
-                monto_total_calculado_excepto_ultima = monto_cuota_base * (num_cuotas - 1)
-                restante_a_aplicar = total_ya_cobrado
-
-                # Validar y convertir fecha_base (más robusto)
-                fecha_base_dt = None
-                if isinstance(fecha_base_raw, datetime): fecha_base_dt = fecha_base_raw.date()
-                elif isinstance(fecha_base_raw, date): fecha_base_dt = fecha_base_raw
-                elif isinstance(fecha_base_raw, str):
-                    try: fecha_base_dt = date.fromisoformat(fecha_base_raw.split()[0])
-                    except ValueError:
-                        try: fecha_base_dt = datetime.strptime(fecha_base_raw.split()[0], '%Y-%m-%d').date()
-                        except ValueError: raise ValueError(f"Formato fecha no reconocido: {fecha_base_raw}")
-                else: raise ValueError("Tipo fecha base no reconocido")
-
-                # Generar cada cuota
-                for nro in range(1, num_cuotas + 1):
-                    fecha_vencimiento_dt = fecha_base_dt # Default
-                    try:
-                        dias_a_sumar = nro * dias_intervalo
-                        fecha_vencimiento_dt = fecha_base_dt + timedelta(days=dias_a_sumar)
-                    except OverflowError: errores_calculo_fecha += 1
-                    except Exception: errores_calculo_fecha += 1
-
-                    estado_vencimiento = "Por vencer"
-                    if fecha_vencimiento_dt < hoy:
-                        estado_vencimiento = f"Vencido {fecha_vencimiento_dt.year}"
-                        cuotas_vencidas += 1
-                    else:
-                        cuotas_por_vencer += 1
-
-                    monto_cuota_actual = monto_cuota_base
-                    if nro == num_cuotas:
-                        monto_cuota_actual = round(monto_total_factura - monto_total_calculado_excepto_ultima, 2)
-
-                    monto_cobrado_cuota = max(0, min(monto_cuota_actual, restante_a_aplicar))
-                    pendiente_cobrar_cuota = max(0, round(monto_cuota_actual - monto_cobrado_cuota, 2))
-                    restante_a_aplicar = max(0, restante_a_aplicar - monto_cobrado_cuota)
-
-                    estado_pago_cuota = "Pendiente"
-                    tolerancia = 0.005
-                    if pendiente_cobrar_cuota <= tolerancia:
-                        estado_pago_cuota = "Pagada"
-                        pendiente_cobrar_cuota = 0.0
-                        cuotas_pagadas += 1
-                    elif monto_cobrado_cuota > tolerancia:
-                        estado_pago_cuota = "Parcial"
-                        cuotas_parciales += 1
-                    else:
-                        monto_cobrado_cuota = 0.0
-                        cuotas_pendientes += 1
-
-                    # Insertar cuota
-                    cursor.execute("""
-                        INSERT INTO cuotas (id_factura, id_cliente, num_factura, nro_cuota, monto_cuota, monto_cobrado, pendiente_cobrar, estado, fecha_vencimiento, id_vendedor, estado_vencimiento)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """, (
-                        factura["id_factura"], factura.get("id_cliente"), factura.get("num_factura"), nro,
-                        monto_cuota_actual, monto_cobrado_cuota, pendiente_cobrar_cuota, estado_pago_cuota,
-                        fecha_vencimiento_dt, factura.get("id_vendedor"), estado_vencimiento
-                    ))
-                    cuotas_generadas_total += 1
-
-            except Exception as e_factura:
-                # Error procesando una factura específica y sus cuotas
-                print(f"\n[ERROR] procesando cuotas para factura ID {factura.get('id_factura', 'N/A')}: {e_factura}")
-                facturas_omitidas_data += 1 # Contar como omitida por error
-                # Revertir el conteo si ya se había incrementado facturas_procesadas
-                if facturas_procesadas > 0 and 'monto_total_factura' in locals(): # Chequeo simple
-                    facturas_procesadas -= 1
-
-
-        print("\n[INFO] Procesamiento de generación de cuotas completado.")
-
-        # 5. COMMIT (si no hubo errores graves)
-        # Decidimos hacer commit incluso si algunas facturas fallaron, pero las que sí se procesaron se guardan.
-        # Si quieres ser más estricto (rollback si *alguna* falló), cambia esta lógica.
-        print("\n[DB] Realizando COMMIT de los cambios de cuotas...")
-        conexion.commit()
-        proceso_exitoso = True # Marcamos éxito si llegamos aquí y hicimos commit
-        print("(+) Commit de cuotas realizado.")
-
-except Exception as e_general_cuotas:
-    # Error general fuera del bucle de facturas
-    print(f"\n[ERROR] ERROR GENERAL INESPERADO (Generación Cuotas): {e_general_cuotas}")
-    proceso_exitoso = False
-    if conexion: # Intentar rollback si hubo conexión
-        try:
-            print("[DB] Intentando realizar ROLLBACK debido a error general...")
-            conexion.rollback()
-            print("(-) Rollback realizado.")
-        except Exception as rb_err:
-            print(f"[WARN] Error durante el rollback: {rb_err}")
-
-finally:
-    # 6. MOSTRAR RESUMEN DE CUOTAS
-    print("\n--- Resumen Generación Cuotas ---")
-    print(f"Facturas leídas BD elegibles : {facturas_leidas}")
-    print(f"Facturas omitidas (datos/err): {facturas_omitidas_data}")
-    print(f"Facturas procesadas cuotas   : {facturas_procesadas}")
-    print("-----------------------------------")
-    print(f"Registros de cuotas eliminados: {cuotas_eliminadas}")
-    print(f"Registros de cuotas generados : {cuotas_generadas_total}")
-    print("-----------------------------------")
-    print(f"  Cuotas Pagadas    : {cuotas_pagadas}")
-    print(f"  Cuotas Pendientes : {cuotas_pendientes}")
-    print(f"  Cuotas Parciales  : {cuotas_parciales}")
-    print(f"  (Suma estados: {cuotas_pagadas + cuotas_pendientes + cuotas_parciales})")
-    print("-----------------------------------")
-    print(f"  Cuotas Vencidas   : {cuotas_vencidas}")
-    print(f"  Cuotas Por Vencer : {cuotas_por_vencer}")
-    print(f"  (Suma vencimiento: {cuotas_vencidas + cuotas_por_vencer})")
-    if errores_calculo_fecha > 0:
-        print(f"Errores cálculo fecha : {errores_calculo_fecha}")
-    print("===================================")
-
-    # 7. CERRAR RECURSOS DE ESTE SCRIPT
-    if cursor:
-        cursor.close()
-        print("[DB] Cursor de cuotas cerrado.")
-    if conexion and conexion.is_connected():
-        conexion.close()
-        print("[DB] Conexión a MySQL cerrada para cuotas.")
-
-# 8. SALIDA FINAL DEL SCRIPT DE CUOTAS (para subprocess)
-if proceso_exitoso:
-    print("\n[OK] Script de generación de cuotas finalizado correctamente.")
-    sys.exit(0) # Código 0 indica éxito
-else:
-    print("\n[ERROR] Script de generación de cuotas finalizado con errores.")
-    sys.exit(1) # Código 1 indica error
\ No newline at end of file
+                print("[DB] Intentando realizar ROLLBACK debido a error general...")
+                conexion.rollback()
+                print("(-) Rollback realizado.")
+            except Exception as rb_err:
+                print(f"[WARN] Error durante el rollback: {rb_err}")
+
+    finally:
+        # 6. MOSTRAR RESUMEN DE CUOTAS
+        marcar_fase("resumen")
+        print("\n--- Resumen Generación Cuotas ---")
+        print(f"Modo                         : {'Completo' if modo_completo else 'Incremental'}")
+        print(f"Facturas leídas BD elegibles : {facturas_leidas}")
+        if not modo_completo:
+            print(f"Facturas sin cambios         : {facturas_sin_cambios}")
+            print(f"Facturas ya no elegibles     : {facturas_retiradas}")
+            print(f"Cuotas con vencimiento refrescado: {cuotas_estado_actualizado}")
+        print(f"Facturas omitidas (datos/err): {facturas_omitidas_data}")
+        print(f"Facturas procesadas cuotas   : {facturas_procesadas}")
+        print("-----------------------------------")
+        print(f"Registros de cuotas eliminados: {cuotas_eliminadas}")
+        print(f"Registros de cuotas generados : {cuotas_generadas_total}")
+        print("-----------------------------------")
+        print(f"  Cuotas Pagadas    : {cuotas_pagadas}")
+        print(f"  Cuotas Pendientes : {cuotas_pendientes}")
+        print(f"  Cuotas Parciales  : {cuotas_parciales}")
+        print(f"  (Suma estados: {cuotas_pagadas + cuotas_pendientes + cuotas_parciales})")
+        print("-----------------------------------")
+        print(f"  Cuotas Vencidas   : {cuotas_vencidas}")
+        print(f"  Cuotas Por Vencer : {cuotas_por_vencer}")
+        print(f"  (Suma vencimiento: {cuotas_vencidas + cuotas_por_vencer})")
+        if errores_calculo_fecha > 0:
+            print(f"Errores cálculo fecha : {errores_calculo_fecha}")
+        print("===================================")
+
+        # 7. CERRAR RECURSOS DE ESTE SCRIPT
+        if cursor:
+            cursor.close()
+            print("[DB] Cursor de cuotas cerrado.")
+        if conexion_propia and conexion and conexion.is_connected():
+            conexion.close()
+            print("[DB] Conexión a MySQL cerrada para cuotas.")
+        elif conexion and conexion.is_connected():
+            # Conexión compartida: se devuelve con los chequeos de claves activos
+            try: aplicar_sesion(conexion, SESION_NORMAL)
+            except Exception as e_sesion: print(f"[WARN] No se pudo restaurar la sesión: {e_sesion}")
+
+    # 8. RESULTADO DE LA ETAPA
+    if proceso_exitoso:
+        print("\n[OK] Script de generación de cuotas finalizado correctamente.")
+    else:
+        print("\n[ERROR] Script de generación de cuotas finalizado con errores.")
+    return {
+        "exito": proceso_exitoso,
+        "modo_completo": modo_completo,
+        "facturas_leidas": facturas_leidas,
+        "facturas_procesadas": facturas_procesadas,
+        "facturas_omitidas_data": facturas_omitidas_data,
+        "facturas_sin_cambios": facturas_sin_cambios,
+        "facturas_retiradas": facturas_retiradas,
+        "cuotas_eliminadas": cuotas_eliminadas,
+        "cuotas_generadas_total": cuotas_generadas_total,
+        "cuotas_estado_actualizado": cuotas_estado_actualizado,
+        "cuotas_pagadas": cuotas_pagadas,
+        "cuotas_pendientes": cuotas_pendientes,
+        "cuotas_parciales": cuotas_parciales,
+        "cuotas_vencidas": cuotas_vencidas,
+        "cuotas_por_vencer": cuotas_por_vencer,
+        "errores_calculo_fecha": errores_calculo_fecha,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera las cuotas de las facturas elegibles.")
+    parser.add_argument("--full", action="store_true", help="Borrar y regenerar TODAS las cuotas (modo completo).")
+    args = parser.parse_args()
+    resultado = ejecutar(modo_completo=args.full)
+    sys.exit(0 if resultado["exito"] else 1)
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+# Guardar como: historial.py
+
+# Historial de corridas de las etapas: un registro por etapa ejecutada (desde app.py o desde
+# pipeline.py por consola) con inicio/fin, duración por fase (fases.py), filas leídas, escritas
+# y omitidas por motivo, sentencias y espera por bloqueos en la BD, contadores y errores, en
+# una tabla SQLite local (la misma trabajos.db de cola_trabajos.py). app.py lo muestra en
+# /historial, lo publica en /historial.json y, resumido, en /metrics (metricas.py).
+# Uso: python historial.py [etapa] [--limite N]  -> últimas corridas por consola
+
+import argparse
+import json
+import os
+import sqlite3
+import time
+
+# --- Configuración ---
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RUTA_BD_HISTORIAL = os.environ.get("IMPORTAR_ODOO_TRABAJOS", os.path.join(BASE_DIR, "trabajos.db"))
+LIMITE_DEFECTO = 200
+
+SQL_CREAR_TABLA = """
+    CREATE TABLE IF NOT EXISTS historial_etapas (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        id_trabajo TEXT,               -- NULL si la corrida fue por consola (pipeline.py)
+        clave TEXT NOT NULL,
+        nombre TEXT NOT NULL,
+        inicio REAL NOT NULL,          -- Epoch (s)
+        fin REAL,
+        duracion REAL NOT NULL,
+        exito INTEGER NOT NULL,
+        filas_entrada INTEGER,
+        filas_salida INTEGER,
+        fases TEXT,                    -- JSON {fase: segundos}
+        filas_omitidas TEXT,           -- JSON {motivo: filas}
+        sentencias_bd INTEGER,         -- NULL si performance_schema no estaba disponible
+        espera_bloqueos REAL,          -- Segundos
+        resultado TEXT,                -- JSON con los contadores de la etapa
+        error TEXT NOT NULL DEFAULT ''
+    )
+"""
+# Columnas agregadas después de crear la tabla (bases trabajos.db ya existentes)
+COLUMNAS_AGREGADAS = {"filas_omitidas": "TEXT", "sentencias_bd": "INTEGER", "espera_bloqueos": "REAL"}
+SQL_CREAR_INDICE = "CREATE INDEX IF NOT EXISTS ix_historial_clave_inicio ON historial_etapas (clave, inicio)"
+
+# --- Funciones Auxiliares ---
+def conectar_bd(ruta=None):
+    conexion = sqlite3.connect(ruta or RUTA_BD_HISTORIAL, timeout=30, isolation_level=None)
+    conexion.row_factory = sqlite3.Row
+    conexion.execute("PRAGMA journal_mode=WAL")
+    conexion.execute(SQL_CREAR_TABLA)
+    existentes = {fila["name"] for fila in conexion.execute("PRAGMA table_info(historial_etapas)")}
+    for columna, definicion in COLUMNAS_AGREGADAS.items():
+        if columna not in existentes:
+            conexion.execute(f"ALTER TABLE historial_etapas ADD COLUMN {columna} {definicion}")
+    conexion.execute(SQL_CREAR_INDICE)
+    return conexion
+
+def registrar_etapas(etapas, id_trabajo=None, ruta=None):
+    """Guarda los dicts de pipeline.ejecutar_etapa (las etapas omitidas no se registran)."""
+    filas = [(id_trabajo, etapa["clave"], etapa["nombre"], etapa.get("inicio") or time.time(), etapa.get("fin"),
+              round(etapa["duracion"], 3), int(etapa["exito"]), etapa.get("filas_entrada"), etapa.get("filas_salida"),
+              json.dumps(etapa.get("fases") or {}), json.dumps(etapa.get("filas_omitidas") or {}), etapa.get("sentencias_bd"),
+              etapa.get("espera_bloqueos"), json.dumps(etapa["resultado"], default=str), etapa["error"])
+             for etapa in etapas if etapa["resultado"] is not None or not etapa["error"].startswith("Omitida")]
+    if not filas: return 0
+    conexion = conectar_bd(ruta)
+    try:
+        conexion.executemany(
+            "INSERT INTO historial_etapas (id_trabajo, clave, nombre, inicio, fin, duracion, exito, filas_entrada, "
+            "filas_salida, fases, filas_omitidas, sentencias_bd, espera_bloqueos, resultado, error) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", filas)
+    finally:
+        conexion.close()
+    return len(filas)
+
+def _a_dict(fila):
+    corrida = dict(fila)
+    corrida["exito"] = bool(corrida["exito"])
+    corrida["fases"] = json.loads(corrida["fases"]) if corrida["fases"] else {}
+    corrida["filas_omitidas"] = json.loads(corrida["filas_omitidas"]) if corrida["filas_omitidas"] else {}
+    corrida["resultado"] = json.loads(corrida["resultado"]) if corrida["resultado"] else None
+    # Rendimiento: filas leídas (o escritas, si la etapa no lee Excel) por segundo
+    filas = corrida["filas_entrada"] if corrida["filas_entrada"] is not None else corrida["filas_salida"]
+    corrida["filas_por_segundo"] = round(filas / corrida["duracion"], 1) if filas and corrida["duracion"] > 0 else None
+    return corrida
+
+def listar_corridas(clave=None, limite=LIMITE_DEFECTO, desde=None, ruta=None):
+    """Corridas de etapas, de la más reciente a la más antigua (`clave` y `desde` epoch filtran)."""
+    condiciones, parametros = [], []
+    if clave:
+        condiciones.append("clave = ?"); parametros.append(clave)
+    if desde:
+        condiciones.append("inicio >= ?"); parametros.append(desde)
+    donde = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+    conexion = conectar_bd(ruta)
+    try:
+        filas = conexion.execute(f"SELECT * FROM historial_etapas {donde} ORDER BY inicio DESC LIMIT ?", (*parametros, limite))
+        return [_a_dict(fila) for fila in filas]
+    finally:
+        conexion.close()
+
+# --- Lógica Principal ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Muestra las últimas corridas de las etapas.")
+    parser.add_argument("etapa", nargs="?", help="Clave de la etapa (por defecto todas).")
+    parser.add_argument("--limite", type=int, default=20, help="Cantidad de corridas a mostrar.")
+    args = parser.parse_args()
+
+    corridas = listar_corridas(args.etapa, args.limite)
+    if not corridas:
+        print("[INFO] No hay corridas registradas.")
+    for corrida in corridas:
+        fases_texto = ", ".join(f"{fase} {segundos:.1f}s" for fase, segundos in corrida["fases"].items())
+        print(f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(corrida['inicio']))}  {corrida['clave']:<25} "
+              f"{'OK' if corrida['exito'] else 'ERROR':<6} {corrida['duracion']:8.1f} s  "
+              f"filas {corrida['filas_entrada'] if corrida['filas_entrada'] is not None else '--'} -> "
+              f"{corrida['filas_salida'] if corrida['filas_salida'] is not None else '--'}  [{fases_texto}]")
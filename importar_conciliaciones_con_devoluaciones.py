@@ -2,8 +2,10 @@
 # Guardar como: importar_conciliaciones.py
 
 import pandas as pd
-from decimal import Decimal, InvalidOperation, DivisionByZero
 from conexion_mysql import conectar
+import lectura_excel # Lectura de Excel con caché columnar / por bloques
+from carga_masiva import insertar_por_lotes
+from limpieza import limpiar_entero, limpiar_fecha, limpiar_monto_escalado, escalado_a_texto, dividir_escalados, DECIMALES_TASA
 import sys
 import numpy as np
 
@@ -40,6 +42,17 @@ DIARIOS_A_EXCLUIR = [
 ]
 # Excluiremos "Notas de proveedor" y otros implícitamente al no estar en esta lista.
 
+# --- Lectura por bloques ---
+# El export completo de account.move.line supera el millón de líneas: con LECTURA_POR_BLOQUES
+# la hoja se recorre en streaming (ver lectura_excel.leer_excel_por_bloques) y cada bloque pasa
+# por renombrar -> fill-down -> limpiar -> insertar antes de leer el siguiente, así la memoria
+# no depende del tamaño del archivo. El fill-down arrastra el último valor del bloque anterior.
+LECTURA_POR_BLOQUES = True # False = leer el Excel completo de una vez (con caché Parquet)
+TAM_BLOQUE_FILAS = 50_000
+EXPORTAR_VALIDACION = True # Exporta las conciliaciones preparadas para revisión
+ARCHIVO_VALIDACION = "reporte_validacion data frame.csv" # CSV: se escribe bloque a bloque
+SAVEPOINT_BLOQUE = "bloque_conciliaciones" # Para deshacer los lotes ya insertados de un bloque que falla
+
 # --- Variables Globales y Contadores ---
 conexion = None
 cursor = None
@@ -55,28 +68,14 @@ conciliaciones_omitidas_no_factura = 0
 conciliaciones_con_error_fila = 0
 tabla_truncada = False
 
-# --- Funciones Auxiliares ---
-def limpiar_decimal_conc(valor):
-    if pd.isna(valor): return Decimal('0.0')
-    try:
-        valor_str = str(valor).replace(',', '.').strip()
-        if valor_str.lower() in ["<na>", "nan", "none", "", "#n/a", "false"]: return Decimal('0.0')
-        dec_valor = Decimal(valor_str); return dec_valor if dec_valor.is_finite() else Decimal('0.0')
-    except: return Decimal('0.0')
-    
-def calcular_tasa(row):
-    monto_vef = row['Monto_vef']
-    monto_aplicado = row['monto_aplicado']
-    if monto_aplicado is not None and monto_aplicado != Decimal('0.0') and monto_vef is not None:
-        try: return (monto_vef / monto_aplicado).quantize(Decimal('0.00000001'))
-        except (InvalidOperation, DivisionByZero): return Decimal('0.0')
-    return Decimal('0.0')
-
-def limpiar_int_conc(valor):
-    if pd.isna(valor): return None
-    try: return int(float(valor))
-    except: return None
+COLUMNAS_REQUERIDAS = ['fecha_asiento', 'idodoo_pago', 'idodoo_conciliacion', 'diario_asiento',
+                       'monto_aplicado_str', 'monto_vef_str', 'num_factura_aplicada_raw']
+FILL_DOWN_COLS = ['diario_asiento', 'fecha_asiento', 'numero_asiento',
+                  'referencia_asiento', 'id_linea_asiento', 'idodoo_pago']
+COLUMNAS_DB = ['id_pago', 'id_factura', 'idodoo_conciliacion',
+               'monto_aplicado', 'Monto_vef', 'tasa', 'fecha_aplicacion']
 
+# --- Funciones Auxiliares ---
 def extraer_num_factura_limpio(valor_raw):
     if pd.isna(valor_raw): return None
     try:
@@ -87,6 +86,132 @@ def extraer_num_factura_limpio(valor_raw):
         return num_factura if num_factura else None
     except: return None
 
+def leer_bloques():
+    """Bloques del Excel de asientos con columnas renombradas (uno solo si LECTURA_POR_BLOQUES=False)."""
+    if LECTURA_POR_BLOQUES:
+        return lectura_excel.leer_excel_por_bloques(ARCHIVO_EXCEL_ASIENTOS, NOMBRE_HOJA_EXCEL, dtype=str,
+                                                    renombrar=COLUMN_MAPPING, tam_bloque=TAM_BLOQUE_FILAS)
+    return [lectura_excel.leer_excel(ARCHIVO_EXCEL_ASIENTOS, NOMBRE_HOJA_EXCEL, dtype=str, renombrar=COLUMN_MAPPING)]
+
+def rellenar_hacia_abajo(df, ultimos_valores):
+    """Fill-down de FILL_DOWN_COLS continuando con el último valor del bloque anterior (`ultimos_valores` se actualiza)."""
+    for col in FILL_DOWN_COLS:
+        if col not in df.columns:
+            if col not in ultimos_valores: print(f"[WARN] Columna '{col}' para fill-down no encontrada.")
+            ultimos_valores[col] = None
+            continue
+        serie = df[col].ffill()
+        if ultimos_valores.get(col) is not None: serie = serie.fillna(ultimos_valores[col])
+        df[col] = serie
+        validos = serie.dropna()
+        if len(validos) > 0: ultimos_valores[col] = validos.iloc[-1]
+
+def preparar_bloque(df_asientos, ultimos_valores):
+    """
+    Limpieza, IDs ficticios, fill-down, filtro de diarios y conversión de tipos de un bloque.
+    Devuelve (df_conciliaciones, lineas_diario_excluido).
+    """
+    columnas_faltantes = [col for col in COLUMNAS_REQUERIDAS if col not in df_asientos.columns]
+    if columnas_faltantes: raise ValueError(f"Faltan columnas mapeadas: {', '.join(columnas_faltantes)}.")
+
+    # Limpieza inicial y conversión de IDs clave
+    for col in df_asientos.columns:
+        if pd.api.types.is_string_dtype(df_asientos[col]):
+            df_asientos[col] = df_asientos[col].str.strip().replace(['', '<NA>', 'None', 'nan', 'NaN', 'FALSE', 'False', 'false'], np.nan)
+    df_asientos['idodoo_conciliacion'] = limpiar_entero(df_asientos['idodoo_conciliacion'])
+    df_asientos['idodoo_pago'] = limpiar_entero(df_asientos['idodoo_pago']) # Limpiar antes de crear ficticios
+    df_asientos['id_linea_asiento'] = limpiar_entero(df_asientos['id_linea_asiento'])
+
+    # --- Crear ID Ficticio ANTES de fill-down ---
+    # Condición: Sin ID Pago, PERO con Fecha, Diario e ID de línea de asiento
+    mascara_ficticios = df_asientos['idodoo_pago'].isna() & \
+        df_asientos['fecha_asiento'].notna() & \
+        df_asientos['diario_asiento'].notna() & \
+        df_asientos['id_linea_asiento'].notna()
+    df_asientos.loc[mascara_ficticios, 'idodoo_pago'] = -df_asientos.loc[mascara_ficticios, 'id_linea_asiento'].abs() # Asignar negativo
+
+    # Aplicar Fill-Down (propaga IDs reales y ficticios, también desde el bloque anterior)
+    rellenar_hacia_abajo(df_asientos, ultimos_valores)
+
+    # --- Filtrar EXCLUYENDO Diarios ---
+    df_filtrado_diario = df_asientos[~df_asientos['diario_asiento'].isin(DIARIOS_A_EXCLUIR)]
+    lineas_diario_excluido = len(df_asientos) - len(df_filtrado_diario)
+
+    # Filtrar filas que representan una conciliación válida
+    df_conciliaciones = df_filtrado_diario.dropna(subset=['idodoo_conciliacion']).copy()
+    if len(df_conciliaciones) == 0: return df_conciliaciones, lineas_diario_excluido
+
+    # Limpiar y convertir tipos restantes
+    df_conciliaciones['idodoo_pago'] = limpiar_entero(df_conciliaciones['idodoo_pago']) # Puede ser negativo
+    monto_aplicado = limpiar_monto_escalado(df_conciliaciones['monto_aplicado_str'])
+    monto_vef = limpiar_monto_escalado(df_conciliaciones['monto_vef_str'])
+    df_conciliaciones['monto_aplicado'] = escalado_a_texto(monto_aplicado)
+    df_conciliaciones['Monto_vef'] = escalado_a_texto(monto_vef)
+    df_conciliaciones['fecha_aplicacion'] = limpiar_fecha(df_conciliaciones['fecha_asiento'])
+    df_conciliaciones['num_factura_aplicada'] = df_conciliaciones['num_factura_aplicada_raw'].apply(extraer_num_factura_limpio)
+
+    # División exacta sobre los centavos, 8 decimales; monto_aplicado 0 -> tasa 0
+    tasa = dividir_escalados(monto_vef, monto_aplicado, DECIMALES_TASA)
+    df_conciliaciones['tasa'] = escalado_a_texto(tasa, DECIMALES_TASA)
+    return df_conciliaciones, lineas_diario_excluido
+
+def obtener_pago_ficticio(cursor, idodoo_pago, fila, pagos_ficticios_dict):
+    """
+    ID interno del pago ficticio (Nota de Crédito) `idodoo_pago` (negativo): se busca en la BD
+    y, si no existe, se crea. Se recuerda en `pagos_ficticios_dict` para los bloques siguientes.
+    """
+    global pagos_ficticios_creados
+    if idodoo_pago in pagos_ficticios_dict: return pagos_ficticios_dict[idodoo_pago]
+    id_pago_ficticio = None
+    try:
+        cursor.execute(f"SELECT id FROM {NOMBRE_TABLA_PAGOS} WHERE idodoo_pago = %s", (idodoo_pago,))
+        pago_ficticio_existente = cursor.fetchone()
+        if pago_ficticio_existente:
+            id_pago_ficticio = pago_ficticio_existente['id']
+        else:
+            cursor.execute(
+                f"""INSERT INTO {NOMBRE_TABLA_PAGOS}
+                    (idodoo_pago, fecha_pago, monto, diario, referencia, id_cliente)
+                    VALUES (%s, %s, %s, %s, %s, %s)""",
+                (idodoo_pago, fila.get('fecha_aplicacion'), '0.00',
+                 'Nota de Crédito', f'NC Aplicada Línea: {fila.get("id_linea_asiento")}', None) # Usar id_linea_asiento en referencia
+            )
+            id_pago_ficticio = cursor.lastrowid
+            if id_pago_ficticio:
+                pagos_ficticios_creados += 1
+            else:
+                print(f"[ERROR] ¡No se pudo obtener el ID del pago ficticio recién insertado para idodoo_pago {idodoo_pago}!")
+    except Exception as e_db_ficticio:
+        print(f"\n[ERROR] Error al buscar/crear pago ficticio para idodoo_pago {idodoo_pago}: {e_db_ficticio}")
+    pagos_ficticios_dict[idodoo_pago] = id_pago_ficticio
+    return id_pago_ficticio
+
+def insertar_bloque(cursor, df_validas):
+    """
+    Inserta las conciliaciones de un bloque en lotes; si un lote falla, se reintenta el bloque
+    fila a fila para contar los errores. El bloque va en varias sentencias INSERT, así que antes
+    del reintento se deshacen (ROLLBACK TO SAVEPOINT) los lotes que sí llegaron a insertarse.
+    """
+    global conciliaciones_insertadas_bd, conciliaciones_con_error_fila
+    filas = list(df_validas[COLUMNAS_DB].itertuples(index=False, name=None))
+    cursor.execute(f"SAVEPOINT {SAVEPOINT_BLOQUE}")
+    try:
+        insertadas = insertar_por_lotes(cursor, NOMBRE_TABLA_CONCILIADOS, COLUMNAS_DB, filas)
+        cursor.execute(f"RELEASE SAVEPOINT {SAVEPOINT_BLOQUE}")
+        conciliaciones_insertadas_bd += insertadas
+        return
+    except Exception as e_lote:
+        print(f"\n[WARN] Falló la inserción por lotes ({e_lote}). Reintentando fila a fila...")
+        cursor.execute(f"ROLLBACK TO SAVEPOINT {SAVEPOINT_BLOQUE}")
+        cursor.execute(f"RELEASE SAVEPOINT {SAVEPOINT_BLOQUE}")
+    for indice, fila in zip(df_validas.index, filas):
+        try:
+            insertar_por_lotes(cursor, NOMBRE_TABLA_CONCILIADOS, COLUMNAS_DB, [fila])
+            conciliaciones_insertadas_bd += 1
+        except Exception as e:
+            print(f"\n[ERROR] en fila Excel {indice + 2} (Concil Odoo: {fila[2]}): {e}")
+            conciliaciones_con_error_fila += 1
+
 # --- Lógica Principal ---
 try:
     # 1. CONECTAR A DB
@@ -109,213 +234,78 @@ try:
     cursor.execute(f"SELECT id, idodoo_pago FROM {NOMBRE_TABLA_PAGOS} WHERE idodoo_pago IS NOT NULL AND idodoo_pago > 0")
     pagos_reales_dict = {int(p['idodoo_pago']): p['id'] for p in cursor.fetchall() if p.get('idodoo_pago')}
     print(f"[OK] Mapeo de {len(pagos_reales_dict)} pagos reales obtenido.")
-    pagos_ficticios_creados_dict = {} # Para IDs negativos creados en esta ejecución
+    pagos_ficticios_dict = {} # idodoo_pago negativo -> id interno (encontrado o creado en esta ejecución)
 
     print("[DB] Obteniendo mapeo de Facturas...")
     cursor.execute("SELECT id, num_factura FROM facturas WHERE num_factura IS NOT NULL AND num_factura != ''")
     facturas_dict = {f['num_factura'].strip(): f['id'] for f in cursor.fetchall() if f.get('num_factura')}
     print(f"[OK] Mapeo de {len(facturas_dict)} facturas obtenido.")
 
-    # 3. LEER EXCEL
-    print(f"[INFO] Leyendo archivo Excel: {ARCHIVO_EXCEL_ASIENTOS}...")
+    # 3. LEER Y PROCESAR EXCEL (por bloques)
+    modo = f"en bloques de {TAM_BLOQUE_FILAS} filas" if LECTURA_POR_BLOQUES else "completo"
+    print(f"[INFO] Leyendo archivo Excel {modo}: {ARCHIVO_EXCEL_ASIENTOS}...")
+    num_filas_conciliacion = 0
+    ultimos_valores = {} # Último valor de cada columna de fill-down al final del bloque anterior
+    validacion_escrita = False
     try:
-        df_asientos = pd.read_excel(ARCHIVO_EXCEL_ASIENTOS, sheet_name=NOMBRE_HOJA_EXCEL, engine="openpyxl", dtype=str)
-        lineas_leidas_excel = len(df_asientos)
+        bloques = leer_bloques()
+        for df_asientos in bloques:
+            lineas_leidas_excel += len(df_asientos)
+            df_conciliaciones, lineas_diario_excluido = preparar_bloque(df_asientos, ultimos_valores)
+            del df_asientos
+            conciliaciones_omitidas_diario_invalido += lineas_diario_excluido
+            num_filas_conciliacion += len(df_conciliaciones)
+            if len(df_conciliaciones) == 0: continue
+
+            # Mapear IDs internos; los pagos ficticios se buscan/crean una vez por idodoo_pago
+            df_conciliaciones['id_factura'] = df_conciliaciones['num_factura_aplicada'].map(facturas_dict).astype('Int64')
+            conciliaciones_omitidas_no_factura += int(df_conciliaciones['id_factura'].isna().sum())
+            idodoo_pago = df_conciliaciones['idodoo_pago']
+            id_pago = idodoo_pago.map(pagos_reales_dict)
+            conciliaciones_omitidas_no_pago_real += int(((idodoo_pago > 0) & id_pago.isna()).sum())
+            negativos = df_conciliaciones[(idodoo_pago < 0).fillna(False)].drop_duplicates('idodoo_pago')
+            ids_ficticios = {int(fila['idodoo_pago']): obtener_pago_ficticio(cursor, int(fila['idodoo_pago']), fila, pagos_ficticios_dict)
+                             for _, fila in negativos.iterrows()}
+            df_conciliaciones['id_pago'] = id_pago.fillna(idodoo_pago.map(ids_ficticios)).astype('Int64')
+            df_conciliaciones = df_conciliaciones.astype(object).where(pd.notna(df_conciliaciones), None)
+
+            if EXPORTAR_VALIDACION:
+                df_conciliaciones.to_csv(ARCHIVO_VALIDACION, mode="a" if validacion_escrita else "w",
+                                         header=not validacion_escrita, index=False)
+                validacion_escrita = True
+
+            # 4. INSERTAR CONCILIACIONES DEL BLOQUE
+            completas = df_conciliaciones['id_pago'].notna() & df_conciliaciones['id_factura'].notna() & \
+                df_conciliaciones['idodoo_conciliacion'].notna()
+            insertar_bloque(cursor, df_conciliaciones[completas])
+            print(f"[INFO] {lineas_leidas_excel} líneas leídas, {conciliaciones_insertadas_bd} conciliaciones insertadas...")
     except FileNotFoundError: raise Exception(f"No se encontró el archivo Excel: {ARCHIVO_EXCEL_ASIENTOS}")
-    except Exception as e: raise Exception(f"Fatal al leer Excel: {e}")
 
+    conciliaciones_omitidas_no_info = lineas_leidas_excel - conciliaciones_omitidas_diario_invalido - num_filas_conciliacion
     if lineas_leidas_excel == 0:
         print("[INFO] Archivo Excel vacío.")
         proceso_exitoso = True
     else:
-        print(f"[INFO] Archivo leído. {lineas_leidas_excel} líneas encontradas.")
-
-        # 4. PREPARAR DATAFRAME
-        print("[INFO] Preparando DataFrame...")
-        df_asientos = df_asientos.rename(columns=COLUMN_MAPPING)
-        # ... (Verificar columnas requeridas - sin cambios) ...
-        columnas_requeridas = ['fecha_asiento', 'idodoo_pago', 'idodoo_conciliacion', 'diario_asiento',
-                            'monto_aplicado_str', 'monto_vef_str', 'num_factura_aplicada_raw']
-        columnas_presentes = df_asientos.columns.tolist()
-        columnas_faltantes = [col for col in columnas_requeridas if col not in columnas_presentes]
-        if columnas_faltantes: raise ValueError(f"Faltan columnas mapeadas: {', '.join(columnas_faltantes)}.")
-        
-        # Limpieza inicial y conversión de IDs clave
-        for col in df_asientos.columns:
-            if df_asientos[col].dtype == 'object':
-                df_asientos[col] = df_asientos[col].str.strip().replace(['', '<NA>', 'None', 'nan', 'NaN', 'FALSE', 'False', 'false'], np.nan)
-        df_asientos['idodoo_conciliacion'] = df_asientos['idodoo_conciliacion'].apply(limpiar_int_conc)
-        df_asientos['idodoo_pago'] = df_asientos['idodoo_pago'].apply(limpiar_int_conc) # Limpiar antes de crear ficticios
-        df_asientos['id_linea_asiento'] = df_asientos['id_linea_asiento'].apply(limpiar_int_conc)
-                
-        # --- Crear ID Ficticio ANTES de fill-down ---
-        print("[INFO] Asignando IDs ficticios negativos a Notas de Crédito...")
-        ids_ficticios_asignados = 0
-        for index, row in df_asientos.iterrows():
-            # Condición: Sin ID Pago, PERO con Fecha, Diario y ID Conciliación
-            if pd.isna(row['idodoo_pago']) and \
-                pd.notna(row['fecha_asiento']) and \
-                pd.notna(row['diario_asiento']) and \
-                pd.notna(row['id_linea_asiento']):
-                #id_concil = row['idodoo_conciliacion']
-                id_concil = row['id_linea_asiento']
-                df_asientos.loc[index, 'idodoo_pago'] = -abs(id_concil) # Asignar negativo
-                ids_ficticios_asignados += 1
-        if ids_ficticios_asignados > 0: print(f"[OK] {ids_ficticios_asignados} IDs ficticios asignados en DataFrame.")
-        
-        # ---------------------------------------------
-
-        # Aplicar Fill-Down (ahora propagará IDs reales y ficticios)
-        fill_down_cols = ['diario_asiento', 'fecha_asiento', 'numero_asiento',
-                        'referencia_asiento', 'id_linea_asiento', 'idodoo_pago']
-        print("[INFO] Aplicando lógica 'fill-down'...")
-        for col in fill_down_cols:
-            if col in df_asientos.columns: df_asientos[col] = df_asientos[col].ffill()
-            else: print(f"[WARN] Columna '{col}' para fill-down no encontrada.")
-            
-        # --- Filtrar EXCLUYENDO Diarios ---
-        print(f"[INFO] Excluyendo diarios no deseados: {DIARIOS_A_EXCLUIR}...")
-        # Usamos ~ para negar la condición .isin()
-        df_filtrado_diario = df_asientos[~df_asientos['diario_asiento'].isin(DIARIOS_A_EXCLUIR)].copy()
-        conciliaciones_omitidas_diario_invalido = len(df_asientos) - len(df_filtrado_diario)
-        if conciliaciones_omitidas_diario_invalido > 0: print(f"[INFO] {conciliaciones_omitidas_diario_invalido} líneas ignoradas por pertenecer a diarios excluidos.")
-        # ---------------------------------
-        
-        # Filtrar filas que representan una conciliación válida
-        print("[INFO] Filtrando filas con ID de conciliación...")
-        df_conciliaciones = df_filtrado_diario.dropna(subset=['idodoo_conciliacion']).copy()
-        num_filas_conciliacion = len(df_conciliaciones)
-        # Ajustar omitidas_no_info (total leído - omitidas diario - filas con conciliación)
-        conciliaciones_omitidas_no_info = lineas_leidas_excel - conciliaciones_omitidas_diario_invalido - num_filas_conciliacion
-        print(f"[OK] {num_filas_conciliacion} filas de conciliación válidas encontradas para procesar.")
+        print(f"[INFO] Archivo procesado. {lineas_leidas_excel} líneas encontradas.")
+        if conciliaciones_omitidas_diario_invalido > 0: print(f"[INFO] {conciliaciones_omitidas_diario_invalido} líneas ignoradas por pertenecer a diarios excluidos: {DIARIOS_A_EXCLUIR}.")
+        print(f"[OK] {num_filas_conciliacion} filas de conciliación válidas procesadas.")
         if conciliaciones_omitidas_no_info > 0: print(f"[INFO] {conciliaciones_omitidas_no_info} líneas adicionales ignoradas (sin ID conciliación después de otros filtros).")
-        
-        if num_filas_conciliacion > 0:
-            
-            # Limpiar y convertir tipos restantes
-            print("[INFO] Limpiando tipos de datos restantes...")
-            # Asegurarse que los IDs sean enteros después de ffill y filtros
-            df_conciliaciones['idodoo_conciliacion'] = df_conciliaciones['idodoo_conciliacion'].apply(limpiar_int_conc)
-            df_conciliaciones['idodoo_pago'] = df_conciliaciones['idodoo_pago'].apply(limpiar_int_conc) # Puede ser negativo
-            df_conciliaciones['monto_aplicado'] = df_conciliaciones['monto_aplicado_str'].apply(limpiar_decimal_conc)
-            df_conciliaciones['Monto_vef'] = df_conciliaciones['monto_vef_str'].apply(limpiar_decimal_conc)
-            df_conciliaciones['fecha_aplicacion'] = pd.to_datetime(df_conciliaciones['fecha_asiento'], errors='coerce').dt.date
-
-            print("[INFO] Extrayendo número de factura aplicado...")
-            df_conciliaciones['num_factura_aplicada'] = df_conciliaciones['num_factura_aplicada_raw'].apply(extraer_num_factura_limpio)
-            
-            print("[INFO] Calculando tasa de cambio...")
-
-            df_conciliaciones['tasa'] = df_conciliaciones.apply(calcular_tasa, axis=1)
-            
-                        
-            print("[INFO] Mapeando IDs internos y creando pagos ficticios en BD...")
-            df_conciliaciones['id_pago'] = pd.NA # Resetear columna para IDs internos
-            df_conciliaciones['id_factura'] = df_conciliaciones['num_factura_aplicada'].map(facturas_dict)
-            conciliaciones_omitidas_no_factura = df_conciliaciones['id_factura'].isna().sum()
-            
-            # Iterar para buscar/crear pagos internos
-            for index, row in df_conciliaciones.iterrows():
-                idodoo_pago_actual = row.get('idodoo_pago') # Ya es int (positivo o negativo) o None
-                id_pago_interno = None
-
-                if idodoo_pago_actual is not None:
-                    if idodoo_pago_actual > 0: # Pago Real
-                        id_pago_interno = pagos_reales_dict.get(idodoo_pago_actual)
-                        if id_pago_interno is None:
-                            conciliaciones_omitidas_no_pago_real += 1
-                            # print(f"[DEBUG] Pago real {idodoo_pago_actual} no encontrado en pagos_reales_dict.") # Debug
-                    else: # Pago Ficticio (idodoo_pago_actual es negativo)
-                        id_pago_ficticio_a_usar = None
-                        # --- CAMBIO: Buscar primero en BD ---
-                        try:
-                            cursor.execute(f"SELECT id FROM {NOMBRE_TABLA_PAGOS} WHERE idodoo_pago = %s", (idodoo_pago_actual,))
-                            pago_ficticio_existente = cursor.fetchone()
-
-                            if pago_ficticio_existente:
-                                # Ya existe en la BD, usar su ID interno
-                                id_pago_ficticio_a_usar = pago_ficticio_existente['id']
-                                # print(f"[DEBUG] Pago ficticio {idodoo_pago_actual} encontrado en BD con ID: {id_pago_ficticio_a_usar}") # Debug
-                            else:
-                                # No existe, hay que crearlo
-                                # print(f"[DEBUG] Pago ficticio {idodoo_pago_actual} NO encontrado en BD. Intentando INSERT...") # Debug
-                                cursor.execute(
-                                    f"""INSERT INTO {NOMBRE_TABLA_PAGOS}
-                                        (idodoo_pago, fecha_pago, monto, diario, referencia, id_cliente)
-                                        VALUES (%s, %s, %s, %s, %s, %s)""",
-                                    (idodoo_pago_actual, row.get('fecha_aplicacion'), Decimal('0.0'),
-                                    'Nota de Crédito', f'NC Aplicada Línea: {row.get("id_linea_asiento")}', None) # Usar id_linea_asiento en referencia
-                                )
-                                id_pago_ficticio_a_usar = cursor.lastrowid # O usar SELECT id... si lastrowid falla
-                                if id_pago_ficticio_a_usar:
-                                    pagos_ficticios_creados += 1
-                                    # No necesitamos el diccionario pagos_ficticios_creados_dict ahora
-                                    # print(f"[DEBUG] Pago ficticio CREADO. Nuevo id_interno: {id_pago_ficticio_a_usar}") # Debug
-                                else:
-                                    print(f"[ERROR] ¡No se pudo obtener el ID del pago ficticio recién insertado para idodoo_pago {idodoo_pago_actual}!")
-
-                        except Exception as e_db_ficticio:
-                            print(f"\n[ERROR] Error al buscar/crear pago ficticio para idodoo_pago {idodoo_pago_actual}: {e_db_ficticio}")
-                        # --- FIN CAMBIO ---
-                        id_pago_interno = id_pago_ficticio_a_usar
-
-                # Asignar ID interno (real o ficticio) o mantener NA si falló/omitido
-                df_conciliaciones.loc[index, 'id_pago'] = id_pago_interno if id_pago_interno is not None else pd.NA
-
-            df_conciliaciones['id_pago'] = df_conciliaciones['id_pago'].astype('Int64')
-            df_conciliaciones['id_factura'] = df_conciliaciones['id_factura'].astype('Int64')
-            df_conciliaciones = df_conciliaciones.replace({np.nan: None, pd.NaT: None, pd.NA: None})
-            print("[OK] Datos de conciliaciones preparados.")
-            # ... (Imprimir warnings de omisiones - sin cambios) ...
-            if pagos_ficticios_creados > 0: print(f"[INFO] Se crearon {pagos_ficticios_creados} registros de pago ficticios (NC).")
-            if conciliaciones_omitidas_no_pago_real > 0: print(f"[WARN] {conciliaciones_omitidas_no_pago_real} omitidas (Pago real no encontrado).")
-            if conciliaciones_omitidas_no_factura > 0: print(f"[WARN] {conciliaciones_omitidas_no_factura} omitidas (Factura no encontrada).")
-
-            # 5. PROCESAR FILAS (SOLO INSERT)
-            print(f"[INFO] Procesando {num_filas_conciliacion} conciliaciones para INSERT en '{NOMBRE_TABLA_CONCILIADOS}'...")
-            columnas_db = ['id_pago', 'id_factura', 'idodoo_conciliacion',
-                        'monto_aplicado', 'Monto_vef', 'tasa', 'fecha_aplicacion']
-            placeholders = ', '.join(['%s'] * len(columnas_db))
-            sql_insert = f"INSERT INTO {NOMBRE_TABLA_CONCILIADOS} ({', '.join(columnas_db)}) VALUES ({placeholders})"
-
-            print("[informa] exportando dataframe a excel")
-            df_conciliaciones.to_excel("reporte_validacion data frame.xlsx", index=False)
-            
-            for index, row in df_conciliaciones.iterrows():
-                print(f"\rProcesando línea Excel {index + 1}/{lineas_leidas_excel}...")
-                if row['id_pago'] is None or row['id_factura'] is None or row['idodoo_conciliacion'] is None:
-                    print (row['id_pago'],row['id_factura'],row['idodoo_conciliacion'])
-                    print ("****** VAMOS por aquí")
-                    continue
-                try:
-                    valores_tupla = (
-                        row.get('id_pago'), row.get('id_factura'), row.get('idodoo_conciliacion'),
-                        str(row.get('monto_aplicado', Decimal('0.0'))), str(row.get('Monto_vef', Decimal('0.0'))),
-                        str(row.get('tasa', Decimal('0.0'))), row.get('fecha_aplicacion')
-                    )
-                    cursor.execute(sql_insert, valores_tupla)
-                    conciliaciones_insertadas_bd += 1
-                except Exception as e:
-                    print(f"\n[ERROR] en fila Excel {index + 2} (Concil Odoo: {row.get('idodoo_conciliacion', 'N/A')}): {e}")
-                    conciliaciones_con_error_fila += 1
-
-            print(f"\n[INFO] Procesamiento de {num_filas_conciliacion} conciliaciones completado.")
-
-            # 6. COMMIT o ROLLBACK FINAL
-            if conciliaciones_con_error_fila == 0:
-                print("\n[DB] Realizando COMMIT final...")
-                conexion.commit()
-                proceso_exitoso = True
-                print("(+) Commit realizado.")
-            else:
-                print(f"\n[WARN] Hubo {conciliaciones_con_error_fila} errores.")
-                print("[DB] Realizando ROLLBACK...")
-                conexion.rollback()
-                proceso_exitoso = False
-                print("(-) Rollback realizado.")
-        else: # Si num_filas_conciliacion == 0
-             print("[INFO] No hubo conciliaciones válidas que procesar después del filtrado.")
-             proceso_exitoso = True
+        if pagos_ficticios_creados > 0: print(f"[INFO] Se crearon {pagos_ficticios_creados} registros de pago ficticios (NC).")
+        if conciliaciones_omitidas_no_pago_real > 0: print(f"[WARN] {conciliaciones_omitidas_no_pago_real} omitidas (Pago real no encontrado).")
+        if conciliaciones_omitidas_no_factura > 0: print(f"[WARN] {conciliaciones_omitidas_no_factura} omitidas (Factura no encontrada).")
+
+        # 5. COMMIT o ROLLBACK FINAL
+        if conciliaciones_con_error_fila == 0:
+            print("\n[DB] Realizando COMMIT final...")
+            conexion.commit()
+            proceso_exitoso = True
+            print("(+) Commit realizado.")
+        else:
+            print(f"\n[WARN] Hubo {conciliaciones_con_error_fila} errores.")
+            print("[DB] Realizando ROLLBACK...")
+            conexion.rollback()
+            proceso_exitoso = False
+            print("(-) Rollback realizado.")
 
 # --- Bloques except y finally ---
 except Exception as e_general:
@@ -2,33 +2,17 @@
 # Guardar como: importar_facturas.py
 
 import pandas as pd
-from datetime import date
 from conexion_mysql import conectar
-import subprocess
+from catalogos import obtener_plazos_pago, resolver_plazos_pago
+from limpieza import limpiar_entero, limpiar_fecha, limpiar_monto_escalado, escalado_a_texto
+import generar_cuotas # Generación de cuotas en el mismo proceso
+import lectura_excel # Lectura de Excel con caché columnar
 import sys
-import os
-import numpy as np # Para manejar NaN
 
 print("--- Script: importar_facturas.py ---")
 
-# --- Funciones Auxiliares ---
-def limpiar_float(valor):
-    # ... (sin cambios) ...
-    try:
-        if pd.isna(valor) or str(valor).strip().lower() in ["<na>", "nan", "none", "", "#n/a"]: return 0.0
-        # Intentar convertir directamente, manejando comas
-        return float(str(valor).replace(',', '.'))
-    except (ValueError, TypeError): return 0.0
-
-def limpiar_int_facturas(valor):
-    # Nueva función auxiliar para limpiar IDs
-    if pd.isna(valor): return None
-    try: return int(float(str(valor).replace(',', '.'))) # Manejar comas y .0
-    except (ValueError, TypeError): return None
-
 # --- Variables ---
 archivo_excel = "C:/mysql_import/Asiento contable (account.move).xlsx" # <- CONFIRMA RUTA
-script_cuotas = "generar_cuotas.py"
 conexion = None
 cursor = None
 importacion_exitosa = False
@@ -55,7 +39,7 @@ try:
     print(f"[INFO] Leyendo archivo Excel: {archivo_excel}")
     try:
         # Leer como string inicialmente
-        df = pd.read_excel(archivo_excel, sheet_name="Sheet1", engine="openpyxl", dtype=str)
+        df = lectura_excel.leer_excel(archivo_excel, "Sheet1", dtype=str)
         total_filas_excel = len(df)
     except FileNotFoundError:
         print(f"[ERROR] Fatal: No se encontró el archivo Excel: {archivo_excel}")
@@ -105,7 +89,7 @@ try:
 
         # Limpieza inicial de Estado e ID (necesarios para borrar/filtrar)
         df['estado_odoo'] = df['estado_odoo'].fillna('').astype(str).str.strip().str.lower()
-        df['idodoo'] = df['idodoo'].apply(limpiar_int_facturas) # Limpiar ID Odoo
+        df['idodoo'] = limpiar_entero(df['idodoo']) # Limpiar ID Odoo
 
         # Filtrar filas sin ID Odoo antes de continuar
         original_count = len(df)
@@ -184,11 +168,19 @@ try:
             df_procesar["id_vendedor"] = df_procesar["vendedor"].apply(map_vendedor)
 
             # Limpiar Fechas y convertir NaN a None
-            df_procesar["fecha_factura"] = pd.to_datetime(df_procesar["fecha_factura"], errors="coerce").dt.date
-            df_procesar["fecha_entrega"] = pd.to_datetime(df_procesar["fecha_entrega"], errors="coerce").dt.date
-            df_procesar["fecha_vencimiento"] = pd.to_datetime(df_procesar["fecha_vencimiento"], errors="coerce").dt.date
+            df_procesar["fecha_factura"] = limpiar_fecha(df_procesar["fecha_factura"])
+            df_procesar["fecha_entrega"] = limpiar_fecha(df_procesar["fecha_entrega"])
+            df_procesar["fecha_vencimiento"] = limpiar_fecha(df_procesar["fecha_vencimiento"])
+            # IDs externos y montos limpios de forma vectorizada (montos en centavos, enviados como texto exacto)
+            df_procesar["idodoo_vendedor"] = limpiar_entero(df_procesar["idodoo_vendedor"])
+            df_procesar["idodoo_clientes"] = limpiar_entero(df_procesar["idodoo_clientes"])
+            total_centavos = limpiar_monto_escalado(df_procesar["total_factura"])
+            df_procesar["total_factura_db"] = escalado_a_texto(total_centavos).where(df_procesar["total_factura"].notna())
+            # Resolver plazos de pago con el catálogo en caché (merge vectorizado)
+            df_procesar["id_plazospago"] = limpiar_entero(df_procesar["idodoo_plazospago"])
+            df_procesar = resolver_plazos_pago(df_procesar, obtener_plazos_pago(cursor))
             # Convertir NaN/NaT a None al final de la preparación
-            df_procesar = df_procesar.replace({np.nan: None, pd.NaT: None})
+            df_procesar = df_procesar.astype(object).where(pd.notna(df_procesar), None)
             print("[OK] Datos preparados para insertar/actualizar.")
 
             # 7. PROCESAR FILAS (INSERT/UPDATE - SOLO PUBLICADAS)
@@ -203,40 +195,22 @@ try:
 
                 print(f"\rProcesando fila {index + 1}/{total_filas_excel} (ID Odoo: {idodoo_actual})...", end="")
                 try:
-                    # Obtener datos de plazos de pago (lógica sin cambios)
-                    cant_cuotas, dias_cuota, dias_credito = None, 0, 0
-                    id_plazospago_seguro = limpiar_int_facturas(row.get("idodoo_plazospago"))
-                    if id_plazospago_seguro:
-                        cursor.execute("SELECT dias_credito, cant_cuotas, dias_cuota FROM plazos_pago WHERE idodoo = %s", (id_plazospago_seguro,))
-                        resultado_plazo = cursor.fetchone()
-                        if resultado_plazo:
-                            dias_credito = resultado_plazo.get('dias_credito', 0) if resultado_plazo.get('dias_credito') is not None else 0
-                            cant_cuotas = resultado_plazo.get('cant_cuotas')
-                            dias_cuota = resultado_plazo.get('dias_cuota', 0) if resultado_plazo.get('dias_cuota') is not None else 0
-                    else:
-                        cant_cuotas = 1
-                        f_factura = row.get("fecha_factura")
-                        f_vencimiento = row.get("fecha_vencimiento")
-                        if f_factura and f_vencimiento and isinstance(f_factura, date) and isinstance(f_vencimiento, date):
-                            try: dias_credito = (f_vencimiento - f_factura).days
-                            except TypeError: dias_credito = 0
-                        else: dias_credito = 0
-                        dias_cuota = dias_credito
+                    # Datos de plazos de pago (ya resueltos en el DataFrame)
+                    id_plazospago_seguro = row.get("id_plazospago")
+                    dias_credito = row.get("dias_credito")
+                    cant_cuotas = row.get("cant_cuotas")
+                    dias_cuota = row.get("dias_cuotas")
 
                     # Limpiar otros IDs y valores numéricos
                     id_cliente_seguro = row.get("id_cliente") # Ya debería ser int o None
                     id_vendedor_seguro = row.get("id_vendedor") # Ya debería ser int o None
-                    idodoo_vendedor_externo = limpiar_int_facturas(row.get("idodoo_vendedor"))
-                    idodoo_clientes_externo = limpiar_int_facturas(row.get("idodoo_clientes")) # Aunque ya usamos id_cliente, mantenemos por si acaso
+                    idodoo_vendedor_externo = row.get("idodoo_vendedor")
+                    idodoo_clientes_externo = row.get("idodoo_clientes") # Aunque ya usamos id_cliente, mantenemos por si acaso
                     plazos_pago_seguro = row.get("plazos_pago") # Ya debería ser string o None
 
-                    # Limpiar montos (usando la función auxiliar mejorada)
-                    total_factura = limpiar_float(row.get("total_factura"))
-                    pendiente_cobrar_excel = limpiar_float(row.get("pendiente_cobrar")) # Pendiente según Excel
+                    # Montos ya limpios en el DataFrame
                     # IMPORTANTE: El total_cobrado y pendiente_cobrar REAL se calculará DESPUÉS con el script de actualización
-                    # Aquí solo guardamos los valores iniciales o una estimación simple
-                    total_cobrado_inicial = round(total_factura - pendiente_cobrar_excel, 2)
-                    total_factura_db = total_factura if pd.notna(row.get("total_factura")) else None # Guardar como float o None
+                    total_factura_db = row.get("total_factura_db") # Texto decimal exacto o None
                     pendiente_cobrar_db = total_factura_db # Inicialmente, el pendiente es el total
                     total_cobrado_db = 0.0 # Inicialmente, el cobrado es cero
 
@@ -340,32 +314,12 @@ finally:
 # (Lógica sin cambios)
 proceso_cuotas_exitoso = False
 if importacion_exitosa:
-    # ... (código existente para llamar a generar_cuotas.py) ...
     print("\n----------------------------------------------------")
-    print(f">> Ejecutando script de generación de cuotas: '{script_cuotas}'...")
+    print(">> Ejecutando generación de cuotas (generar_cuotas.ejecutar)...")
     print("----------------------------------------------------")
     try:
-        child_env = os.environ.copy()
-        child_env['PYTHONIOENCODING'] = 'utf-8'
-        resultado_subprocess = subprocess.run(
-            [sys.executable, script_cuotas], check=False, capture_output=True, text=True,
-            encoding='utf-8', errors='replace', env=child_env
-        )
-        print(f"\n--- Salida del Script '{script_cuotas}' ---")
-        print(resultado_subprocess.stdout)
-        if resultado_subprocess.stderr: print(f"\n--- Errores Impresos por '{script_cuotas}' ---\n{resultado_subprocess.stderr}")
-
-        if resultado_subprocess.returncode == 0:
-            print(f"\n[OK] Script '{script_cuotas}' ejecutado exitosamente.")
-            proceso_cuotas_exitoso = True
-        else:
-             raise subprocess.CalledProcessError(
-                 returncode=resultado_subprocess.returncode, cmd=resultado_subprocess.args,
-                 output=resultado_subprocess.stdout, stderr=resultado_subprocess.stderr
-             )
-    except FileNotFoundError: print(f"[ERROR] FATAL: No se encontró el script '{script_cuotas}'.")
-    except subprocess.CalledProcessError as e: print(f"[ERROR] FATAL: Script '{script_cuotas}' falló (rc={e.returncode}).\n--- Salida ---\n{e.output}\n--- Error ---\n{e.stderr}")
-    except Exception as e_subproc: print(f"[ERROR] FATAL inesperado al ejecutar '{script_cuotas}': {e_subproc}")
+        proceso_cuotas_exitoso = generar_cuotas.ejecutar()["exito"] # Mismo proceso, sin subprocess
+    except Exception as e_cuotas: print(f"[ERROR] FATAL inesperado al generar cuotas: {e_cuotas}")
 
 else:
     print("\n----------------------------------------------------")
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+# Guardar como: lectura_excel.py
+
+# Lectura de los Excel exportados de Odoo con caché en formato columnar (Parquet).
+# pd.read_excel(engine="openpyxl") es el paso más lento de cada importación y se repite
+# en cada corrida aunque el archivo no haya cambiado. Aquí el DataFrame ya leído (y
+# renombrado) se guarda en una carpeta '.cache_excel' junto al Excel y se reutiliza
+# mientras el archivo de origen sea el mismo:
+#   - Si tamaño y fecha de modificación coinciden con la entrada guardada -> se usa la caché.
+#   - Si cambió la fecha pero el hash SHA-256 del contenido es el mismo (archivo copiado
+#     o re-descargado sin cambios) -> se usa la caché y se actualiza la fecha guardada.
+#   - En otro caso se vuelve a leer el Excel y se reemplaza la entrada.
+# La clave de la entrada incluye hoja, dtype y mapeo de columnas, así dos scripts que leen
+# el mismo archivo con opciones distintas no se pisan. Si el DataFrame tiene columnas con
+# tipos mezclados (lectura sin dtype=str) que Parquet no admite, la entrada se guarda con
+# pickle de pandas, que conserva los valores tal cual.
+# Se desactiva con la variable de entorno EXCEL_CACHE=0 (o si pyarrow no está instalado).
+#
+# Para exportaciones muy grandes (millones de líneas) leer_excel_por_bloques() recorre la
+# hoja con openpyxl en modo read_only y entrega DataFrames de tamaño fijo, sin cargar nunca
+# el libro completo en memoria (no usa la caché).
+
+import hashlib
+import json
+import os
+import time
+
+import openpyxl
+import pandas as pd
+
+try:
+    import pyarrow # Necesario para escribir/leer Parquet
+    PYARROW_DISPONIBLE = True
+except ImportError:
+    PYARROW_DISPONIBLE = False
+
+# --- Configuración ---
+CARPETA_CACHE = ".cache_excel" # Se crea junto a cada Excel de origen
+VERSION_CACHE = 1 # Subir si cambia el formato de las entradas (invalida todo lo anterior)
+DIAS_MAX_SIN_USO = 30 # Entradas no usadas en este plazo se eliminan
+CACHE_ACTIVA = os.environ.get("EXCEL_CACHE", "1").strip().lower() not in ("0", "false", "no", "off")
+TAM_BLOQUE_HASH = 1024 * 1024
+TAM_BLOQUE_FILAS = 50_000 # Filas por DataFrame en leer_excel_por_bloques()
+_aviso_sin_pyarrow = False # El aviso de caché desactivada por falta de pyarrow se muestra una sola vez
+
+# --- Funciones Auxiliares ---
+def _avisar_sin_pyarrow():
+    """Avisa (una vez por proceso) de que la caché se omite porque pyarrow no está instalado."""
+    global _aviso_sin_pyarrow
+    if _aviso_sin_pyarrow: return
+    _aviso_sin_pyarrow = True
+    print("[WARN] pyarrow no está instalado: la caché de Excel está desactivada y cada lectura usa openpyxl (pip install pyarrow).")
+
+def hash_archivo(ruta):
+    """SHA-256 del contenido del archivo (leído por bloques)."""
+    sha = hashlib.sha256()
+    with open(ruta, "rb") as archivo:
+        for bloque in iter(lambda: archivo.read(TAM_BLOQUE_HASH), b""):
+            sha.update(bloque)
+    return sha.hexdigest()
+
+def _clave_opciones(hoja, dtype, renombrar):
+    """Identificador corto de las opciones de lectura (forma parte del nombre de la entrada)."""
+    opciones = [VERSION_CACHE, str(hoja), str(dtype), sorted((renombrar or {}).items())]
+    return hashlib.md5(json.dumps(opciones, ensure_ascii=False).encode("utf-8")).hexdigest()[:12]
+
+def _rutas_entrada(ruta, clave):
+    """Rutas (datos, metadatos) de la entrada de caché de `ruta` con opciones `clave`."""
+    carpeta = os.path.join(os.path.dirname(os.path.abspath(ruta)), CARPETA_CACHE)
+    base = os.path.join(carpeta, f"{os.path.basename(ruta)}.{clave}")
+    return base + ".datos", base + ".json"
+
+def _guardar_datos(df, ruta_datos):
+    """Guarda el DataFrame (Parquet, o pickle si Parquet no admite sus tipos). Devuelve el formato."""
+    temporal = f"{ruta_datos}.{os.getpid()}.tmp"
+    try:
+        try:
+            df.to_parquet(temporal, index=True)
+            formato = "parquet"
+        except (pyarrow.ArrowException, TypeError, ValueError):
+            df.to_pickle(temporal)
+            formato = "pickle"
+        os.replace(temporal, ruta_datos)
+    finally:
+        if os.path.exists(temporal): os.remove(temporal)
+    return formato
+
+def _cargar_datos(ruta_datos, formato):
+    return pd.read_parquet(ruta_datos) if formato == "parquet" else pd.read_pickle(ruta_datos)
+
+def _leer_metadatos(ruta_meta):
+    try:
+        with open(ruta_meta, encoding="utf-8") as archivo:
+            return json.load(archivo)
+    except (OSError, ValueError):
+        return None
+
+def _escribir_json(ruta_meta, metadatos):
+    """Escritura atómica (archivo temporal + replace) para no dejar JSON a medias."""
+    temporal = f"{ruta_meta}.{os.getpid()}.tmp"
+    with open(temporal, "w", encoding="utf-8") as archivo:
+        json.dump(metadatos, archivo, ensure_ascii=False, indent=1)
+    os.replace(temporal, ruta_meta)
+
+def _borrar_entrada(ruta_datos, ruta_meta):
+    for ruta in (ruta_datos, ruta_meta):
+        try: os.remove(ruta)
+        except FileNotFoundError: pass
+
+def _normalizar_celda(valor):
+    """Igual que pandas al leer con openpyxl: los float enteros (3.0) pasan a int."""
+    if isinstance(valor, float) and valor.is_integer(): return int(valor)
+    return valor
+
+def limpiar_cache(carpeta_cache, dias_max=DIAS_MAX_SIN_USO):
+    """
+    Elimina de `carpeta_cache` las entradas obsoletas: archivo de origen borrado, origen
+    modificado (tamaño o fecha distintos), versión de caché antigua o sin uso en `dias_max` días.
+    Devuelve el número de entradas eliminadas.
+    """
+    if not os.path.isdir(carpeta_cache): return 0
+    limite = time.time() - dias_max * 86400
+    eliminadas = 0
+    for nombre in os.listdir(carpeta_cache):
+        if not nombre.endswith(".json"): continue
+        ruta_meta = os.path.join(carpeta_cache, nombre)
+        ruta_datos = ruta_meta[:-len(".json")] + ".datos"
+        meta = _leer_metadatos(ruta_meta)
+        obsoleta = meta is None or meta.get("version") != VERSION_CACHE or meta.get("ultimo_uso", 0) < limite
+        if not obsoleta:
+            try:
+                estado = os.stat(meta["origen"])
+                obsoleta = (estado.st_size, estado.st_mtime_ns) != (meta["tamano"], meta["mtime_ns"])
+            except OSError:
+                obsoleta = True # El Excel de origen ya no existe
+        if obsoleta:
+            _borrar_entrada(ruta_datos, ruta_meta)
+            eliminadas += 1
+    # Datos huérfanos (sin JSON) o temporales de una escritura interrumpida
+    for nombre in os.listdir(carpeta_cache):
+        ruta = os.path.join(carpeta_cache, nombre)
+        huerfano = nombre.endswith(".datos") and not os.path.exists(ruta[:-len(".datos")] + ".json")
+        if huerfano or (nombre.endswith(".tmp") and os.path.getmtime(ruta) < limite):
+            _borrar_entrada(ruta, ruta)
+    return eliminadas
+
+# --- Lógica Principal ---
+def leer_excel(ruta, hoja="Sheet1", dtype=None, renombrar=None, usar_cache=True):
+    """
+    Equivalente a pd.read_excel(ruta, sheet_name=hoja, engine="openpyxl", dtype=dtype)
+    seguido de rename(columns=renombrar), con caché Parquet junto al archivo.
+    Lanza FileNotFoundError igual que pd.read_excel si el archivo no existe.
+    """
+    estado = os.stat(ruta) # FileNotFoundError si no existe
+    if usar_cache and CACHE_ACTIVA and not PYARROW_DISPONIBLE: _avisar_sin_pyarrow()
+    if not (usar_cache and CACHE_ACTIVA and PYARROW_DISPONIBLE):
+        df = pd.read_excel(ruta, sheet_name=hoja, engine="openpyxl", dtype=dtype)
+        return df.rename(columns=renombrar) if renombrar else df
+
+    ruta_datos, ruta_meta = _rutas_entrada(ruta, _clave_opciones(hoja, dtype, renombrar))
+    meta = _leer_metadatos(ruta_meta)
+    if meta and meta.get("version") == VERSION_CACHE and os.path.exists(ruta_datos):
+        vigente = meta["tamano"] == estado.st_size and meta["mtime_ns"] == estado.st_mtime_ns
+        if not vigente and meta["tamano"] == estado.st_size:
+            # Misma longitud pero otra fecha: se compara el contenido
+            vigente = hash_archivo(ruta) == meta["sha256"]
+        if vigente:
+            try:
+                df = _cargar_datos(ruta_datos, meta.get("formato", "parquet"))
+                meta.update(mtime_ns=estado.st_mtime_ns, ultimo_uso=time.time())
+                _escribir_json(ruta_meta, meta)
+                print(f"[INFO] Excel '{os.path.basename(ruta)}' leído desde caché ({len(df)} filas).")
+                return df
+            except Exception as e:
+                print(f"[WARN] Caché de '{os.path.basename(ruta)}' ilegible, se vuelve a leer el Excel: {e}")
+
+    df = pd.read_excel(ruta, sheet_name=hoja, engine="openpyxl", dtype=dtype)
+    if renombrar: df = df.rename(columns=renombrar)
+
+    try:
+        os.makedirs(os.path.dirname(ruta_datos), exist_ok=True)
+        formato = _guardar_datos(df, ruta_datos)
+        _escribir_json(ruta_meta, {
+            "version": VERSION_CACHE, "origen": os.path.abspath(ruta), "hoja": str(hoja), "formato": formato,
+            "tamano": estado.st_size, "mtime_ns": estado.st_mtime_ns, "sha256": hash_archivo(ruta),
+            "filas": len(df), "creado": time.time(), "ultimo_uso": time.time(),
+        })
+        limpiar_cache(os.path.dirname(ruta_datos))
+    except Exception as e:
+        # La caché es opcional: si no se puede escribir (permisos, disco lleno...) se sigue sin ella
+        print(f"[WARN] No se pudo guardar la caché de '{os.path.basename(ruta)}': {e}")
+    return df
+
+def leer_excel_por_bloques(ruta, hoja="Sheet1", dtype=None, renombrar=None, tam_bloque=TAM_BLOQUE_FILAS):
+    """
+    Generador: recorre la hoja en modo streaming (openpyxl read_only + iter_rows) y entrega
+    DataFrames de hasta `tam_bloque` filas con las mismas columnas y renombrado que leer_excel().
+    Con dtype=str los valores son idénticos; sin dtype los tipos se infieren por bloque. El índice continúa entre bloques (la fila i del Excel tiene índice i - 2,
+    como con pd.read_excel). Las filas vacías al final de la hoja se descartan, igual que pandas.
+    La memoria usada depende del tamaño del bloque, no del archivo.
+    """
+    libro = openpyxl.load_workbook(ruta, read_only=True, data_only=True)
+    try:
+        filas_hoja = libro[hoja].iter_rows(values_only=True)
+        encabezados = next(filas_hoja, None)
+        if encabezados is None: return
+        num_columnas = len(encabezados)
+
+        def _bloque(filas, inicio):
+            # Se construye como object para que pandas no infiera float en columnas de enteros con vacíos
+            df = pd.DataFrame(filas, columns=list(encabezados), index=pd.RangeIndex(inicio, inicio + len(filas)), dtype=object)
+            df = df.astype(dtype) if dtype is not None else df.infer_objects()
+            return df.rename(columns=renombrar) if renombrar else df
+
+        filas, inicio, vacias_pendientes = [], 0, 0
+        for fila in filas_hoja:
+            if all(valor is None for valor in fila):
+                vacias_pendientes += 1 # Solo se conservan si después aparece una fila con datos
+                continue
+            filas.extend([(None,) * num_columnas] * vacias_pendientes)
+            vacias_pendientes = 0
+            filas.append(tuple(_normalizar_celda(valor) for valor in fila[:num_columnas]))
+            if len(filas) >= tam_bloque:
+                yield _bloque(filas[:tam_bloque], inicio)
+                inicio += tam_bloque
+                filas = filas[tam_bloque:]
+        if filas:
+            yield _bloque(filas, inicio)
+    finally:
+        libro.close() # En read_only el archivo queda abierto hasta cerrar el libro
@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+# Guardar como: ledger_comisiones.py
+
+# Libro (ledger) persistente de aplicaciones de pagos a cuotas para el reporte de comisiones.
+# calcular_comisiones() re-simula en cada corrida los saldos de las cuotas con TODO el
+# historial de pagos de cada factura involucrada. Aquí esa simulación se guarda en la tabla
+# TABLA_LEDGER (pago -> cuota -> monto aplicado -> días de atraso -> tasa -> comisión) y en
+# cada ejecución solo se extiende con los pagos desde la última marca de agua (fecha de pago):
+#   - El saldo de cada cuota se reconstruye como monto_cuota - SUM(monto aplicado en el ledger).
+#   - El día de la marca se vuelve a procesar siempre (pueden haber llegado pagos de ese día).
+#   - Se guarda una huella de todo lo anterior a la marca (conciliaciones, cuotas de las
+#     facturas del ledger, diarios comisionables y reglas). Si cambió (reimportación con datos
+#     distintos, cuotas regeneradas con otro monto, nuevas reglas...) se reconstruye todo.
+# Las cuotas se identifican por (id_factura, nro_cuota) porque generar_cuotas.py las borra y
+# vuelve a insertar (con otro id) cada vez que cambia lo cobrado de la factura.
+# El reporte de una quincena pasa a ser una consulta por rango: consultar_comisiones().
+# Uso: python ledger_comisiones.py [--reconstruir]
+
+import argparse
+import hashlib
+import sys
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+
+import pandas as pd
+
+from conexion_mysql import conectar, SesionLectura
+from carga_masiva import dividir_en_lotes, insertar_por_lotes
+from motor_comisiones import obtener_reglas_comision, buscar_tasa_comision, indexar_cuotas, simular_aplicaciones
+
+# --- Configuración ---
+TABLA_LEDGER = "comision_aplicaciones"
+TABLA_ESTADO = "comision_ledger_estado"
+COLUMNAS_LEDGER = ["orden", "id_conciliacion", "id_pago", "id_factura", "nro_cuota", "fecha_pago", "fecha_vencimiento",
+                   "monto_cuota", "monto_aplicado", "dias_vencido", "porcentaje", "rango", "comision", "es_comisionable"]
+
+# Mismas columnas (y orden) que devuelve reporte_comisiones.calcular_comisiones()
+COLUMNAS_REPORTE = [
+    'ID Vendedor', 'Nombre Vendedor', 'ID Cliente', 'Nombre Cliente', 'ID Pago', 'Fecha Pago',
+    'Numero Factura', 'Nro Cuota', 'Fecha Vencimiento Cuota', 'Monto Aplicado a Cuota',
+    'Dias Vencido al Pago', 'Rango Comision Aplicado', 'Porcentaje Comision', 'Comision Generada',
+    'Monto Total Pago', 'Monto Total Cuota', 'ID Conciliacion', 'ID Factura'
+]
+
+# --- Funciones Auxiliares ---
+def crear_tablas(cursor):
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {TABLA_LEDGER} (
+            orden BIGINT NOT NULL PRIMARY KEY, -- Posición en la cascada (orden cronológico del historial)
+            id_conciliacion INT NULL,
+            id_pago INT NOT NULL,
+            id_factura INT NOT NULL,
+            nro_cuota INT NOT NULL,
+            fecha_pago DATE NOT NULL,
+            fecha_vencimiento DATE NOT NULL,
+            monto_cuota DECIMAL(18,2) NOT NULL,
+            monto_aplicado DECIMAL(18,2) NOT NULL,
+            dias_vencido INT NOT NULL,
+            porcentaje DECIMAL(12,8) NOT NULL,
+            rango VARCHAR(255) NULL,
+            comision DECIMAL(18,2) NOT NULL,
+            es_comisionable TINYINT(1) NOT NULL,
+            KEY idx_fecha_pago (fecha_pago, es_comisionable),
+            KEY idx_factura_cuota (id_factura, nro_cuota)
+        )
+    """)
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {TABLA_ESTADO} (
+            id TINYINT NOT NULL PRIMARY KEY,
+            fecha_marca DATE NOT NULL, -- Último día de pago procesado (se reprocesa en la siguiente corrida)
+            huella CHAR(32) NOT NULL, -- Huella de los datos anteriores a fecha_marca
+            actualizado DATETIME NOT NULL
+        )
+    """)
+
+def calcular_huella(cursor, fecha_marca, tabla_comision):
+    """
+    MD5 de todo lo que determina el ledger antes de `fecha_marca`: conciliaciones con pago
+    anterior a la marca, cuotas (monto y vencimiento) de las facturas del ledger, diarios
+    comisionables y reglas de comisión. Los agregados son independientes del orden de las filas.
+    """
+    partes = []
+    cursor.execute("""
+        SELECT COUNT(*) AS n, COALESCE(SUM(pc.monto_aplicado), 0) AS total,
+               COALESCE(BIT_XOR(CRC32(CONCAT_WS('|', pc.id_pago, pc.id_factura, pc.monto_aplicado, p.fecha_pago))), 0) AS crc
+        FROM pago_conciliados pc JOIN pagos p ON pc.id_pago = p.id
+        WHERE p.fecha_pago < %s
+    """, (fecha_marca,))
+    partes.append(cursor.fetchone())
+    cursor.execute(f"""
+        SELECT COUNT(*) AS n, COALESCE(SUM(c.monto_cuota), 0) AS total,
+               COALESCE(BIT_XOR(CRC32(CONCAT_WS('|', c.id_factura, c.nro_cuota, c.monto_cuota, c.fecha_vencimiento))), 0) AS crc
+        FROM cuotas c WHERE c.id_factura IN (SELECT DISTINCT id_factura FROM {TABLA_LEDGER} WHERE fecha_pago < %s)
+    """, (fecha_marca,))
+    partes.append(cursor.fetchone())
+    cursor.execute("SELECT nombre FROM diarios WHERE es_comisionable = 1 ORDER BY nombre")
+    partes.append([fila['nombre'] for fila in cursor.fetchall()])
+    partes.append([tabla_comision['desde'], tabla_comision['hasta'], tabla_comision['porcentajes'], tabla_comision['descripciones']])
+    return hashlib.md5(repr(partes).encode("utf-8")).hexdigest()
+
+def saldos_aplicados(cursor, ids_facturas):
+    """{(id_factura, nro_cuota): monto ya aplicado en el ledger} para las facturas dadas."""
+    aplicados = {}
+    for lote in dividir_en_lotes(list(ids_facturas)):
+        placeholders = ", ".join(["%s"] * len(lote))
+        cursor.execute(f"""
+            SELECT id_factura, nro_cuota, SUM(monto_aplicado) AS aplicado
+            FROM {TABLA_LEDGER} WHERE id_factura IN ({placeholders})
+            GROUP BY id_factura, nro_cuota
+        """, tuple(lote))
+        aplicados.update({(fila['id_factura'], fila['nro_cuota']): Decimal(fila['aplicado']) for fila in cursor.fetchall()})
+    return aplicados
+
+def obtener_cuotas(cursor, ids_facturas=None):
+    """Cuotas de `ids_facturas` (todas si es None), en el formato de indexar_cuotas()."""
+    consulta = "SELECT id, id_factura, nro_cuota, fecha_vencimiento, monto_cuota, pendiente_cobrar FROM cuotas"
+    if ids_facturas is None:
+        cursor.execute(consulta + " ORDER BY id_factura, nro_cuota ASC")
+        return cursor.fetchall()
+    cuotas = []
+    for lote in dividir_en_lotes(list(ids_facturas)):
+        cursor.execute(consulta + f" WHERE id_factura IN ({', '.join(['%s'] * len(lote))}) ORDER BY id_factura, nro_cuota ASC", tuple(lote))
+        cuotas.extend(cursor.fetchall())
+    return cuotas
+
+# --- Lógica Principal ---
+def ejecutar(conexion=None, reconstruir=False):
+    """
+    Extiende el ledger de comisiones con los pagos desde la marca de agua (o lo reconstruye
+    completo si `reconstruir`, si no existe o si cambió la huella de los datos anteriores).
+    Si se recibe `conexion` se usa y NO se cierra. Devuelve un dict con 'exito' y contadores.
+    """
+    print("\n--- Script: ledger_comisiones.py ---")
+
+    conexion_propia = conexion is None
+    cursor = None
+    proceso_exitoso = False
+    registros_historial = 0
+    aplicaciones_nuevas = 0
+    aplicaciones_eliminadas = 0
+    fecha_marca = None
+
+    try:
+        if conexion_propia:
+            print("[DB] Conectando a la base de datos...")
+            conexion = conectar()
+            if not conexion: raise Exception("No se pudo conectar a la base de datos.")
+        cursor = conexion.cursor(dictionary=True, buffered=True)
+        print("[OK] Conexión establecida.")
+
+        crear_tablas(cursor)
+        tabla_comision = obtener_reglas_comision(cursor)
+
+        cursor.execute(f"SELECT fecha_marca, huella FROM {TABLA_ESTADO} WHERE id = 1")
+        estado = cursor.fetchone()
+        if estado is None and not reconstruir:
+            print("[INFO] El ledger no tiene marca de agua. Se construirá completo.")
+            reconstruir = True
+        elif not reconstruir and calcular_huella(cursor, estado['fecha_marca'], tabla_comision) != estado['huella']:
+            print("[WARN] Cambiaron datos anteriores a la marca de agua (conciliaciones, cuotas, diarios o reglas). Se reconstruye el ledger.")
+            reconstruir = True
+
+        # 1. DESCARTAR LO QUE SE VA A RECALCULAR (todo, o desde el día de la marca)
+        if reconstruir:
+            cursor.execute(f"DELETE FROM {TABLA_LEDGER}")
+            desde = None
+        else:
+            desde = estado['fecha_marca']
+            cursor.execute(f"DELETE FROM {TABLA_LEDGER} WHERE fecha_pago >= %s", (desde,))
+        aplicaciones_eliminadas = cursor.rowcount
+        print(f"[INFO] Modo: {'RECONSTRUCCIÓN COMPLETA' if reconstruir else f'INCREMENTAL desde {desde}'} ({aplicaciones_eliminadas} aplicaciones descartadas).")
+        cursor.execute(f"SELECT COALESCE(MAX(orden), 0) AS orden FROM {TABLA_LEDGER}")
+        orden = int(cursor.fetchone()['orden'])
+
+        # 2. HISTORIAL A PROCESAR (mismo orden que calcular_comisiones)
+        print("[DB] Obteniendo historial de conciliaciones a procesar...")
+        cursor.execute(f"""
+            SELECT pc.id AS id_conciliacion, pc.id_pago, pc.id_factura, pc.monto_aplicado, p.fecha_pago,
+                   COALESCE(d.es_comisionable, 0) AS es_comisionable
+            FROM pago_conciliados pc JOIN pagos p ON pc.id_pago = p.id
+                 LEFT JOIN diarios d ON p.diario = d.nombre
+            WHERE p.fecha_pago IS NOT NULL {'' if desde is None else 'AND p.fecha_pago >= %s'}
+            ORDER BY p.fecha_pago ASC, pc.id_pago ASC, pc.id ASC
+        """, () if desde is None else (desde,))
+        historial = cursor.fetchall()
+        registros_historial = len(historial)
+        print(f"[OK] {registros_historial} registros de historial.")
+
+        if historial:
+            # 3. CUOTAS CON SU SALDO ACTUAL SEGÚN EL LEDGER
+            ids_facturas = {registro['id_factura'] for registro in historial}
+            cuotas_list = obtener_cuotas(cursor, None if reconstruir else ids_facturas)
+            cuotas_por_factura = indexar_cuotas(cuotas_list)
+            if not reconstruir:
+                aplicados = saldos_aplicados(cursor, ids_facturas)
+                for id_factura, cuotas in cuotas_por_factura.items():
+                    for cuota in cuotas:
+                        cuota['pendiente_actual'] -= aplicados.get((id_factura, cuota['nro_cuota']), Decimal(0))
+            print(f"[OK] {len(cuotas_list)} cuotas cargadas.")
+
+            # 4. SIMULAR Y GUARDAR LAS APLICACIONES
+            filas = []
+            for pago_info, fecha_pago, cuota, monto in simular_aplicaciones(historial, cuotas_por_factura):
+                orden += 1
+                dias_vencido = (fecha_pago - cuota['fecha_vencimiento']).days
+                porcentaje, rango = buscar_tasa_comision(dias_vencido, tabla_comision)
+                comision = (monto * porcentaje).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP) if porcentaje > 0 else Decimal(0)
+                filas.append((orden, pago_info['id_conciliacion'], pago_info['id_pago'], pago_info['id_factura'], cuota['nro_cuota'],
+                              fecha_pago, cuota['fecha_vencimiento'], str(cuota['monto_cuota']), str(monto), dias_vencido,
+                              str(porcentaje), rango, str(comision), int(pago_info['es_comisionable'] or 0)))
+            print(f"[DB] Insertando {len(filas)} aplicaciones en '{TABLA_LEDGER}'...")
+            aplicaciones_nuevas = insertar_por_lotes(cursor, TABLA_LEDGER, COLUMNAS_LEDGER, filas)
+            fecha_marca = max(registro['fecha_pago'] for registro in historial)
+            if isinstance(fecha_marca, datetime): fecha_marca = fecha_marca.date()
+        else:
+            fecha_marca = desde
+
+        # 5. GUARDAR MARCA DE AGUA Y HUELLA
+        if fecha_marca is not None:
+            cursor.execute(f"""
+                INSERT INTO {TABLA_ESTADO} (id, fecha_marca, huella, actualizado) VALUES (1, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE fecha_marca = VALUES(fecha_marca), huella = VALUES(huella), actualizado = VALUES(actualizado)
+            """, (fecha_marca, calcular_huella(cursor, fecha_marca, tabla_comision), datetime.now()))
+        conexion.commit()
+        proceso_exitoso = True
+        print(f"[OK] Ledger actualizado. Marca de agua: {fecha_marca}.")
+
+    except Exception as e:
+        print(f"\n[ERROR] ERROR GENERAL INESPERADO (Ledger Comisiones): {e}")
+        proceso_exitoso = False
+        if conexion:
+            try: print("[DB] Intentando ROLLBACK..."); conexion.rollback(); print("(-) Rollback realizado.")
+            except Exception as rb_err: print(f"[WARN] Error en rollback: {rb_err}")
+    finally:
+        print("\n--- Resumen Ledger Comisiones ---")
+        print(f"{'Modo':<35}: {'Reconstrucción completa' if reconstruir else 'Incremental'}")
+        print(f"{'Registros de historial procesados':<35}: {registros_historial}")
+        print(f"{'Aplicaciones descartadas':<35}: {aplicaciones_eliminadas}")
+        print(f"{'Aplicaciones nuevas':<35}: {aplicaciones_nuevas}")
+        print(f"{'Marca de agua':<35}: {fecha_marca if fecha_marca is not None else '--'}")
+        print("=================================")
+        if cursor: cursor.close()
+        if conexion_propia and conexion and conexion.is_connected(): conexion.close(); print("[DB] Conexión cerrada.")
+
+    return {
+        "exito": proceso_exitoso,
+        "reconstruido": reconstruir,
+        "registros_historial": registros_historial,
+        "aplicaciones_eliminadas": aplicaciones_eliminadas,
+        "aplicaciones_nuevas": aplicaciones_nuevas,
+        "fecha_marca": fecha_marca,
+    }
+
+def consultar_comisiones(fecha_inicio, fecha_fin, sesion=None):
+    """
+    Comisiones de los pagos comisionables entre `fecha_inicio` y `fecha_fin` leídas del ledger,
+    con las mismas columnas que reporte_comisiones.calcular_comisiones(). Vendedor, cliente y
+    número de factura se toman de la factura actual. DataFrame vacío si no hay filas.
+    La consulta va por `sesion` (SesionLectura); sin ella se abre una propia.
+    """
+    if sesion is None:
+        with SesionLectura() as sesion: return consultar_comisiones(fecha_inicio, fecha_fin, sesion)
+    print(f"[DB] Consultando ledger de comisiones entre {fecha_inicio.date()} y {fecha_fin.date()}...")
+    filas = sesion.consultar(f"""
+        SELECT f.id_vendedor AS `ID Vendedor`, v.nombre AS `Nombre Vendedor`,
+               f.id_cliente AS `ID Cliente`, c.nombre AS `Nombre Cliente`,
+               l.id_pago AS `ID Pago`, l.fecha_pago AS `Fecha Pago`, f.num_factura AS `Numero Factura`,
+               l.nro_cuota AS `Nro Cuota`, l.fecha_vencimiento AS `Fecha Vencimiento Cuota`,
+               l.monto_aplicado AS `Monto Aplicado a Cuota`, l.dias_vencido AS `Dias Vencido al Pago`,
+               l.rango AS `Rango Comision Aplicado`, l.porcentaje AS `Porcentaje Comision`,
+               l.comision AS `Comision Generada`, p.monto AS `Monto Total Pago`,
+               l.monto_cuota AS `Monto Total Cuota`, l.id_conciliacion AS `ID Conciliacion`, l.id_factura AS `ID Factura`
+        FROM {TABLA_LEDGER} l
+             JOIN pagos p ON p.id = l.id_pago
+             JOIN facturas f ON f.id = l.id_factura
+             LEFT JOIN vendedores v ON v.idVendedores = f.id_vendedor
+             LEFT JOIN clientes c ON c.id = f.id_cliente
+        WHERE l.es_comisionable = 1 AND l.fecha_pago BETWEEN %s AND %s
+        ORDER BY l.orden
+    """, (fecha_inicio.date(), fecha_fin.date()))
+    print(f"[OK] {len(filas)} registros de comisión en el ledger.")
+    if not filas: return pd.DataFrame()
+
+    df_resultados = pd.DataFrame(filas, columns=COLUMNAS_REPORTE)
+    for col in ['Monto Aplicado a Cuota', 'Comision Generada', 'Monto Total Pago', 'Monto Total Cuota', 'Porcentaje Comision']:
+        df_resultados[col] = df_resultados[col].apply(lambda x: float(x) if isinstance(x, Decimal) else x).astype(float)
+    for col in ['Fecha Pago', 'Fecha Vencimiento Cuota']:
+        df_resultados[col] = pd.to_datetime(df_resultados[col]).dt.date
+    return df_resultados
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Actualiza el ledger persistente de comisiones.")
+    parser.add_argument("--reconstruir", action="store_true", help="Borra el ledger y lo recalcula desde todo el historial.")
+    resultado = ejecutar(reconstruir=parser.parse_args().reconstruir)
+    sys.exit(0 if resultado["exito"] else 1)
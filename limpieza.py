@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+# Guardar como: limpieza.py
+
+# Limpieza vectorizada de columnas para los scripts de importación.
+# Sustituye a los antiguos limpiar_float / limpiar_decimal / limpiar_int que se
+# aplicaban celda a celda con Series.apply. Todas las funciones reciben una
+# Serie (texto, número u objeto) y devuelven una Serie con el mismo índice.
+#
+# Los montos se manejan como ENTEROS ESCALADOS (p.ej. centavos con decimales=2)
+# para no perder precisión ni construir un Decimal por celda. El redondeo al
+# escalar es "mitad hacia arriba" (igual que MySQL al guardar en DECIMAL).
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow # Opcional: acelera las conversiones texto <-> número
+    PYARROW_DISPONIBLE = True
+except ImportError:
+    PYARROW_DISPONIBLE = False
+
+# --- Configuración ---
+# Textos que se consideran vacíos (se comparan en minúsculas)
+VALORES_VACIOS = ["<na>", "nan", "none", "", "#n/a", "false", "nat"]
+DECIMALES_MONTO = 2 # Montos de dinero en centavos
+DECIMALES_CANTIDAD = 6 # Cantidades / precios de líneas de factura
+DECIMALES_TASA = 8 # Tasa de cambio
+
+# Patrones validados con str.fullmatch (mucho más rápido que str.extract o pd.to_numeric con errors='coerce')
+_PATRON_DECIMAL = r'[+-]?(?:\d+\.?\d*|\.\d+)'
+_PATRON_NUMERO = _PATRON_DECIMAL + r'(?:[eE][+-]?\d+)?'
+_MAX_DIGITOS_INT64 = 18
+
+# --- Funciones Auxiliares ---
+def normalizar_texto(serie):
+    """Convierte a texto, quita espacios, cambia ',' por '.' y marca placeholders como nulos."""
+    texto = serie.astype('string').str.strip().str.replace(',', '.', regex=False)
+    return texto.mask(texto.str.lower().isin(VALORES_VACIOS))
+
+def _texto_a_numero(texto, tipo):
+    """Convierte texto ya validado a 'int64' o 'float64'. Con pyarrow el cast se hace en C."""
+    if getattr(texto.dtype, 'storage', None) == 'pyarrow':
+        return texto.astype(f'{tipo}[pyarrow]').astype('float64' if tipo == 'float64' else 'Int64')
+    return texto.astype('float64' if tipo == 'float64' else 'Int64')
+
+def _entero_a_texto(valores):
+    """Serie de enteros no negativos -> texto."""
+    if PYARROW_DISPONIBLE:
+        return valores.astype('int64[pyarrow]').astype('string[pyarrow]')
+    return valores.astype(str)
+
+def _a_float(serie):
+    """Texto normalizado -> float64 (NaN si vacío o no numérico)."""
+    texto = normalizar_texto(serie)
+    valido = texto.str.fullmatch(_PATRON_NUMERO).fillna(False).astype(bool)
+    return _texto_a_numero(texto.where(valido), 'float64')
+
+def limpiar_numero(serie, defecto=0.0):
+    """Equivalente vectorizado de limpiar_float: float64, `defecto` si vacío o inválido."""
+    valores = _a_float(serie)
+    return valores.where(np.isfinite(valores), defecto)
+
+def limpiar_entero(serie):
+    """Equivalente vectorizado de limpiar_int (int(float(x))): Int64 nullable, <NA> si inválido."""
+    valores = _a_float(serie)
+    valores = valores.where(np.isfinite(valores))
+    return np.trunc(valores).astype('Int64')
+
+def limpiar_fecha(serie):
+    """Convierte a objetos date (None/NaT si no es una fecha válida)."""
+    return pd.to_datetime(serie, errors='coerce').dt.date
+
+def limpiar_monto_escalado(serie, decimales=DECIMALES_MONTO, absoluto=False):
+    """
+    Convierte montos a enteros escalados (Int64 nullable) con `decimales` posiciones: '12.345'
+    -> 1235 con decimales=2. Vacíos o inválidos -> 0 (igual que limpiar_decimal). Los montos que
+    no caben en int64 una vez escalados quedan como <NA> (no como 0): escalado_a_texto los
+    devuelve como None y la fila no se guarda con un monto falso. Con `absoluto=True` se
+    descarta el signo (como hacía limpiar_decimal_pagos).
+    El parseo es exacto sobre el texto; solo los formatos raros (p.ej. notación científica)
+    pasan por float.
+    """
+    texto = normalizar_texto(serie)
+    exacto = texto.str.fullmatch(_PATRON_DECIMAL).fillna(False).astype(bool)
+
+    resultado = pd.Series(0, index=serie.index, dtype='int64')
+    fuera_de_rango = pd.Series(False, index=serie.index)
+    if exacto.any():
+        # Se quitan signo y punto: '-12.345' -> dígitos '12345' con 3 decimales
+        validos = texto[exacto]
+        negativo = validos.str.startswith('-').to_numpy(dtype=bool)
+        validos = validos.str.lstrip('+-')
+        pos_punto = validos.str.find('.').to_numpy(dtype='int64')
+        largo = validos.str.len().to_numpy(dtype='int64')
+        digitos_frac = np.where(pos_punto >= 0, largo - pos_punto - 1, 0)
+        digitos = validos.str.replace('.', '', regex=False).str.lstrip('0')
+        desplazamiento = decimales - digitos_frac # > 0: multiplicar, < 0: dividir redondeando
+        # Lo que no cabe en int64 pasa por float
+        cabe = (digitos.str.len().to_numpy(dtype='int64') + np.maximum(desplazamiento, 0) <= _MAX_DIGITOS_INT64) & \
+               (desplazamiento >= -_MAX_DIGITOS_INT64)
+        exacto[exacto] = cabe
+
+        digitos = digitos[cabe]
+        numero = _texto_a_numero(digitos.mask(digitos == '', '0'), 'int64').to_numpy(dtype='int64')
+        desplazamiento, negativo = desplazamiento[cabe], negativo[cabe]
+        potencia = np.power(10, np.abs(desplazamiento), dtype='int64')
+        cociente, resto = np.divmod(numero, potencia)
+        valor = np.where(desplazamiento >= 0, numero * potencia, cociente + (resto * 2 >= potencia))
+        resultado[exacto] = np.where(negativo, -valor, valor)
+
+    # Formatos no decimales simples (notación científica, etc.)
+    resto = ~exacto & texto.notna()
+    if resto.any():
+        numeros = _a_float(texto[resto]) * (10 ** decimales)
+        grandes = numeros.abs() >= 9e18 # Incluye ±inf; NaN (texto no numérico) -> 0 como siempre
+        fuera_de_rango[resto] = grandes
+        numeros = numeros.where(np.isfinite(numeros) & ~grandes, 0)
+        resultado[resto] = (np.sign(numeros) * np.floor(numeros.abs() + 0.5)).astype('int64')
+
+    if absoluto: resultado = resultado.abs()
+    return resultado.astype('Int64').mask(fuera_de_rango)
+
+def _enteros(serie):
+    """Serie escalada (int64 o Int64) -> (valores int64 con <NA> como 0, máscara de <NA>)."""
+    nulos = serie.isna()
+    return serie.fillna(0).astype('int64'), nulos
+
+def escalado_a_texto(serie, decimales=DECIMALES_MONTO):
+    """Formatea enteros escalados como texto decimal exacto ('-12.30') para enviar a MySQL (<NA> -> None)."""
+    valores, nulos = _enteros(serie)
+    negativo = valores < 0
+    absolutos = valores.abs()
+    texto = _entero_a_texto(absolutos // (10 ** decimales))
+    if decimales > 0:
+        # Se suma 10**decimales para conservar los ceros a la izquierda y luego se quita el '1'
+        fracciones = _entero_a_texto(absolutos % (10 ** decimales) + 10 ** decimales).str.slice(1)
+        texto = texto + '.' + fracciones
+    texto = texto.mask(negativo, '-' + texto)
+    return texto.astype(object).mask(nulos, None) if nulos.any() else texto
+
+def _dividir_redondeando(numerador, denominador):
+    """Cociente entero de dos Series int64 con redondeo 'mitad al par' (como Decimal.quantize)."""
+    signo = np.sign(numerador) * np.sign(denominador)
+    num, den = numerador.abs(), denominador.abs()
+    cociente, resto = num // den, num % den
+    subir = (resto * 2 > den) | ((resto * 2 == den) & (cociente % 2 == 1))
+    return signo * (cociente + subir.astype('int64'))
+
+def multiplicar_escalados(a, b, decimales=DECIMALES_CANTIDAD):
+    """
+    Producto de dos columnas escaladas con `decimales` posiciones, devuelto con la misma escala
+    y redondeo 'mitad al par' (lo que hacía Decimal.quantize). Se descompone `b` en parte
+    entera y fraccionaria para no desbordar int64. <NA> en cualquiera de los dos -> <NA>.
+    """
+    (a, nulos_a), (b, nulos_b) = _enteros(a), _enteros(b)
+    escala = 10 ** decimales
+    signo = np.sign(a) * np.sign(b)
+    a_abs, b_abs = a.abs().astype('int64'), b.abs().astype('int64')
+    b_ent, b_frac = b_abs // escala, b_abs % escala
+    base = a_abs * b_ent
+    producto_frac = a_abs * b_frac
+    fraccion = _dividir_redondeando(producto_frac, pd.Series(escala, index=a.index, dtype='int64'))
+    return (signo * (base + fraccion)).astype('Int64').mask(nulos_a | nulos_b)
+
+def dividir_escalados(numerador, denominador, decimales_salida=DECIMALES_TASA):
+    """
+    Cociente de dos columnas con la misma escala, devuelto escalado a `decimales_salida`
+    (redondeo 'mitad al par'). Denominador 0 -> 0, igual que el antiguo calcular_tasa.
+    Se hace división larga en bloques de 4 dígitos para no desbordar int64 con montos grandes.
+    <NA> en cualquiera de los dos -> <NA>.
+    """
+    (num, nulos_num), (den, nulos_den) = _enteros(numerador), _enteros(denominador)
+    es_cero = den == 0
+    signo = np.sign(num) * np.sign(den)
+    num_abs, den_abs = num.abs(), den.abs().mask(es_cero, 1)
+
+    resultado, resto = num_abs // den_abs, num_abs % den_abs
+    pendientes = decimales_salida
+    while pendientes > 0:
+        paso = min(4, pendientes)
+        resto = resto * (10 ** paso)
+        resultado = resultado * (10 ** paso) + resto // den_abs
+        resto = resto % den_abs
+        pendientes -= paso
+    subir = (resto * 2 > den_abs) | ((resto * 2 == den_abs) & (resultado % 2 == 1))
+    resultado = signo * (resultado + subir.astype('int64'))
+    return resultado.mask(es_cero, 0).astype('Int64').mask(nulos_num | nulos_den)
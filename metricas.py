@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+# Guardar como: metricas.py
+
+# Métricas del importador en formato de texto de Prometheus (lo sirve app.py en /metrics).
+# No se leen de la salida de los scripts: salen del historial de corridas (historial.py), que
+# guarda lo que mide cada etapa por dentro (contadores del resultado de ejecutar(), fases.py y
+# las sentencias y espera por bloqueos de su sesión en performance_schema). Como el historial es
+# una tabla SQLite, los contadores son los mismos desde cualquier proceso web y no vuelven a
+# cero al reiniciar el servidor. Los totales, buckets y la última corrida de cada etapa se
+# agregan en SQLite (GROUP BY clave, json_each para fases y motivos): un scrape no trae a Python
+# todo el historial, que crece sin límite. Sin dependencias (no hace falta prometheus_client).
+# Uso: python metricas.py  -> imprime las métricas actuales
+
+import cola_trabajos
+import historial
+from pipeline import AVAILABLE_SCRIPTS
+
+# --- Configuración ---
+PREFIJO = "importador"
+BUCKETS_DURACION = (1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600) # Segundos por corrida de etapa
+ESTADOS_TRABAJO = (cola_trabajos.EN_COLA, cola_trabajos.EN_CURSO)
+
+# --- Funciones Auxiliares ---
+def _etiquetas(**etiquetas):
+    if not etiquetas: return ""
+    pares = []
+    for nombre, valor in etiquetas.items():
+        valor = str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pares.append(f'{nombre}="{valor}"')
+    return "{" + ",".join(pares) + "}"
+
+def _numero(valor):
+    if isinstance(valor, float):
+        if valor == float("inf"): return "+Inf"
+        return repr(round(valor, 6))
+    return str(valor)
+
+class Familia:
+    """Una métrica con su HELP/TYPE y sus muestras (sufijo, etiquetas, valor)."""
+
+    def __init__(self, nombre, tipo, ayuda):
+        self.nombre, self.tipo, self.ayuda = f"{PREFIJO}_{nombre}", tipo, ayuda
+        self.muestras = []
+
+    def agregar(self, valor, sufijo="", **etiquetas):
+        self.muestras.append((sufijo, etiquetas, valor))
+
+    def texto(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+        lineas += [f"{self.nombre}{sufijo}{_etiquetas(**etiquetas)} {_numero(valor)}" for sufijo, etiquetas, valor in self.muestras]
+        return "\n".join(lineas)
+
+def _leer_agregados(ruta=None):
+    """
+    Agregados del historial por etapa, calculados en SQLite. Devuelve (totales, ultimas, omitidas, fases):
+      totales {clave: fila con corridas, exitos, leidas, escritas, sentencias, espera, segundos, bucket_i}
+      ultimas {clave: fila de la última corrida}, omitidas {clave: {motivo: filas}}, fases {clave: {fase: s}}
+    """
+    buckets_sql = "".join(f", SUM(duracion <= ?) AS bucket_{i}" for i in range(len(BUCKETS_DURACION)))
+    conexion = historial.conectar_bd(ruta)
+    try:
+        totales = {fila["clave"]: fila for fila in conexion.execute(
+            "SELECT clave, COUNT(*) AS corridas, SUM(exito) AS exitos, TOTAL(filas_entrada) AS leidas, "
+            "TOTAL(filas_salida) AS escritas, TOTAL(sentencias_bd) AS sentencias, TOTAL(espera_bloqueos) AS espera, "
+            f"TOTAL(duracion) AS segundos{buckets_sql} FROM historial_etapas GROUP BY clave", BUCKETS_DURACION)}
+        # Con MAX() las demás columnas de SQLite salen de la fila del máximo: la última corrida
+        ultimas = {fila["clave"]: fila for fila in conexion.execute(
+            "SELECT clave, MAX(inicio) AS inicio, exito, filas_salida, duracion FROM historial_etapas GROUP BY clave")}
+        omitidas, fases = {}, {}
+        for columna, destino in (("filas_omitidas", omitidas), ("fases", fases)):
+            for clave, nombre, valor in conexion.execute(
+                    f"SELECT h.clave, j.key, TOTAL(j.value) FROM historial_etapas h, json_each(h.{columna}) j "
+                    "GROUP BY h.clave, j.key ORDER BY h.clave, j.key"):
+                destino.setdefault(clave, {})[nombre] = valor
+        return totales, ultimas, omitidas, fases
+    finally:
+        conexion.close()
+
+def _contar_trabajos(ruta=None):
+    conexion = cola_trabajos.conectar_bd(ruta)
+    try:
+        return dict(conexion.execute("SELECT estado, COUNT(*) FROM trabajos WHERE estado IN (?, ?) GROUP BY estado",
+                                     ESTADOS_TRABAJO).fetchall())
+    finally:
+        conexion.close()
+
+# --- Lógica Principal ---
+def generar_metricas(ruta=None):
+    """Texto de exposición de Prometheus con las métricas de todas las etapas de AVAILABLE_SCRIPTS."""
+    corridas_familia = Familia("etapa_corridas_total", "counter", "Corridas de la etapa por resultado.")
+    leidas = Familia("filas_leidas_total", "counter", "Filas leídas por la etapa (Excel o BD).")
+    escritas = Familia("filas_escritas_total", "counter", "Filas insertadas, actualizadas o eliminadas en la BD por la etapa.")
+    omitidas = Familia("filas_omitidas_total", "counter", "Filas descartadas por la etapa, por motivo.")
+    sentencias = Familia("sentencias_bd_total", "counter", "Sentencias SQL ejecutadas por la sesión de la etapa (performance_schema).")
+    espera = Familia("espera_bloqueos_segundos_total", "counter", "Segundos de espera por bloqueos de las sentencias de la etapa (SUM_LOCK_TIME).")
+    fases_familia = Familia("fase_segundos_total", "counter", "Segundos acumulados por fase de la etapa (leer_excel, limpieza, escritura_bd, commit...).")
+    duracion = Familia("etapa_duracion_segundos", "histogram", "Duración de cada corrida de la etapa.")
+    ultima_inicio = Familia("ultima_corrida_timestamp_segundos", "gauge", "Inicio (epoch) de la última corrida de la etapa.")
+    ultima_exito = Familia("ultima_corrida_exito", "gauge", "1 si la última corrida de la etapa terminó bien.")
+    ultima_escritas = Familia("ultima_corrida_filas_escritas", "gauge", "Filas escritas en la última corrida de la etapa.")
+    ultima_duracion = Familia("ultima_corrida_duracion_segundos", "gauge", "Duración de la última corrida de la etapa.")
+    trabajos = Familia("trabajos", "gauge", "Trabajos de app.py en cola o en curso.")
+
+    totales, ultimas, omitidas_etapa, fases_etapa = _leer_agregados(ruta)
+    for clave in list(AVAILABLE_SCRIPTS) + [clave for clave in totales if clave not in AVAILABLE_SCRIPTS]:
+        total = totales.get(clave)
+        corridas = total["corridas"] if total else 0
+        exitos = total["exitos"] if total else 0
+        corridas_familia.agregar(exitos, etapa=clave, resultado="ok")
+        corridas_familia.agregar(corridas - exitos, etapa=clave, resultado="error")
+        leidas.agregar(int(total["leidas"]) if total else 0, etapa=clave)
+        escritas.agregar(int(total["escritas"]) if total else 0, etapa=clave)
+        sentencias.agregar(int(total["sentencias"]) if total else 0, etapa=clave)
+        espera.agregar(float(total["espera"]) if total else 0.0, etapa=clave)
+
+        motivos = omitidas_etapa.get(clave, {})
+        for motivo in sorted(set(AVAILABLE_SCRIPTS.get(clave, {}).get("filas_omitidas", {})) | set(motivos)):
+            omitidas.agregar(int(motivos.get(motivo, 0)), etapa=clave, motivo=motivo)
+        for fase, segundos in fases_etapa.get(clave, {}).items():
+            fases_familia.agregar(float(segundos), etapa=clave, fase=fase)
+
+        for i, limite in enumerate(BUCKETS_DURACION):
+            duracion.agregar(total[f"bucket_{i}"] if total else 0, "_bucket", etapa=clave, le=_numero(float(limite)))
+        duracion.agregar(corridas, "_bucket", etapa=clave, le="+Inf")
+        duracion.agregar(float(total["segundos"]) if total else 0.0, "_sum", etapa=clave)
+        duracion.agregar(corridas, "_count", etapa=clave)
+
+        ultima = ultimas.get(clave)
+        if ultima:
+            ultima_inicio.agregar(float(ultima["inicio"]), etapa=clave)
+            ultima_exito.agregar(int(ultima["exito"]), etapa=clave)
+            ultima_escritas.agregar(ultima["filas_salida"] or 0, etapa=clave)
+            ultima_duracion.agregar(float(ultima["duracion"]), etapa=clave)
+
+    cantidades = _contar_trabajos(ruta)
+    for estado in ESTADOS_TRABAJO:
+        trabajos.agregar(cantidades.get(estado, 0), estado=estado)
+
+    familias = [corridas_familia, leidas, escritas, omitidas, sentencias, espera, fases_familia, duracion,
+                ultima_inicio, ultima_exito, ultima_escritas, ultima_duracion, trabajos]
+    return "\n".join(familia.texto() for familia in familias) + "\n"
+
+if __name__ == "__main__":
+    print(generar_metricas(), end="")
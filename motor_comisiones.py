@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+# Guardar como: motor_comisiones.py
+
+# Motor de cálculo de comisiones compartido por reporte_comisiones.py y
+# reporte_comisiones_3_hojas.py (y ledger_comisiones.py). Salvo obtener_reglas_comision(),
+# no accede a la BD: recibe las filas ya consultadas.
+#
+# Antes, por cada aplicación de un pago a una cuota se buscaba la conciliación con un
+# recorrido lineal de todas las conciliaciones y se reordenaban las cuotas de la factura
+# en cada registro del historial (coste cuadrático). Aquí se construyen una sola vez:
+#   - conciliaciones_por_clave: {(id_pago, id_factura): conciliación}
+#   - cuotas_por_factura: {id_factura: [cuotas ordenadas por nro_cuota]}
+# y el recorrido del historial queda lineal en su tamaño (más las cuotas de cada factura).
+# Las reglas de comisión por antigüedad se compilan con compilar_reglas() en una tabla de
+# intervalos ordenada (validada al cargar) y cada búsqueda es binaria.
+
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+import numpy as np
+
+# --- Configuración ---
+SIN_REGLA = (Decimal(0), "Sin Regla Aplicable") # Días fuera de todas las reglas
+
+# --- Funciones Auxiliares ---
+def compilar_reglas(reglas_comision):
+    """
+    Convierte las filas de 'comision_por_antiguedad' en una tabla de intervalos ordenada para
+    búsquedas con bisect / numpy.searchsorted. dias_desde NULL = -infinito, dias_hasta NULL = +infinito.
+    Lanza ValueError si hay intervalos invertidos, solapados o huecos entre reglas consecutivas
+    (los días son enteros: cada regla debe empezar en dias_hasta + 1 de la anterior).
+    Si la tabla no cubre los extremos se avisa una sola vez; esos días quedan con 0%.
+    """
+    if not reglas_comision: raise ValueError("La tabla de reglas de comisión está vacía.")
+    intervalos = []
+    for regla in reglas_comision:
+        dias_desde = regla['dias_desde'] if regla['dias_desde'] is not None else -float('inf')
+        dias_hasta = regla['dias_hasta'] if regla['dias_hasta'] is not None else float('inf')
+        if dias_desde > dias_hasta:
+            raise ValueError(f"Regla de comisión {regla.get('id', '?')} inválida: dias_desde {dias_desde} > dias_hasta {dias_hasta}.")
+        descripcion = regla.get('descripcion', f"{dias_desde} a {dias_hasta} días")
+        intervalos.append((dias_desde, dias_hasta, regla['porcentaje'], descripcion, regla.get('id', '?')))
+    intervalos.sort(key=lambda intervalo: intervalo[0])
+
+    for anterior, siguiente in zip(intervalos, intervalos[1:]):
+        if siguiente[0] <= anterior[1]:
+            raise ValueError(f"Reglas de comisión {anterior[4]} y {siguiente[4]} se solapan ({anterior[0]}..{anterior[1]} y {siguiente[0]}..{siguiente[1]} días).")
+        if siguiente[0] != anterior[1] + 1:
+            raise ValueError(f"Hueco entre las reglas de comisión {anterior[4]} y {siguiente[4]}: no hay regla de {anterior[1] + 1} a {siguiente[0] - 1} días.")
+    if intervalos[0][0] != -float('inf') or intervalos[-1][1] != float('inf'):
+        print(f"[WARN] Las reglas de comisión solo cubren de {intervalos[0][0]} a {intervalos[-1][1]} días; fuera de ese rango se asignará 0%.")
+
+    desde, hasta, porcentajes, descripciones, _ = zip(*intervalos)
+    return {
+        'desde': list(desde), 'hasta': list(hasta),
+        'porcentajes': list(porcentajes), 'descripciones': list(descripciones),
+        'desde_np': np.array(desde, dtype='float64'), 'hasta_np': np.array(hasta, dtype='float64'),
+    }
+
+def obtener_reglas_comision(cursor):
+    """Obtiene las reglas de comisión de la base de datos, compiladas con compilar_reglas()."""
+    print("[DB] Obteniendo reglas de comisión...")
+    query = "SELECT id, dias_desde, dias_hasta, porcentaje, descripcion FROM comision_por_antiguedad ORDER BY dias_desde"
+    cursor.execute(query)
+    reglas = cursor.fetchall()
+    if not reglas:
+        raise ValueError("No se encontraron reglas de comisión en la tabla 'comision_por_antiguedad'.")
+    print(f"[OK] {len(reglas)} reglas de comisión obtenidas.")
+    for regla in reglas:
+        regla['porcentaje'] = Decimal(regla['porcentaje']) / Decimal(100)
+    return compilar_reglas(reglas) # Tabla de intervalos validada (ValueError si hay huecos o solapes)
+
+def buscar_tasa_comision(dias_vencido, tabla_comision):
+    """(porcentaje, descripción) de la regla que contiene `dias_vencido`. Búsqueda binaria sobre compilar_reglas()."""
+    posicion = bisect_right(tabla_comision['desde'], dias_vencido) - 1
+    if posicion >= 0 and dias_vencido <= tabla_comision['hasta'][posicion]:
+        return tabla_comision['porcentajes'][posicion], tabla_comision['descripciones'][posicion]
+    return SIN_REGLA
+
+def buscar_tasas_comision(dias_vencidos, tabla_comision):
+    """
+    Versión vectorizada de buscar_tasa_comision para una columna completa (Serie o array de días).
+    Devuelve (porcentajes, descripciones) como arrays de objetos alineados con la entrada.
+    """
+    dias = np.asarray(dias_vencidos, dtype='float64')
+    posiciones = np.searchsorted(tabla_comision['desde_np'], dias, side='right') - 1
+    validas = posiciones >= 0
+    validas[validas] = dias[validas] <= tabla_comision['hasta_np'][posiciones[validas]]
+    porcentajes = np.full(len(dias), SIN_REGLA[0], dtype=object)
+    descripciones = np.full(len(dias), SIN_REGLA[1], dtype=object)
+    porcentajes[validas] = np.array(tabla_comision['porcentajes'], dtype=object)[posiciones[validas]]
+    descripciones[validas] = np.array(tabla_comision['descripciones'], dtype=object)[posiciones[validas]]
+    return porcentajes, descripciones
+
+def dividir_en_quincenas(fecha_inicio, fecha_fin):
+    """
+    Lista de (inicio, fin) de las quincenas (1-15 y 16-fin de mes) que cubren el rango, como
+    datetime con fin a las 23:59:59 (igual que FECHA_FIN_QUINCENA). La primera y la última se
+    recortan a `fecha_inicio` / `fecha_fin`.
+    """
+    fecha_inicio = datetime.combine(fecha_inicio.date() if isinstance(fecha_inicio, datetime) else fecha_inicio, datetime.min.time())
+    quincenas = []
+    inicio = fecha_inicio.replace(day=1 if fecha_inicio.day <= 15 else 16)
+    while inicio <= fecha_fin:
+        if inicio.day == 1:
+            siguiente = inicio.replace(day=16)
+        else:
+            siguiente = (inicio.replace(day=28) + timedelta(days=4)).replace(day=1) # Primer día del mes siguiente
+        fin = siguiente - timedelta(seconds=1)
+        quincenas.append((max(inicio, fecha_inicio), min(fin, fecha_fin)))
+        inicio = siguiente
+    return quincenas
+
+def indexar_conciliaciones(conciliaciones):
+    """{(id_pago, id_factura): conciliación}. Si una pareja se repite gana la primera (como el antiguo next(...))."""
+    indice = {}
+    for conciliacion in conciliaciones:
+        indice.setdefault((conciliacion['id_pago'], conciliacion['id_factura']), conciliacion)
+    return indice
+
+def indexar_cuotas(cuotas_list):
+    """
+    {id_factura: [cuotas ordenadas por nro_cuota]} con 'pendiente_actual' inicializado en
+    monto_cuota (Decimal). Las cuotas sin fecha de vencimiento se descartan con advertencia;
+    si un nro_cuota se repite en la misma factura gana la última fila.
+    """
+    por_factura = {}
+    for c in cuotas_list:
+        id_factura = c['id_factura']
+        if id_factura not in por_factura: por_factura[id_factura] = {}
+        c['pendiente_actual'] = Decimal(c['monto_cuota'] or '0.0')
+        c['monto_cuota'] = Decimal(c['monto_cuota'] or '0.0')
+        if isinstance(c['fecha_vencimiento'], datetime): c['fecha_vencimiento'] = c['fecha_vencimiento'].date()
+        elif c['fecha_vencimiento'] is None: print(f"ADVERTENCIA: Cuota ID {c.get('id','N/A')} FacID {c['id_factura']} F Venc NULA."); continue
+        por_factura[id_factura][c['nro_cuota']] = c
+    return {id_factura: [cuotas[nro] for nro in sorted(cuotas)] for id_factura, cuotas in por_factura.items()}
+
+# --- Lógica Principal ---
+def calcular_aplicaciones(historial_conciliaciones, cuotas_por_factura, conciliaciones_por_clave,
+                          pagos_dict, ids_pagos_periodo, tabla_comision, depurar=None):
+    """
+    Recorre el historial de conciliaciones (ordenado por fecha de pago) aplicando cada monto
+    a las cuotas pendientes de su factura en orden de nro_cuota, y genera un registro de
+    comisión por cada aplicación de un pago del período (`ids_pagos_periodo`).
+    `cuotas_por_factura` y `conciliaciones_por_clave` vienen de indexar_cuotas() /
+    indexar_conciliaciones() y `tabla_comision` de compilar_reglas(); el saldo
+    'pendiente_actual' de las cuotas se modifica en sitio.
+    `depurar` = (id_pago, id_factura) imprime la traza detallada de esa pareja.
+    Devuelve la lista de dicts de resultado.
+    """
+    resultados_comision = []
+    for pago_info in historial_conciliaciones:
+        id_pago_hist = pago_info['id_pago']
+        id_factura_hist = pago_info['id_factura']
+        monto_aplicado_hist = Decimal(pago_info['monto_aplicado'] or '0.0')
+        fecha_pago_hist = pago_info['fecha_pago']
+
+        is_target_payment = depurar is not None and (id_pago_hist, id_factura_hist) == depurar
+        if is_target_payment:
+            print(f"\nDEBUG: Procesando Registro Historial: PagoID={id_pago_hist}, FacturaID={id_factura_hist}, Fecha={fecha_pago_hist}, MontoAplicadoHist={monto_aplicado_hist:.2f}")
+
+        if isinstance(fecha_pago_hist, datetime): fecha_pago_hist = fecha_pago_hist.date()
+        elif fecha_pago_hist is None: continue
+
+        if monto_aplicado_hist <= 0: continue
+        cuotas_factura_actual = cuotas_por_factura.get(id_factura_hist)
+        if cuotas_factura_actual is None: continue
+
+        es_del_periodo = id_pago_hist in ids_pagos_periodo
+        conciliacion_actual = conciliaciones_por_clave.get((id_pago_hist, id_factura_hist)) if es_del_periodo else None
+        monto_restante_pago = monto_aplicado_hist
+
+        for cuota in cuotas_factura_actual:
+            if is_target_payment:
+                print(f"  DEBUG: Evaluando Cuota {cuota['nro_cuota']} (Vence: {cuota['fecha_vencimiento']}) - Pendiente ANTES: {cuota['pendiente_actual']:.2f}")
+
+            if monto_restante_pago <= 0: break
+            pendiente_cuota = cuota['pendiente_actual']
+
+            if pendiente_cuota > 0:
+                monto_a_aplicar_a_cuota = min(monto_restante_pago, pendiente_cuota)
+                if is_target_payment:
+                    print(f"    DEBUG: Aplicando a esta cuota: {monto_a_aplicar_a_cuota:.2f}")
+
+                # Verificar si el pago pertenece al período y es comisionable
+                if es_del_periodo:
+                    if is_target_payment:
+                        print(f"      DEBUG: Pago ID {id_pago_hist} ESTÁ en ids_pagos_periodo. Calculando comisión...")
+                    if not conciliacion_actual:
+                        print(f"Error interno: No se encontró la conciliación original para pago {id_pago_hist} y factura {id_factura_hist}")
+                        continue # Saltar este cálculo si no hay conciliación
+
+                    fecha_vencimiento_cuota = cuota['fecha_vencimiento']
+                    dias_vencido = (fecha_pago_hist - fecha_vencimiento_cuota).days
+                    porcentaje_comision, desc_rango = buscar_tasa_comision(dias_vencido, tabla_comision)
+                    comision_generada = Decimal(0)
+                    if porcentaje_comision > 0:
+                        comision_generada = (monto_a_aplicar_a_cuota * porcentaje_comision).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+                    resultado = {
+                        'ID Vendedor': conciliacion_actual['id_vendedor'], 'ID Cliente': conciliacion_actual['id_cliente_factura'],
+                        'ID Pago': id_pago_hist, 'Fecha Pago': fecha_pago_hist,
+                        'Monto Total Pago': pagos_dict[id_pago_hist]['monto_total_pago'],
+                        'ID Factura': id_factura_hist, 'Numero Factura': conciliacion_actual['num_factura'],
+                        'Nro Cuota': cuota['nro_cuota'], 'Fecha Vencimiento Cuota': fecha_vencimiento_cuota,
+                        'Monto Total Cuota': cuota['monto_cuota'], 'Monto Aplicado a Cuota': monto_a_aplicar_a_cuota,
+                        'Dias Vencido al Pago': dias_vencido, 'Rango Comision Aplicado': desc_rango,
+                        'Porcentaje Comision': porcentaje_comision, 'Comision Generada': comision_generada,
+                        'ID Conciliacion': conciliacion_actual['id_conciliacion']
+                    }
+                    if is_target_payment:
+                        print(f"        DEBUG: Comisión Generada: {resultado['Comision Generada']:.2f} (Porc: {resultado['Porcentaje Comision']}) - Añadiendo a resultados.")
+                    resultados_comision.append(resultado)
+
+                elif is_target_payment:
+                    print(f"      DEBUG: Pago ID {id_pago_hist} NO está en ids_pagos_periodo. NO se calcula comisión.")
+
+                # Actualizar estado en memoria para la simulación
+                cuota['pendiente_actual'] -= monto_a_aplicar_a_cuota
+                monto_restante_pago -= monto_a_aplicar_a_cuota
+
+                if is_target_payment:
+                    print(f"    DEBUG: Pendiente DESPUÉS: {cuota['pendiente_actual']:.2f} | Monto Restante Pago: {monto_restante_pago:.2f}")
+            elif is_target_payment:
+                print(f"  DEBUG: Evaluando Cuota {cuota['nro_cuota']} - Pendiente ANTES era CERO o negativo. Saltando aplicación.")
+    return resultados_comision
+
+def simular_aplicaciones(historial_conciliaciones, cuotas_por_factura):
+    """
+    Generador con la misma cascada que calcular_aplicaciones() pero sin filtrar por período:
+    entrega (pago_info, fecha_pago, cuota, monto_aplicado) por cada aplicación de un registro
+    del historial a una cuota. Lo usa ledger_comisiones.py para guardar todas las aplicaciones
+    (también las de pagos no comisionables, necesarias para reconstruir los saldos).
+    """
+    for pago_info in historial_conciliaciones:
+        fecha_pago = pago_info['fecha_pago']
+        if isinstance(fecha_pago, datetime): fecha_pago = fecha_pago.date()
+        elif fecha_pago is None: continue
+        monto_restante_pago = Decimal(pago_info['monto_aplicado'] or '0.0')
+        if monto_restante_pago <= 0: continue
+
+        for cuota in cuotas_por_factura.get(pago_info['id_factura'], []):
+            if monto_restante_pago <= 0: break
+            if cuota['pendiente_actual'] > 0:
+                monto_a_aplicar_a_cuota = min(monto_restante_pago, cuota['pendiente_actual'])
+                yield pago_info, fecha_pago, cuota, monto_a_aplicar_a_cuota
+                cuota['pendiente_actual'] -= monto_a_aplicar_a_cuota
+                monto_restante_pago -= monto_a_aplicar_a_cuota
@@ -0,0 +1,376 @@
+# -*- coding: utf-8 -*-
+# Guardar como: pipeline.py
+
+# Ejecuta las etapas de importación (1-7) EN UN SOLO PROCESO.
+# Antes app.py lanzaba cada script con subprocess y Importar_facturas.py /
+# actualizar_saldos_y_cuotas.py hacían lo mismo con generar_cuotas.py: cada etapa
+# volvía a pagar el arranque de Python + pandas + openpyxl, abría su propia conexión
+# y solo devolvía texto por stdout. Ahora cada script expone ejecutar(conexion=None, ...)
+# que devuelve un dict con 'exito' y sus contadores; aquí se importan como módulos,
+# se comparte una conexión y los catálogos en caché (catalogos.py) entre etapas.
+# Uso:
+#   python pipeline.py                      -> secuencia completa 1-7
+#   python pipeline.py importar_pagos ...   -> solo las etapas indicadas (en orden 1-7)
+#   python pipeline.py --paralelo [N]       -> etapas independientes a la vez (grafo 'depende_de')
+
+import argparse
+import contextlib
+import importlib
+import io
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from conexion_mysql import conectar, contadores_sesion, obtener_pool
+from catalogos import invalidar_cache
+import fases
+import historial
+
+# --- Configuración ---
+# Orden de la secuencia = orden de este diccionario (3.7+ conserva el orden de inserción).
+#   modulo   : módulo con la función ejecutar(conexion=None, ...)
+#   encadena : etapa que el módulo ya ejecuta por su cuenta; si esa etapa también forma
+#              parte de la corrida y corre DESPUÉS (depende de este módulo), se le pasa
+#              encadenar_cuotas=False para no repetirla. La cola de trabajos la cuenta como
+#              etapa ocupada aunque no esté en la corrida.
+#   depende_de: etapas cuyas tablas necesita ya cargadas (grafo usado por ejecutar_en_paralelo):
+#              facturas y pagos solo necesitan los IDs de clientes, detalles los de facturas,
+#              conciliaciones los de facturas y pagos. actualizar_saldos espera a generar_cuotas
+#              porque también borra/regenera cuotas.
+#   lee_excel: el módulo tiene leer_excel(); su lectura (lo más lento) se adelanta en paralelo.
+#   filas_entrada / filas_salida: contadores del resultado de la etapa que cuentan las filas
+#              leídas y las escritas en la BD (para el historial de corridas, ver historial.py).
+#   filas_omitidas: {motivo: contador} de las filas descartadas por la etapa (para /metrics).
+MAX_PROCESOS_DEFECTO = min(4, os.cpu_count() or 1)
+AVAILABLE_SCRIPTS = {
+    "importar_clientes": {
+        "name": "1. Importar Clientes", # <-- Nombre para el botón
+        "script_path": "importar_cliente.py", # <-- Nombre exacto del archivo .py
+        "modulo": "importar_cliente",
+        "filas_entrada": "clientes_leidos_excel",
+        "filas_salida": ["clientes_insertados", "clientes_actualizados"],
+        "filas_omitidas": {"sin_nombre": "clientes_omitidos_sin_nombre", "sin_idodoo": "clientes_omitidos_sin_idodoo",
+                           "error_fila": "clientes_con_error_fila"},
+        "depende_de": [],
+        "lee_excel": True,
+    },
+    "importar_facturas": {
+        "name": "2. Importar/Actualizar Facturas (Cabeceras)",
+        "script_path": "Importar_facturas.py",
+        "modulo": "Importar_facturas",
+        "filas_entrada": "total_filas_excel",
+        "filas_salida": ["registros_insertados", "registros_actualizados"],
+        "filas_omitidas": {"sin_idodoo": "registros_omitidos_sin_idodoo", "error_fila": "registros_con_error_fila"},
+        "depende_de": ["importar_clientes"],
+        "lee_excel": True,
+        "encadena": "generar_cuotas",
+    },
+    "importar_detalles": {
+        "name": "3. Importar Detalles de Factura (Líneas)",
+        "script_path": "importar_detalle_facturas.py",
+        "modulo": "importar_detalle_facturas",
+        "filas_entrada": "lineas_leidas_excel",
+        "filas_salida": ["lineas_procesadas_bd"],
+        "filas_omitidas": {"sin_factura": "lineas_omitidas_no_factura", "sin_id_linea": "lineas_omitidas_no_id_linea",
+                           "error_fila": "lineas_con_error_fila"},
+        "depende_de": ["importar_facturas"],
+        "lee_excel": True,
+    },
+    "importar_pagos": {
+        "name": "4. Importar Pagos (Registros)",
+        "script_path": "importar_pagos.py",
+        "modulo": "importar_pagos",
+        "filas_entrada": "pagos_leidos_excel",
+        "filas_salida": ["pagos_procesados_bd", "pagos_eliminados_bd"],
+        "filas_omitidas": {"sin_cliente": "pagos_omitidos_no_cliente", "error_fila": "pagos_con_error_fila"},
+        "depende_de": ["importar_clientes"],
+        "lee_excel": True,
+    },
+    "importar_conciliaciones": {
+        "name": "5. Importar Aplicaciones de Pago (Conciliaciones)",
+        "script_path": "importar_conciliaciones.py",
+        "modulo": "importar_conciliaciones",
+        "filas_entrada": "lineas_leidas_excel",
+        "filas_salida": ["conciliaciones_procesadas_bd"],
+        "filas_omitidas": {"sin_info": "conciliaciones_omitidas_no_info", "sin_pago": "conciliaciones_omitidas_no_pago",
+                           "sin_factura": "conciliaciones_omitidas_no_factura", "error_fila": "conciliaciones_con_error_fila"},
+        "depende_de": ["importar_facturas", "importar_pagos"],
+        "lee_excel": True,
+    },
+    "generar_cuotas": {
+        "name": "6. Generar/Actualizar Cuotas (Depende de Facturas y Pagos)",
+        "script_path": "generar_cuotas.py",
+        "modulo": "generar_cuotas",
+        "filas_entrada": "facturas_leidas",
+        "filas_salida": ["cuotas_generadas_total"],
+        "filas_omitidas": {"datos_invalidos": "facturas_omitidas_data", "sin_cambios": "facturas_sin_cambios",
+                           "error_fecha": "errores_calculo_fecha"},
+        "depende_de": ["importar_facturas"],
+    },
+    "actualizar_saldos": {
+        "name": "7. Actualizar saldos y cuotas (Ejecutar después de importar pagos/concil.)",
+        "script_path": "actualizar_saldos_y_cuotas.py",
+        "modulo": "actualizar_saldos_y_cuotas",
+        "filas_entrada": None,
+        "filas_salida": ["facturas_actualizadas"],
+        "depende_de": ["importar_conciliaciones", "generar_cuotas"],
+        "encadena": "generar_cuotas",
+    },
+}
+
+# --- Funciones Auxiliares ---
+def _omitir_encadenada(clave, claves):
+    """True si la etapa que `clave` encadena ya corre después en esta corrida (no hay que repetirla)."""
+    encadenada = AVAILABLE_SCRIPTS[clave].get("encadena")
+    return encadenada in claves and clave in AVAILABLE_SCRIPTS[encadenada]["depende_de"]
+
+def ejecutar_etapa(clave, conexion=None, capturar_salida=False, **argumentos):
+    """
+    Ejecuta una etapa de AVAILABLE_SCRIPTS llamando a su ejecutar(conexion, **argumentos).
+    Con `capturar_salida=True` lo que imprime la etapa se guarda en 'salida' en lugar de
+    mostrarse en consola (lo usa app.py). Devuelve un dict:
+      clave, nombre, exito, duracion (s), resultado (dict de la etapa), salida, error,
+      inicio / fin (epoch), fases ({fase: s}, ver fases.py), filas_entrada, filas_salida,
+      filas_omitidas ({motivo: filas}), sentencias_bd y espera_bloqueos (s; None sin performance_schema).
+    Sin `conexion` abre una del pool para la etapa (y la cierra al terminar), para poder medir
+    en ella las sentencias y la espera por bloqueos.
+    """
+    info = AVAILABLE_SCRIPTS[clave]
+    etapa = {"clave": clave, "nombre": info["name"], "exito": False, "duracion": 0.0,
+             "resultado": None, "salida": "", "error": "", "inicio": time.time(), "fin": None,
+             "fases": {}, "filas_entrada": None, "filas_salida": None, "filas_omitidas": {},
+             "sentencias_bd": None, "espera_bloqueos": None}
+    conexion_propia = conexion is None
+    contadores = None
+    buffer = io.StringIO()
+    redireccion = contextlib.redirect_stdout(buffer) if capturar_salida else contextlib.nullcontext()
+    inicio = time.perf_counter()
+    fases.iniciar()
+    with redireccion:
+        try:
+            if conexion_propia:
+                try:
+                    conexion = conectar()
+                except Exception:
+                    conexion = None # La etapa vuelve a intentarlo y reporta el error con su propio mensaje
+            contadores = contadores_sesion(conexion) if conexion else None
+            modulo = importlib.import_module(info["modulo"])
+            etapa["resultado"] = modulo.ejecutar(conexion, **argumentos)
+            etapa["exito"] = bool(etapa["resultado"] and etapa["resultado"].get("exito"))
+        except Exception as e:
+            # Las etapas capturan sus propios errores; esto cubre fallos al importar o inesperados
+            etapa["error"] = traceback.format_exc()
+            print(f"\n[ERROR] Excepción no controlada en la etapa '{clave}': {e}")
+        finally:
+            if contadores and (finales := contadores_sesion(conexion)):
+                etapa["sentencias_bd"] = finales[0] - contadores[0] - 1 # Sin la lectura inicial de contadores
+                etapa["espera_bloqueos"] = round(finales[1] - contadores[1], 6)
+            if conexion_propia and conexion and conexion.is_connected():
+                conexion.close()
+    etapa["duracion"] = time.perf_counter() - inicio
+    etapa["fin"] = time.time()
+    etapa["fases"] = fases.recoger()
+    etapa["salida"] = buffer.getvalue()
+    contar_filas(etapa)
+    return etapa
+
+def contar_filas(etapa):
+    """Llena filas_entrada / filas_salida / filas_omitidas con los contadores indicados en AVAILABLE_SCRIPTS."""
+    resultado, info = etapa["resultado"] or {}, AVAILABLE_SCRIPTS[etapa["clave"]]
+    if info.get("filas_entrada") and resultado.get(info["filas_entrada"]) is not None:
+        etapa["filas_entrada"] = int(resultado[info["filas_entrada"]])
+    salidas = [resultado[contador] for contador in info.get("filas_salida", []) if resultado.get(contador) is not None]
+    if salidas:
+        etapa["filas_salida"] = int(sum(salidas))
+    etapa["filas_omitidas"] = {motivo: int(resultado[contador]) for motivo, contador in info.get("filas_omitidas", {}).items()
+                               if resultado.get(contador)}
+
+def ejecutar_secuencia(claves=None, detener_en_error=True, capturar_salida=False):
+    """
+    Ejecuta las etapas indicadas (todas si `claves` es None) en el orden de AVAILABLE_SCRIPTS,
+    con UNA conexión compartida. Los catálogos se recargan al inicio de cada corrida para no
+    arrastrar datos de una corrida anterior (app.py mantiene el proceso vivo).
+    Con `detener_en_error=True` las etapas siguientes a un fallo se marcan como omitidas.
+    Devuelve la lista de dicts de ejecutar_etapa (las omitidas con resultado None y exito False).
+    """
+    claves = [clave for clave in AVAILABLE_SCRIPTS if claves is None or clave in claves]
+    invalidar_cache()
+    etapas = []
+    conexion = None
+    try:
+        conexion = conectar()
+        for clave in claves:
+            if detener_en_error and etapas and not etapas[-1]["exito"]:
+                etapas.append(_etapa_omitida(clave, "por fallo de una etapa anterior"))
+                continue
+            argumentos = {}
+            if _omitir_encadenada(clave, claves):
+                argumentos["encadenar_cuotas"] = False
+            etapas.append(ejecutar_etapa(clave, conexion, capturar_salida, **argumentos))
+    finally:
+        if conexion and conexion.is_connected():
+            conexion.close()
+    return etapas
+
+def _leer_excel_etapa(clave):
+    """Tarea del pool: lee el Excel de una etapa con su leer_excel(). Devuelve (DataFrame, segundos)."""
+    inicio = time.perf_counter()
+    df = importlib.import_module(AVAILABLE_SCRIPTS[clave]["modulo"]).leer_excel()
+    return df, time.perf_counter() - inicio
+
+def _ejecutar_etapa_proceso(clave, **argumentos):
+    """
+    Tarea del pool: ejecuta una etapa con su propia conexión y capturando su salida. Los
+    procesos del pool se reutilizan entre etapas: los catálogos se recargan en cada una para
+    no usar, p.ej., un mapa de clientes leído antes de que otra etapa los importara.
+    """
+    invalidar_cache()
+    return ejecutar_etapa(clave, None, True, **argumentos)
+
+def precargar_etapas():
+    """
+    Importa los módulos de todas las etapas y abre el pool de MySQL del proceso, para procesos
+    que atienden varias corridas (trabajadores de cola_trabajos.py y sus pools de etapas).
+    Si MySQL no responde solo se avisa: el pool se abrirá en la primera etapa que conecte.
+    """
+    for info in AVAILABLE_SCRIPTS.values():
+        importlib.import_module(info["modulo"])
+    try:
+        obtener_pool()
+    except Exception as e:
+        print(f"[WARN] No se pudo abrir el pool de MySQL al precargar: {e}")
+
+def _precargar_proceso():
+    """Inicializador de crear_pool_procesos(precargar=True). No lanza: un fallo aquí rompería el pool entero."""
+    try:
+        precargar_etapas()
+    except Exception:
+        traceback.print_exc() # La etapa mostrará el mismo error al importar su módulo
+
+def crear_pool_procesos(max_procesos=MAX_PROCESOS_DEFECTO, precargar=False):
+    """
+    Pool de procesos para ejecutar_en_paralelo, creados con 'spawn' (también en Linux): con
+    'fork' heredarían el pool de MySQL con sus sockets ya abiertos y los catálogos en caché del
+    proceso padre. Con `precargar` cada proceso corre precargar_etapas() al arrancar (pools
+    persistentes que se pasan a ejecutar_en_paralelo en varias corridas).
+    """
+    return ProcessPoolExecutor(max_workers=max_procesos, mp_context=multiprocessing.get_context("spawn"),
+                               initializer=_precargar_proceso if precargar else None)
+
+def _etapa_omitida(clave, motivo):
+    return {"clave": clave, "nombre": AVAILABLE_SCRIPTS[clave]["name"], "exito": False,
+            "duracion": 0.0, "resultado": None, "salida": "", "error": f"Omitida {motivo}.",
+            "inicio": time.time(), "fin": time.time(), "fases": {}, "filas_entrada": None, "filas_salida": None,
+            "filas_omitidas": {}, "sentencias_bd": None, "espera_bloqueos": None}
+
+def ejecutar_en_paralelo(claves=None, max_procesos=MAX_PROCESOS_DEFECTO, detener_en_error=True, capturar_salida=False, pool=None):
+    """
+    Ejecuta las etapas según el grafo 'depende_de' en un pool de procesos:
+      - Todas las lecturas de Excel se lanzan al inicio (no dependen de la BD).
+      - Cada etapa se lanza en cuanto terminaron sus dependencias (las que forman parte de
+        la corrida) y su Excel ya está leído. Cada proceso abre su propia conexión.
+    Los procesos salen de crear_pool_procesos() ('spawn'). Con `pool` (uno de
+    crear_pool_procesos) se usan sus procesos ya arrancados y no se cierra al terminar;
+    en ese caso `max_procesos` no se usa.
+    La salida de cada etapa se captura en su proceso y se imprime completa al terminar
+    (o se devuelve en 'salida' si `capturar_salida`) para no mezclar líneas entre etapas.
+    Con `detener_en_error=True` se omiten las etapas que dependen (directa o indirectamente)
+    de una que falló; las ramas independientes siguen. Devuelve la lista de dicts de
+    ejecutar_etapa en el orden de AVAILABLE_SCRIPTS.
+    """
+    claves = [clave for clave in AVAILABLE_SCRIPTS if claves is None or clave in claves]
+    invalidar_cache()
+    dependencias = {clave: [dep for dep in AVAILABLE_SCRIPTS[clave].get("depende_de", []) if dep in claves] for clave in claves}
+    terminadas = {}
+    segundos_excel = {} # Lectura adelantada del Excel de cada etapa (se suma a su fase leer_excel)
+    if pool is None: print(f"[INFO] Ejecutando {len(claves)} etapas en paralelo con hasta {max_procesos} procesos...")
+    else: print(f"[INFO] Ejecutando {len(claves)} etapas en paralelo en el pool de procesos precargado...")
+
+    with (contextlib.nullcontext(pool) if pool is not None else crear_pool_procesos(max_procesos)) as pool:
+        lecturas = {clave: pool.submit(_leer_excel_etapa, clave) for clave in claves if AVAILABLE_SCRIPTS[clave].get("lee_excel")}
+        en_curso = {} # future -> clave
+        pendientes = list(claves)
+        while pendientes or en_curso:
+            for clave in list(pendientes):
+                if not all(dep in terminadas for dep in dependencias[clave]):
+                    continue
+                if detener_en_error and not all(terminadas[dep]["exito"] for dep in dependencias[clave]):
+                    terminadas[clave] = _etapa_omitida(clave, "por fallo de una etapa de la que depende")
+                    pendientes.remove(clave)
+                    continue
+                lectura = lecturas.get(clave)
+                if lectura is not None and not lectura.done():
+                    continue
+                argumentos = {}
+                if _omitir_encadenada(clave, claves):
+                    argumentos["encadenar_cuotas"] = False
+                if lectura is not None and lectura.exception() is None:
+                    argumentos["df_excel"], segundos_excel[clave] = lectura.result()
+                # Si la lectura falló, la etapa vuelve a leer y reporta el error con su propio mensaje
+                print(f"[INFO] Iniciando etapa: {AVAILABLE_SCRIPTS[clave]['name']}")
+                en_curso[pool.submit(_ejecutar_etapa_proceso, clave, **argumentos)] = clave
+                pendientes.remove(clave)
+
+            # Se espera a que termine una etapa o la lectura de Excel de una etapa pendiente
+            esperando_excel = [lecturas[clave] for clave in pendientes if clave in lecturas and not lecturas[clave].done()]
+            if not en_curso and not esperando_excel:
+                if pendientes:
+                    raise RuntimeError(f"Dependencias sin resolver en AVAILABLE_SCRIPTS: {', '.join(pendientes)}")
+                break
+            listos, _ = wait(list(en_curso) + esperando_excel, return_when=FIRST_COMPLETED)
+            for futuro in listos:
+                clave = en_curso.pop(futuro, None)
+                if clave is None: continue # Terminó una lectura de Excel
+                try:
+                    etapa = futuro.result()
+                except Exception as e:
+                    # Fallo del proceso trabajador (p.ej. se cayó), no de la etapa
+                    etapa = _etapa_omitida(clave, "por fallo del proceso trabajador")
+                    etapa["error"] = f"Error en el proceso trabajador: {e}"
+                if clave in segundos_excel:
+                    etapa["fases"]["leer_excel"] = round(etapa["fases"].get("leer_excel", 0.0) + segundos_excel[clave], 3)
+                terminadas[clave] = etapa
+                if not capturar_salida:
+                    print(etapa["salida"], end="")
+                    etapa["salida"] = ""
+                print(f"[{'OK' if etapa['exito'] else 'ERROR'}] Etapa terminada: {etapa['nombre']} ({etapa['duracion']:.1f} s)")
+
+    return [terminadas[clave] for clave in claves]
+
+def imprimir_resumen(etapas):
+    """Tabla final con el estado y la duración de cada etapa."""
+    print("\n--- Resumen Pipeline ---")
+    for etapa in etapas:
+        if etapa["resultado"] is None and etapa["error"].startswith("Omitida"):
+            estado = "OMITIDA"
+        else:
+            estado = "OK" if etapa["exito"] else "ERROR"
+        print(f"{etapa['nombre']:<80} {estado:<8} {etapa['duracion']:8.1f} s")
+    print("========================")
+
+# --- Lógica Principal ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ejecuta las etapas de importación en un solo proceso.")
+    parser.add_argument("etapas", nargs="*", metavar="etapa",
+                        help=f"Etapas a ejecutar (por defecto todas): {', '.join(AVAILABLE_SCRIPTS)}")
+    parser.add_argument("--continuar", action="store_true", help="No detenerse si una etapa falla.")
+    parser.add_argument("--paralelo", nargs="?", type=int, const=MAX_PROCESOS_DEFECTO, default=None, metavar="N",
+                        help=f"Ejecutar etapas independientes en N procesos (por defecto {MAX_PROCESOS_DEFECTO}).")
+    args = parser.parse_args()
+    desconocidas = [clave for clave in args.etapas if clave not in AVAILABLE_SCRIPTS]
+    if desconocidas:
+        parser.error(f"Etapas desconocidas: {', '.join(desconocidas)}")
+
+    if args.paralelo:
+        etapas = ejecutar_en_paralelo(args.etapas or None, max_procesos=args.paralelo, detener_en_error=not args.continuar)
+    else:
+        etapas = ejecutar_secuencia(args.etapas or None, detener_en_error=not args.continuar)
+    imprimir_resumen(etapas)
+    try:
+        historial.registrar_etapas(etapas)
+    except Exception as e:
+        print(f"[WARN] No se pudo registrar el historial de la corrida: {e}")
+    sys.exit(0 if all(etapa["exito"] for etapa in etapas) else 1)
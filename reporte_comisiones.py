@@ -1,144 +1,95 @@
 # -*- coding: utf-8 -*-
 import pandas as pd
 from datetime import datetime, timedelta
-from decimal import Decimal, ROUND_HALF_UP # Usar Decimal para precisión monetaria y especificar redondeo
-import mysql.connector # Importar para manejar errores específicos y usar ping
+from decimal import Decimal # Usar Decimal para precisión monetaria
+
+import argparse
+import sys
+
+from motor_comisiones import obtener_reglas_comision, indexar_conciliaciones, indexar_cuotas, calcular_aplicaciones, dividir_en_quincenas
+import ledger_comisiones
 
 # --- Importar función de conexión ---
 try:
-    from conexion_mysql import conectar
+    from conexion_mysql import SesionLectura
 except ImportError:
-    print("Error: No se pudo encontrar el archivo 'conexion_mysql.py' o la función 'conectar'.")
-    def conectar():
-        print("ADVERTENCIA: Usando conexión dummy.")
-        return None
-    # exit()
+    print("Error: No se pudo encontrar el archivo 'conexion_mysql.py' o la clase 'SesionLectura'.")
+    raise
 
 # --- Constantes y Configuración ---
 # Fechas actualizadas según tu solicitud anterior
 FECHA_INICIO_QUINCENA = datetime(2025, 4, 16)
 FECHA_FIN_QUINCENA = datetime(2025, 4, 30, 23, 59, 59)
 ARCHIVO_SALIDA_EXCEL = f"reporte_comisiones_{FECHA_INICIO_QUINCENA.strftime('%Y%m%d')}_{FECHA_FIN_QUINCENA.strftime('%Y%m%d')}.xlsx"
+# Modo por lotes (--desde/--hasta): un archivo con todas las quincenas del rango
+ARCHIVO_SALIDA_LOTE = "reporte_comisiones_{desde}_{hasta}_quincenas.xlsx"
+# Todas las lecturas del reporte en una transacción de solo lectura con snapshot consistente
+# (las hojas no mezclan datos de antes y después de una importación que corra en paralelo)
+LECTURA_CONSISTENTE = True
 
 # --- Funciones Auxiliares ---
 
-def obtener_reglas_comision(cursor):
-    """Obtiene las reglas de comisión de la base de datos."""
-    print("[DB] Obteniendo reglas de comisión...")
-    query = "SELECT id, dias_desde, dias_hasta, porcentaje, descripcion FROM comision_por_antiguedad ORDER BY dias_desde"
-    cursor.execute(query)
-    reglas = cursor.fetchall()
-    if not reglas:
-        raise ValueError("No se encontraron reglas de comisión en la tabla 'comision_por_antiguedad'.")
-    print(f"[OK] {len(reglas)} reglas de comisión obtenidas.")
-    for regla in reglas:
-        regla['porcentaje'] = Decimal(regla['porcentaje']) / Decimal(100)
-    return reglas
-
-def buscar_tasa_comision(dias_vencido, reglas_comision):
-    """Encuentra la tasa de comisión aplicable según los días de vencimiento."""
-    for regla in reglas_comision:
-        dias_desde = regla['dias_desde'] if regla['dias_desde'] is not None else -float('inf')
-        dias_hasta = regla['dias_hasta'] if regla['dias_hasta'] is not None else float('inf')
-        if dias_desde <= dias_vencido <= dias_hasta:
-            return regla['porcentaje'], regla.get('descripcion', f"{dias_desde} a {dias_hasta} días")
-    # Si no se encuentra ninguna regla (debería haber una que cubra todos los casos)
-    # Ajustamos el mensaje para que sea más informativo si esto ocurre
-    print(f"ADVERTENCIA: No se encontró regla de comisión aplicable para {dias_vencido} días. Verifique la tabla 'comision_por_antiguedad'. Se asignará 0%.")
-    return Decimal(0), "Sin Regla Aplicable"
-
-# --- Nueva Función ---
-
-def obtener_detalle_pagos_periodo(fecha_inicio, fecha_fin, conexion):
-    """Obtiene los detalles de los pagos del período desde la tabla pagos."""
-    cursor = None
-    df_pagos = pd.DataFrame() # Inicializar DataFrame vacío
-
-    try:
-        cursor_opts = {'dictionary': True, 'buffered': True}
-        # Ping antes de crear el cursor
-        try:
-            print("[DB] Verificando conexión para detalle de pagos...")
-            conexion.ping(reconnect=True, attempts=3, delay=1)
-        except mysql.connector.Error as err:
-            print(f"Error de conexión antes de obtener detalle de pagos: {err}")
-            raise # Relanzar si falla el ping aquí
-        cursor = conexion.cursor(**cursor_opts)
-        print("[DB] Obteniendo detalle de pagos del período...")
-
-        query = """
-            SELECT
-                p.id AS ID_Pago, p.fecha_pago AS Fecha_Pago, p.monto AS Monto_Pago,
-                p.diario AS Diario, p.id_cliente AS ID_Cliente, c.nombre AS Nombre_Cliente
-            FROM pagos p LEFT JOIN clientes c ON p.id_cliente = c.id
-            WHERE p.fecha_pago BETWEEN %s AND %s
-            ORDER BY p.fecha_pago ASC, p.id ASC;
-        """
-        cursor.execute(query, (fecha_inicio, fecha_fin))
-        pagos_data = cursor.fetchall()
-        print(f"[OK] {len(pagos_data)} registros de pago encontrados en el período.")
-
-        if pagos_data:
-            df_pagos = pd.DataFrame(pagos_data)
-            df_pagos['Fecha_Pago'] = pd.to_datetime(df_pagos['Fecha_Pago']).dt.date
-            df_pagos['Monto_Pago'] = pd.to_numeric(df_pagos['Monto_Pago'], errors='coerce').fillna(0)
-            total_monto = df_pagos['Monto_Pago'].sum()
-            total_row = pd.DataFrame([{'ID_Pago': '', 'Fecha_Pago': '', 'Diario': '', 'ID_Cliente': '',
-                                       'Nombre_Cliente': 'TOTAL', 'Monto_Pago': total_monto}])
-            total_row = total_row[df_pagos.columns] # Asegurar orden
-            df_pagos = pd.concat([df_pagos, total_row], ignore_index=True)
-            if 'Monto_Pago' in df_pagos.columns:
-                 df_pagos['Monto_Pago'] = df_pagos['Monto_Pago'].apply(lambda x: float(x) if isinstance(x, Decimal) else x).astype(float)
-
-    except Exception as e:
-        print(f"\n--- ERROR AL OBTENER DETALLE DE PAGOS ---")
-        import traceback
-        traceback.print_exc()
-    finally:
-        if cursor:
-            try: cursor.close(); print("[DB] Cursor de detalle de pagos cerrado.")
-            except Exception: pass
+def agregar_fila_total_pagos(df_pagos):
+    """Añade la fila 'TOTAL' (suma de Monto_Pago) al detalle de pagos."""
+    if df_pagos.empty: return df_pagos
+    total_monto = df_pagos['Monto_Pago'].sum()
+    total_row = pd.DataFrame([{'ID_Pago': '', 'Fecha_Pago': '', 'Diario': '', 'ID_Cliente': '',
+                               'Nombre_Cliente': 'TOTAL', 'Monto_Pago': total_monto}])
+    total_row = total_row[df_pagos.columns] # Asegurar orden
+    df_pagos = pd.concat([df_pagos, total_row], ignore_index=True)
+    df_pagos['Monto_Pago'] = df_pagos['Monto_Pago'].apply(lambda x: float(x) if isinstance(x, Decimal) else x).astype(float)
     return df_pagos
 
+def obtener_pagos_periodo(sesion, fecha_inicio, fecha_fin):
+    """
+    Pagos del período con cliente y si su diario es comisionable. Es la única consulta de
+    pagos del reporte: alimenta la hoja 'Pagos Periodo' y los pagos comisionables del cálculo.
+    """
+    print(f"[DB] Obteniendo pagos entre {fecha_inicio.date()} y {fecha_fin.date()}...")
+    pagos = sesion.consultar("""
+        SELECT p.id, p.fecha_pago, p.monto AS monto_total_pago, p.diario, p.id_cliente,
+               c.nombre AS nombre_cliente, COALESCE(d.es_comisionable, 0) AS es_comisionable
+        FROM pagos p LEFT JOIN clientes c ON p.id_cliente = c.id
+             LEFT JOIN diarios d ON p.diario = d.nombre
+        WHERE p.fecha_pago BETWEEN %s AND %s
+        ORDER BY p.fecha_pago ASC, p.id ASC;
+    """, (fecha_inicio, fecha_fin))
+    print(f"[OK] {len(pagos)} registros de pago encontrados en el período.")
+    return pagos
+
+def armar_detalle_pagos(pagos, con_total=True):
+    """DataFrame de la hoja 'Pagos Periodo' a partir de obtener_pagos_periodo() (con fila TOTAL si `con_total`)."""
+    if not pagos: return pd.DataFrame()
+    df_pagos = pd.DataFrame([{'ID_Pago': p['id'], 'Fecha_Pago': p['fecha_pago'], 'Monto_Pago': p['monto_total_pago'],
+                              'Diario': p['diario'], 'ID_Cliente': p['id_cliente'], 'Nombre_Cliente': p['nombre_cliente']}
+                             for p in pagos])
+    df_pagos['Fecha_Pago'] = pd.to_datetime(df_pagos['Fecha_Pago']).dt.date
+    df_pagos['Monto_Pago'] = pd.to_numeric(df_pagos['Monto_Pago'], errors='coerce').fillna(0)
+    if con_total: df_pagos = agregar_fila_total_pagos(df_pagos)
+    return df_pagos
 
-# --- Función Principal ---
-
-def calcular_comisiones(fecha_inicio, fecha_fin):
-    """Calcula las comisiones para la quincena especificada."""
-    conexion = None
-    cursor = None
+def calcular_comisiones(fecha_inicio, fecha_fin, sesion=None, pagos=None):
+    """
+    Calcula las comisiones para la quincena especificada. Todas las consultas van por
+    `sesion` (SesionLectura); sin ella se abre una propia. `pagos` son los de
+    obtener_pagos_periodo() si ya se consultaron (se filtran los comisionables).
+    """
+    if sesion is None:
+        print("[DB] Conectando a la base de datos...")
+        with SesionLectura(instantanea=LECTURA_CONSISTENTE) as sesion:
+            print("[OK] Conexión establecida.")
+            return calcular_comisiones(fecha_inicio, fecha_fin, sesion, pagos)
     resultados_comision = []
 
     # IDs para depuración específica
     ID_PAGO_INTERES = 228
     ID_FACTURA_INTERES = 36601
 
+    # Primera consulta, fuera del try: unas reglas inválidas (ValueError) abortan el reporte, no son un período sin comisiones
+    tabla_comision = sesion.ejecutar(obtener_reglas_comision)
     try:
-        print("[DB] Conectando a la base de datos...")
-        conexion = conectar()
-        if not conexion: raise Exception("No se pudo conectar a la base de datos.")
-        cursor_opts = {'dictionary': True, 'buffered': True}
-        cursor = conexion.cursor(**cursor_opts)
-        print("[OK] Conexión establecida.")
-
-        reglas_comision = obtener_reglas_comision(cursor) # Primera consulta
-
-        print(f"[DB] Obteniendo pagos comisionables entre {fecha_inicio.date()} y {fecha_fin.date()}...")
-        query_pagos = """
-            SELECT p.id, p.fecha_pago, p.monto AS monto_total_pago, p.id_cliente,
-                   p.diario, d.es_comisionable
-            FROM pagos p JOIN diarios d ON p.diario = d.nombre
-            WHERE p.fecha_pago BETWEEN %s AND %s AND d.es_comisionable = 1
-            ORDER BY p.fecha_pago ASC;
-        """
-        try:
-            print("[DB] Verificando conexión antes de obtener pagos...")
-            conexion.ping(reconnect=True, attempts=3, delay=1)
-        except mysql.connector.Error as err: print(f"Error de conexión antes de obtener pagos: {err}"); raise
-        cursor.close(); cursor = conexion.cursor(**cursor_opts)
-        print("[DB] Cursor recreado antes de obtener pagos.")
-        cursor.execute(query_pagos, (fecha_inicio, fecha_fin))
-        pagos_periodo = cursor.fetchall()
+        if pagos is None: pagos = obtener_pagos_periodo(sesion, fecha_inicio, fecha_fin)
+        pagos_periodo = [p for p in pagos if p['es_comisionable']]
         print(f"[OK] {len(pagos_periodo)} pagos comisionables encontrados en el período.")
 
         if not pagos_periodo: print("No hay pagos comisionables en el período seleccionado."); return pd.DataFrame()
@@ -156,22 +107,14 @@ def calcular_comisiones(fecha_inicio, fecha_fin):
 
         print("[DB] Obteniendo conciliaciones de pagos...")
         if not ids_pagos_periodo: print("No hay IDs de pago para buscar conciliaciones."); return pd.DataFrame()
-        placeholders = ', '.join(['%s'] * len(ids_pagos_periodo))
-        query_conciliaciones = f"""
+        query_conciliaciones = """
             SELECT pc.id AS id_conciliacion, pc.id_pago, pc.id_factura, pc.monto_aplicado,
                    pc.fecha_aplicacion, f.id_vendedor, f.num_factura, f.id_cliente AS id_cliente_factura
             FROM pago_conciliados pc JOIN facturas f ON pc.id_factura = f.id
-            WHERE pc.id_pago IN ({placeholders})
+            WHERE pc.id_pago IN ({ids})
             ORDER BY pc.id_factura, pc.fecha_aplicacion ASC;
         """
-        try:
-            print("[DB] Verificando conexión antes de obtener conciliaciones...")
-            conexion.ping(reconnect=True, attempts=3, delay=1)
-        except mysql.connector.Error as err: print(f"Error de conexión antes de obtener conciliaciones: {err}"); raise
-        cursor.close(); cursor = conexion.cursor(**cursor_opts)
-        print("[DB] Cursor recreado antes de obtener conciliaciones.")
-        cursor.execute(query_conciliaciones, tuple(ids_pagos_periodo))
-        conciliaciones = cursor.fetchall()
+        conciliaciones = sesion.consultar_por_ids(query_conciliaciones, ids_pagos_periodo)
         print(f"[OK] {len(conciliaciones)} conciliaciones encontradas.")
 
         if not conciliaciones: print("No se encontraron conciliaciones para los pagos del período."); return pd.DataFrame()
@@ -180,133 +123,39 @@ def calcular_comisiones(fecha_inicio, fecha_fin):
         if not ids_facturas_involucradas: print("No hay facturas involucradas."); return pd.DataFrame()
 
         print("[DB] Obteniendo cuotas de las facturas involucradas...")
-        placeholders_facturas = ', '.join(['%s'] * len(ids_facturas_involucradas))
-        query_cuotas = f"""
+        query_cuotas = """
             SELECT id, id_factura, nro_cuota, fecha_vencimiento, monto_cuota, pendiente_cobrar
-            FROM cuotas WHERE id_factura IN ({placeholders_facturas})
+            FROM cuotas WHERE id_factura IN ({ids})
             ORDER BY id_factura, nro_cuota ASC;
         """
-        try:
-            print("[DB] Verificando conexión antes de obtener cuotas...")
-            conexion.ping(reconnect=True, attempts=3, delay=1)
-        except mysql.connector.Error as err: print(f"Error de conexión antes de obtener cuotas: {err}"); raise
-        cursor.close(); cursor = conexion.cursor(**cursor_opts)
-        print("[DB] Cursor recreado antes de obtener cuotas.")
-        cursor.execute(query_cuotas, tuple(ids_facturas_involucradas))
-        cuotas_list = cursor.fetchall()
+        cuotas_list = sesion.consultar_por_ids(query_cuotas, ids_facturas_involucradas)
         print(f"[OK] {len(cuotas_list)} cuotas obtenidas.")
 
-        cuotas_por_factura = {}
-        for c in cuotas_list:
-            id_factura = c['id_factura']
-            if id_factura not in cuotas_por_factura: cuotas_por_factura[id_factura] = {}
-            c['pendiente_actual'] = Decimal(c['monto_cuota'] or '0.0')
-            c['monto_cuota'] = Decimal(c['monto_cuota'] or '0.0')
-            if isinstance(c['fecha_vencimiento'], datetime): c['fecha_vencimiento'] = c['fecha_vencimiento'].date()
-            elif c['fecha_vencimiento'] is None: print(f"ADVERTENCIA: Cuota ID {c.get('id','N/A')} FacID {c['id_factura']} F Venc NULA."); continue
-            cuotas_por_factura[id_factura][c['nro_cuota']] = c
+        cuotas_por_factura = indexar_cuotas(cuotas_list) # {id_factura: [cuotas ordenadas por nro_cuota]}
 
         print("[DB] Obteniendo historial de pagos para simular saldos...")
-        query_hist_conciliaciones = f"""
-            SELECT pc.id_pago, pc.id_factura, pc.monto_aplicado, p.fecha_pago
+        query_hist_conciliaciones = """
+            SELECT pc.id AS id_conciliacion, pc.id_pago, pc.id_factura, pc.monto_aplicado, p.fecha_pago
             FROM pago_conciliados pc JOIN pagos p ON pc.id_pago = p.id
-            WHERE pc.id_factura IN ({placeholders_facturas})
+            WHERE pc.id_factura IN ({ids})
             ORDER BY p.fecha_pago ASC, pc.id_pago ASC, pc.id ASC;
         """
-        try:
-            print("[DB] Verificando conexión antes de obtener historial...")
-            conexion.ping(reconnect=True, attempts=3, delay=1)
-        except mysql.connector.Error as err: print(f"Error de conexión antes de obtener historial: {err}"); raise
-        cursor.close(); cursor = conexion.cursor(**cursor_opts)
-        print("[DB] Cursor recreado antes de obtener historial de conciliaciones.")
-        cursor.execute(query_hist_conciliaciones, tuple(ids_facturas_involucradas))
-        historial_conciliaciones = cursor.fetchall()
+        # La cascada necesita el orden cronológico global (el ORDER BY solo vale dentro de cada lote)
+        historial_conciliaciones = sesion.consultar_por_ids(
+            query_hist_conciliaciones, ids_facturas_involucradas,
+            orden=lambda h: (h['fecha_pago'] is not None, h['fecha_pago'], h['id_pago'], h['id_conciliacion']))
         print(f"[OK] {len(historial_conciliaciones)} registros de historial de conciliación obtenidos.")
 
         # --- Bucle Principal de Procesamiento ---
         if ID_FACTURA_INTERES in cuotas_por_factura:
             print(f"\nDEBUG: Estado INICIAL Cuotas Factura {ID_FACTURA_INTERES}:")
-            for n_cuota, c_data in sorted(cuotas_por_factura[ID_FACTURA_INTERES].items()):
-                print(f"  Cuota {n_cuota}: Monto={c_data['monto_cuota']}, PendienteInicial={c_data['pendiente_actual']:.2f} (Desde BD: {c_data['pendiente_cobrar']})")
+            for c_data in cuotas_por_factura[ID_FACTURA_INTERES]:
+                print(f"  Cuota {c_data['nro_cuota']}: Monto={c_data['monto_cuota']}, PendienteInicial={c_data['pendiente_actual']:.2f} (Desde BD: {c_data['pendiente_cobrar']})")
          
         print("[PROCESS] Procesando pagos y calculando comisiones...")
-        for pago_info in historial_conciliaciones:
-            id_pago_hist = pago_info['id_pago']
-            id_factura_hist = pago_info['id_factura']
-            monto_aplicado_hist = Decimal(pago_info['monto_aplicado'] or '0.0')
-            fecha_pago_hist = pago_info['fecha_pago']
-
-            # --- INICIO DEBUG ESPECÍFICO ---
-            is_target_payment = (id_pago_hist == ID_PAGO_INTERES and id_factura_hist == ID_FACTURA_INTERES)
-            if is_target_payment:
-                print(f"\nDEBUG: Procesando Registro Historial: PagoID={id_pago_hist}, FacturaID={id_factura_hist}, Fecha={fecha_pago_hist}, MontoAplicadoHist={monto_aplicado_hist:.2f}")
-            # --- FIN DEBUG ESPECÍFICO ---
-
-            if isinstance(fecha_pago_hist, datetime): fecha_pago_hist = fecha_pago_hist.date()
-            elif fecha_pago_hist is None: continue
-
-            if monto_aplicado_hist <= 0: continue
-            if id_factura_hist not in cuotas_por_factura: continue
-
-            cuotas_factura_actual = sorted(cuotas_por_factura[id_factura_hist].values(), key=lambda x: x['nro_cuota'])
-            monto_restante_pago = monto_aplicado_hist
-
-            for cuota in cuotas_factura_actual:
-                if is_target_payment:
-                     print(f"  DEBUG: Evaluando Cuota {cuota['nro_cuota']} (Vence: {cuota['fecha_vencimiento']}) - Pendiente ANTES: {cuota['pendiente_actual']:.2f}")
-
-                if monto_restante_pago <= 0: break
-                pendiente_cuota = cuota['pendiente_actual']
-
-                if pendiente_cuota > 0:
-                    monto_a_aplicar_a_cuota = min(monto_restante_pago, pendiente_cuota)
-
-                    if is_target_payment:
-                        print(f"    DEBUG: Aplicando a esta cuota: {monto_a_aplicar_a_cuota:.2f}")
-
-                    # Verificar si el pago pertenece al período y es comisionable
-                    if id_pago_hist in ids_pagos_periodo:
-                        if is_target_payment:
-                            print(f"      DEBUG: Pago ID {id_pago_hist} ESTÁ en ids_pagos_periodo. Calculando comisión...")
-
-                        conciliacion_actual = next((c for c in conciliaciones if c['id_pago'] == id_pago_hist and c['id_factura'] == id_factura_hist), None)
-                        if not conciliacion_actual:
-                             print(f"Error interno: No se encontró la conciliación original para pago {id_pago_hist} y factura {id_factura_hist}")
-                             continue # Saltar este cálculo si no hay conciliación
-
-                        fecha_vencimiento_cuota = cuota['fecha_vencimiento']
-                        dias_vencido = (fecha_pago_hist - fecha_vencimiento_cuota).days
-                        porcentaje_comision, desc_rango = buscar_tasa_comision(dias_vencido, reglas_comision)
-                        comision_generada = Decimal(0)
-                        if porcentaje_comision > 0:
-                            comision_generada = (monto_a_aplicar_a_cuota * porcentaje_comision).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-
-                        resultado = {
-                            'ID Vendedor': conciliacion_actual['id_vendedor'], 'ID Cliente': conciliacion_actual['id_cliente_factura'],
-                            'ID Pago': id_pago_hist, 'Fecha Pago': fecha_pago_hist,
-                            'Monto Total Pago': pagos_dict[id_pago_hist]['monto_total_pago'],
-                            'ID Factura': id_factura_hist, 'Numero Factura': conciliacion_actual['num_factura'],
-                            'Nro Cuota': cuota['nro_cuota'], 'Fecha Vencimiento Cuota': fecha_vencimiento_cuota,
-                            'Monto Total Cuota': cuota['monto_cuota'], 'Monto Aplicado a Cuota': monto_a_aplicar_a_cuota,
-                            'Dias Vencido al Pago': dias_vencido, 'Rango Comision Aplicado': desc_rango,
-                            'Porcentaje Comision': porcentaje_comision, 'Comision Generada': comision_generada,
-                            'ID Conciliacion': conciliacion_actual['id_conciliacion']
-                        }
-                        if is_target_payment:
-                            print(f"        DEBUG: Comisión Generada: {resultado['Comision Generada']:.2f} (Porc: {resultado['Porcentaje Comision']}) - Añadiendo a resultados.")
-                        resultados_comision.append(resultado) # Añadir a la lista
-
-                    elif is_target_payment:
-                         print(f"      DEBUG: Pago ID {id_pago_hist} NO está en ids_pagos_periodo. NO se calcula comisión.")
-
-                    # Actualizar estado en memoria para la simulación
-                    cuota['pendiente_actual'] -= monto_a_aplicar_a_cuota
-                    monto_restante_pago -= monto_a_aplicar_a_cuota
-
-                    if is_target_payment:
-                         print(f"    DEBUG: Pendiente DESPUÉS: {cuota['pendiente_actual']:.2f} | Monto Restante Pago: {monto_restante_pago:.2f}")
-                elif is_target_payment and pendiente_cuota <= 0:
-                     print(f"  DEBUG: Evaluando Cuota {cuota['nro_cuota']} - Pendiente ANTES era CERO o negativo. Saltando aplicación.")
+        conciliaciones_por_clave = indexar_conciliaciones(conciliaciones) # {(id_pago, id_factura): conciliación}
+        resultados_comision = calcular_aplicaciones(historial_conciliaciones, cuotas_por_factura, conciliaciones_por_clave,
+                                                    pagos_dict, ids_pagos_periodo, tabla_comision, depurar=(ID_PAGO_INTERES, ID_FACTURA_INTERES))
         # --- Fin Bucle Principal ---
         print(f"[OK] Procesamiento de pagos completado. {len(resultados_comision)} registros de comisión generados.")
 
@@ -327,42 +176,26 @@ def calcular_comisiones(fecha_inicio, fecha_fin):
             mapa_vendedores = {}
             if ids_vendedores:
                 print("[DB] Obteniendo nombres de vendedores...")
-                placeholders_vendedores = ', '.join(['%s'] * len(ids_vendedores))
-                query_vendedores = f"SELECT idVendedores, nombre FROM vendedores WHERE idVendedores IN ({placeholders_vendedores})"
-                try:
-                    print("[DB] Verificando conexión antes de obtener vendedores...")
-                    conexion.ping(reconnect=True, attempts=3, delay=1)
-                except mysql.connector.Error as err: print(f"Error de conexión antes de obtener vendedores: {err}")
-                cursor.close(); cursor = conexion.cursor(**cursor_opts)
-                print("[DB] Cursor recreado antes de obtener vendedores.")
+                query_vendedores = "SELECT idVendedores, nombre FROM vendedores WHERE idVendedores IN ({ids})"
                 try:
-                    cursor.execute(query_vendedores, tuple(ids_vendedores))
-                    vendedores_data = cursor.fetchall()
+                    vendedores_data = sesion.consultar_por_ids(query_vendedores, ids_vendedores)
                     mapa_vendedores = {v['idVendedores']: v['nombre'] for v in vendedores_data}
                     print("[OK] Nombres de vendedores obtenidos.")
                 except Exception as db_err:
-                    print(f"--- ERROR AL OBTENER VENDEDORES ---"); print(f"Consulta: {getattr(cursor, 'statement', 'N/A')}"); print(f"Error: {db_err}"); pass
+                    print(f"--- ERROR AL OBTENER VENDEDORES ---"); print(f"Consulta: {query_vendedores}"); print(f"Error: {db_err}"); pass
             df_resultados['Nombre Vendedor'] = df_resultados['ID Vendedor'].map(mapa_vendedores)
 
             # --- Obtener Nombres Clientes ---
             mapa_clientes = {}
             if ids_clientes:
                 print("[DB] Obteniendo nombres de clientes...")
-                placeholders_clientes = ', '.join(['%s'] * len(ids_clientes))
-                query_clientes = f"SELECT id, nombre FROM clientes WHERE id IN ({placeholders_clientes})"
+                query_clientes = "SELECT id, nombre FROM clientes WHERE id IN ({ids})"
                 try:
-                    print("[DB] Verificando conexión antes de obtener clientes...")
-                    conexion.ping(reconnect=True, attempts=3, delay=1)
-                except mysql.connector.Error as err: print(f"Error de conexión antes de obtener clientes: {err}")
-                cursor.close(); cursor = conexion.cursor(**cursor_opts)
-                print("[DB] Cursor recreado antes de obtener clientes.")
-                try:
-                    cursor.execute(query_clientes, tuple(ids_clientes))
-                    clientes_data = cursor.fetchall()
+                    clientes_data = sesion.consultar_por_ids(query_clientes, ids_clientes)
                     mapa_clientes = {c['id']: c['nombre'] for c in clientes_data}
                     print("[OK] Nombres de clientes obtenidos.")
                 except Exception as db_err:
-                    print(f"--- ERROR AL OBTENER CLIENTES ---"); print(f"Consulta: {getattr(cursor, 'statement', 'N/A')}"); print(f"Error: {db_err}"); pass
+                    print(f"--- ERROR AL OBTENER CLIENTES ---"); print(f"Consulta: {query_clientes}"); print(f"Error: {db_err}"); pass
             df_resultados['Nombre Cliente'] = df_resultados['ID Cliente'].map(mapa_clientes)
 
             # --- Finalizar DataFrame ---
@@ -383,48 +216,123 @@ def calcular_comisiones(fecha_inicio, fecha_fin):
     except Exception as e:
         print(f"\n--- ERROR DURANTE EL PROCESO ---"); import traceback; traceback.print_exc(); return pd.DataFrame()
 
-    finally:
-        if cursor:
-             try: cursor.close(); print("[DB] Cursor final cerrado.")
-             except Exception as cur_err: print(f"Advertencia: Error al intentar cerrar el cursor final: {cur_err}")
-        if conexion and conexion.is_connected():
-            conexion.close(); print("[DB] Conexión cerrada.")
+def obtener_datos_reporte(fecha_inicio, fecha_fin, usar_ledger=False, con_total=True):
+    """
+    Devuelve (df_comisiones, df_pagos) leyendo todo en una sola SesionLectura: los pagos del
+    período se consultan una vez y alimentan ambas hojas. Comisiones recalculadas desde el
+    historial o, si `usar_ledger`, extendiendo primero el ledger persistente y consultando el
+    rango en él (ledger_comisiones.py). DataFrames vacíos si falla la lectura; el ValueError de
+    unas reglas de comisión inválidas se propaga.
+    """
+    if usar_ledger and not ledger_comisiones.ejecutar()["exito"]:
+        print("[ERROR] No se pudo actualizar el ledger de comisiones."); return pd.DataFrame(), pd.DataFrame()
+    try:
+        print("[DB] Abriendo sesión de lectura del reporte...")
+        with SesionLectura(instantanea=LECTURA_CONSISTENTE) as sesion:
+            pagos = obtener_pagos_periodo(sesion, fecha_inicio, fecha_fin)
+            if usar_ledger: df_comisiones = ledger_comisiones.consultar_comisiones(fecha_inicio, fecha_fin, sesion)
+            else: df_comisiones = calcular_comisiones(fecha_inicio, fecha_fin, sesion, pagos)
+            print(f"[DB] Sesión de lectura cerrada ({sesion.consultas} consultas, {sesion.reconexiones} reconexiones).")
+        return df_comisiones, armar_detalle_pagos(pagos, con_total)
+    except ValueError: raise # Reglas de comisión inválidas
+    except Exception as e:
+        print(f"\n--- ERROR AL LEER DATOS DEL REPORTE ---"); import traceback; traceback.print_exc()
+        return pd.DataFrame(), pd.DataFrame()
+
+# --- Salida ---
+
+def guardar_excel(ruta, hojas):
+    """Escribe en `ruta` las hojas [(nombre, DataFrame)] no vacías. Devuelve True si se guardó el archivo."""
+    if all(df.empty for _, df in hojas):
+        print(f"\n[INFO] Sin datos para '{ruta}'. No se genera el archivo.")
+        return False
+    try:
+        print(f"\n[OUTPUT] Guardando resultados en '{ruta}'...")
+        with pd.ExcelWriter(ruta, engine='openpyxl', date_format='YYYY-MM-DD', datetime_format='YYYY-MM-DD') as writer:
+            for nombre_hoja, df in hojas:
+                if not df.empty:
+                    df.to_excel(writer, index=False, sheet_name=nombre_hoja); print(f"[OK] Hoja '{nombre_hoja}' preparada.")
+                else: print(f"[INFO] No hay datos para la hoja '{nombre_hoja}'.")
+        print(f"[OK] Reporte Excel '{ruta}' guardado exitosamente.")
+        return True
+    except Exception as e:
+        print(f"\n--- ERROR AL GUARDAR EXCEL ---"); print(f"Error: {e}"); print("Los datos calculados no se pudieron guardar.")
+        return False
+
+def generar_reporte_por_quincenas(fecha_desde, fecha_hasta, por_archivo=False, usar_ledger=False):
+    """
+    Modo por lotes: calcula las comisiones de todo el rango en una sola pasada (reglas, pagos,
+    conciliaciones, cuotas e historial se consultan una vez y la simulación de saldos se
+    recorre una vez en orden cronológico) y reparte las filas por quincena según 'Fecha Pago'.
+    El resultado de cada pago es el mismo que al calcular su quincena por separado, porque
+    la aplicación a cuotas solo depende del historial anterior de la misma factura.
+    Genera un libro con una hoja 'Resumen' y hojas 'Comisiones/Pagos AAAA-MM-DD' por quincena,
+    o un archivo por quincena con las hojas de siempre si `por_archivo`. Con `usar_ledger`
+    las comisiones se leen del ledger persistente en lugar de recalcularse.
+    """
+    quincenas = dividir_en_quincenas(fecha_desde, fecha_hasta)
+    print(f"[INFO] Modo por lotes: {len(quincenas)} quincenas entre {quincenas[0][0].date()} y {quincenas[-1][1].date()}.")
+
+    df_comisiones, df_pagos = obtener_datos_reporte(quincenas[0][0], quincenas[-1][1], usar_ledger, con_total=False)
+    fechas_comision = pd.to_datetime(df_comisiones['Fecha Pago']) if not df_comisiones.empty else None
+    fechas_pago = pd.to_datetime(df_pagos['Fecha_Pago']) if not df_pagos.empty else None
+
+    hojas, resumen = [], []
+    for inicio, fin in quincenas:
+        comisiones_q = df_comisiones[fechas_comision.between(inicio, fin)] if fechas_comision is not None else pd.DataFrame()
+        pagos_q = df_pagos[fechas_pago.between(inicio, fin)] if fechas_pago is not None else pd.DataFrame()
+        pagos_q = agregar_fila_total_pagos(pagos_q.reset_index(drop=True))
+        resumen.append({
+            'Quincena Desde': inicio.date(), 'Quincena Hasta': fin.date(),
+            'Registros Comision': len(comisiones_q),
+            'Monto Aplicado': float(comisiones_q['Monto Aplicado a Cuota'].sum()) if not comisiones_q.empty else 0.0,
+            'Comision Generada': float(comisiones_q['Comision Generada'].sum()) if not comisiones_q.empty else 0.0,
+            'Pagos del Periodo': max(len(pagos_q) - 1, 0), # Sin la fila TOTAL
+        })
+        if por_archivo:
+            ruta = f"reporte_comisiones_{inicio.strftime('%Y%m%d')}_{fin.strftime('%Y%m%d')}.xlsx"
+            guardar_excel(ruta, [('Comisiones', comisiones_q), ('Pagos Periodo', pagos_q)])
+        else:
+            etiqueta = inicio.strftime('%Y-%m-%d')
+            hojas += [(f'Comisiones {etiqueta}', comisiones_q), (f'Pagos {etiqueta}', pagos_q)]
+
+    df_resumen = pd.DataFrame(resumen)
+    print("\n--- Resumen por Quincena ---")
+    print(df_resumen.to_string(index=False))
+    if not por_archivo:
+        ruta = ARCHIVO_SALIDA_LOTE.format(desde=quincenas[0][0].strftime('%Y%m%d'), hasta=quincenas[-1][1].strftime('%Y%m%d'))
+        guardar_excel(ruta, [('Resumen', df_resumen)] + hojas)
+    return df_resumen
+
+def leer_fecha(texto):
+    """Fecha AAAA-MM-DD para argparse."""
+    try: return datetime.strptime(texto, '%Y-%m-%d')
+    except ValueError: raise argparse.ArgumentTypeError(f"Fecha inválida '{texto}' (formato AAAA-MM-DD).")
 
 # --- Ejecución del Script ---
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reporte de comisiones por quincena.")
+    parser.add_argument("--desde", type=leer_fecha, help="Modo por lotes: fecha inicial del rango (AAAA-MM-DD).")
+    parser.add_argument("--hasta", type=leer_fecha, help="Modo por lotes: fecha final del rango (AAAA-MM-DD), incluida.")
+    parser.add_argument("--por-archivo", action="store_true", help="Modo por lotes: un archivo Excel por quincena.")
+    parser.add_argument("--ledger", action="store_true", help="Actualiza el ledger persistente y consulta las comisiones en él.")
+    args = parser.parse_args()
+    if (args.desde is None) != (args.hasta is None): parser.error("--desde y --hasta se usan juntos.")
+    if args.desde and args.desde > args.hasta: parser.error("--desde no puede ser posterior a --hasta.")
+
     print("--- INICIO DEL SCRIPT DE CÁLCULO DE COMISIONES ---")
-    print(f"Procesando quincena: {FECHA_INICIO_QUINCENA.strftime('%d/%m/%Y')} - {FECHA_FIN_QUINCENA.strftime('%d/%m/%Y')}")
+    try:
+        if args.desde:
+            generar_reporte_por_quincenas(args.desde, args.hasta.replace(hour=23, minute=59, second=59), args.por_archivo, args.ledger)
+        else:
+            print(f"Procesando quincena: {FECHA_INICIO_QUINCENA.strftime('%d/%m/%Y')} - {FECHA_FIN_QUINCENA.strftime('%d/%m/%Y')}")
 
-    # 1. Calcular Comisiones
-    df_comisiones = calcular_comisiones(FECHA_INICIO_QUINCENA, FECHA_FIN_QUINCENA)
+            # 1-2. Calcular Comisiones y Detalle de Pagos (una sola sesión de lectura)
+            df_comisiones, df_pagos_detalle = obtener_datos_reporte(FECHA_INICIO_QUINCENA, FECHA_FIN_QUINCENA, args.ledger)
 
-    # 2. Obtener Detalle de Pagos
-    df_pagos_detalle = pd.DataFrame()
-    conexion_pagos = None
-    try:
-        print("\n[DB] Conectando para obtener detalle de pagos...")
-        conexion_pagos = conectar()
-        if conexion_pagos and conexion_pagos.is_connected():
-            print("[OK] Conexión para detalle de pagos establecida.")
-            df_pagos_detalle = obtener_detalle_pagos_periodo(FECHA_INICIO_QUINCENA, FECHA_FIN_QUINCENA, conexion_pagos)
-        else: print("[ERROR] No se pudo conectar para obtener detalle de pagos.")
-    except Exception as e: print(f"[ERROR] Falló la obtención de detalle de pagos: {e}")
-    finally:
-        if conexion_pagos and conexion_pagos.is_connected(): conexion_pagos.close(); print("[DB] Conexión para detalle de pagos cerrada.")
-
-    # 3. Escribir en Excel
-    if not df_comisiones.empty or not df_pagos_detalle.empty:
-        try:
-            print(f"\n[OUTPUT] Guardando resultados en '{ARCHIVO_SALIDA_EXCEL}'...")
-            with pd.ExcelWriter(ARCHIVO_SALIDA_EXCEL, engine='openpyxl', date_format='YYYY-MM-DD', datetime_format='YYYY-MM-DD') as writer:
-                if not df_comisiones.empty:
-                    df_comisiones.to_excel(writer, index=False, sheet_name='Comisiones'); print("[OK] Hoja 'Comisiones' preparada.")
-                else: print("[INFO] No hay datos de comisiones para escribir.")
-                if not df_pagos_detalle.empty:
-                    df_pagos_detalle.to_excel(writer, index=False, sheet_name='Pagos Periodo'); print("[OK] Hoja 'Pagos Periodo' preparada.")
-                else: print("[INFO] No hay datos de detalle de pagos para escribir.")
-            print(f"[OK] Reporte Excel '{ARCHIVO_SALIDA_EXCEL}' guardado exitosamente.")
-        except Exception as e: print(f"\n--- ERROR AL GUARDAR EXCEL ---"); print(f"Error: {e}"); print("Los datos calculados no se pudieron guardar.")
-    else: print("\nNo se generaron datos de comisión ni detalles de pago para guardar.")
-
-    print("\n--- FIN DEL SCRIPT ---")
\ No newline at end of file
+            # 3. Escribir en Excel
+            guardar_excel(ARCHIVO_SALIDA_EXCEL, [('Comisiones', df_comisiones), ('Pagos Periodo', df_pagos_detalle)])
+    except ValueError as e:
+        print(f"\n[ERROR] Reglas de comisión inválidas: {e}"); print("No se genera el reporte."); sys.exit(1)
+
+    print("\n--- FIN DEL SCRIPT ---")
@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+# Guardar como: saldos_cuotas.py
+
+# Saldos de cuotas a una fecha de corte, compartido por reporte_cuotas_pendiente_fechas.py y
+# reporte_cuotas_html_fecha.py. Lo pagado de cada factura hasta la fecha de corte (suma de
+# pago_conciliados.monto_aplicado con fecha_aplicacion <= corte) se reparte en cascada sobre sus
+# cuotas por nro_cuota; se listan las cuotas que quedan con saldo mayor a la tolerancia.
+#   - Motor 'sql': la cascada se calcula en MySQL 8 / MariaDB 10.2+ con una suma acumulada
+#     (SUM() OVER) de monto_cuota por factura; solo viajan las cuotas pendientes.
+#   - Motor 'python': trae todas las cuotas y reparte con saldos_a_fecha(), vectorizado con
+#     pandas sobre centavos enteros (servidores sin funciones de ventana, o datos ya cargados).
+# Con MOTOR_SALDOS = 'auto' se elige según VERSION() del servidor. Ambos motores devuelven un
+# DataFrame con COLUMNAS_REPORTE (montos en float) y los totales en Decimal.
+# Para varias fechas de corte, calcular_cuotas_pendientes_fechas() lee cuotas y conciliaciones
+# una sola vez y recorre las fechas en orden acumulando lo pagado; tabla_antiguedad() y
+# pivote_fechas() resumen los resultados.
+
+import argparse
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+# --- Configuración ---
+TOLERANCIA_PENDIENTE = Decimal('0.01') # Saldo a partir del cual una cuota se considera pendiente
+MOTOR_SALDOS = "auto" # 'auto', 'sql' o 'python'
+
+# Rangos de días vencidos a la fecha de corte para tabla_antiguedad(): {etiqueta: días hasta (incluido)}
+RANGOS_ANTIGUEDAD = {"Por vencer": 0, "1-30 días": 30, "31-60 días": 60, "61-90 días": 90, "Más de 90 días": None}
+SIN_VENDEDOR = "Sin Vendedor"
+
+# Columnas del reporte de cuotas pendientes (mismas en ambos motores)
+COLUMNAS_REPORTE = {
+    'nombre_vendedor': "Vendedor", 'nombre_cliente': "Cliente", 'num_factura': "Factura",
+    'fecha_factura': "Fecha Factura", 'nro_cuota': "Nro Cuota", 'fecha_vencimiento_cuota': "Fecha Vencimiento Cuota",
+    'monto_cuota': "Monto Cuota", 'monto_pagado': "Monto Pagado (a fecha corte)", 'monto_pendiente': "Monto Pendiente (a fecha corte)",
+}
+
+SQL_PAGOS_FACTURA = """
+    SELECT pc.id_factura, SUM(pc.monto_aplicado) AS total_pagado_fecha_corte
+    FROM pago_conciliados pc
+    WHERE pc.fecha_aplicacion <= %(fecha_corte)s
+    GROUP BY pc.id_factura
+"""
+
+# Conciliaciones por factura y día, para recorrer varias fechas de corte con una sola lectura
+SQL_PAGOS_FECHADOS = """
+    SELECT pc.id_factura, pc.fecha_aplicacion, SUM(pc.monto_aplicado) AS monto
+    FROM pago_conciliados pc
+    WHERE pc.fecha_aplicacion <= %(fecha_corte)s
+    GROUP BY pc.id_factura, pc.fecha_aplicacion
+"""
+
+SQL_CUOTAS_INFO = """
+    SELECT
+        c.id AS id_cuota, c.id_factura, c.nro_cuota, c.monto_cuota,
+        c.fecha_vencimiento AS fecha_vencimiento_cuota,
+        f.num_factura, f.fecha_factura, f.id_cliente, f.id_vendedor,
+        cli.nombre AS nombre_cliente, ven.nombre AS nombre_vendedor
+    FROM cuotas c
+    INNER JOIN facturas f ON c.id_factura = f.id
+    LEFT JOIN clientes cli ON f.id_cliente = cli.id
+    LEFT JOIN vendedores ven ON f.id_vendedor = ven.idVendedores
+    ORDER BY c.id_factura, c.nro_cuota, c.id
+"""
+
+# Pagado de la cuota = lo que queda del pago de la factura después de cubrir las cuotas
+# anteriores (acumulado - monto_cuota), limitado a [0, monto_cuota].
+SQL_CUOTAS_PENDIENTES = f"""
+    WITH pagado AS ({SQL_PAGOS_FACTURA}),
+    cascada AS (
+        SELECT
+            c.id AS id_cuota, c.id_factura, c.nro_cuota,
+            GREATEST(COALESCE(c.monto_cuota, 0), 0) AS monto_cuota,
+            c.fecha_vencimiento AS fecha_vencimiento_cuota,
+            SUM(GREATEST(COALESCE(c.monto_cuota, 0), 0)) OVER (
+                PARTITION BY c.id_factura ORDER BY c.nro_cuota, c.id ROWS UNBOUNDED PRECEDING
+            ) AS acumulado,
+            COALESCE(pg.total_pagado_fecha_corte, 0) AS pagado_factura
+        FROM cuotas c
+        INNER JOIN facturas f ON c.id_factura = f.id
+        LEFT JOIN pagado pg ON pg.id_factura = c.id_factura
+    ),
+    saldos AS (
+        SELECT cascada.*,
+               LEAST(monto_cuota, GREATEST(pagado_factura - (acumulado - monto_cuota), 0)) AS monto_pagado
+        FROM cascada
+    )
+    SELECT
+        s.id_factura, s.nro_cuota, s.monto_cuota, s.fecha_vencimiento_cuota, s.monto_pagado,
+        s.monto_cuota - s.monto_pagado AS monto_pendiente,
+        f.num_factura, f.fecha_factura, cli.nombre AS nombre_cliente, ven.nombre AS nombre_vendedor
+    FROM saldos s
+    INNER JOIN facturas f ON s.id_factura = f.id
+    LEFT JOIN clientes cli ON f.id_cliente = cli.id
+    LEFT JOIN vendedores ven ON f.id_vendedor = ven.idVendedores
+    WHERE s.monto_cuota - s.monto_pagado > %(tolerancia)s
+    ORDER BY s.id_factura, s.nro_cuota, s.id_cuota
+"""
+
+# --- Funciones Auxiliares ---
+def leer_fecha_corte(texto):
+    """Fecha AAAA-MM-DD para argparse."""
+    try: return datetime.strptime(texto, "%Y-%m-%d").date()
+    except ValueError: raise argparse.ArgumentTypeError(f"Fecha inválida '{texto}' (formato AAAA-MM-DD).")
+
+def fechas_fin_de_mes(meses, hoy=None):
+    """Últimos `meses` fines de mes ya cerrados antes de `hoy`, del más antiguo al más reciente."""
+    fin = (hoy or date.today()).replace(day=1) - timedelta(days=1)
+    fechas = []
+    for _ in range(meses):
+        fechas.append(fin)
+        fin = fin.replace(day=1) - timedelta(days=1)
+    return fechas[::-1]
+
+def soporta_funciones_ventana(cursor):
+    """True si el servidor admite CTE y funciones de ventana (MySQL 8.0+ / MariaDB 10.2+)."""
+    cursor.execute("SELECT VERSION() AS version")
+    fila = cursor.fetchone()
+    version = fila['version'] if isinstance(fila, dict) else fila[0]
+    try: numeros = tuple(int(parte) for parte in version.split('-')[0].split('.')[:2])
+    except ValueError: return False
+    return numeros >= ((10, 2) if 'mariadb' in version.lower() else (8, 0))
+
+def a_centavos(valores):
+    """Montos (Decimal, float o None, como los entrega el conector) a centavos enteros (int64); None/NaN = 0."""
+    serie = valores if isinstance(valores, pd.Series) else pd.Series(valores, dtype=object)
+    if serie.dtype == object: # Decimal del conector: float() directo es varias veces más rápido que pd.to_numeric
+        montos = np.fromiter((np.nan if valor is None else float(valor) for valor in serie), dtype=float, count=len(serie))
+    else:
+        montos = serie.to_numpy(dtype=float, na_value=np.nan)
+    return np.nan_to_num(montos * 100).round().astype(np.int64)
+
+def saldos_a_fecha(df_cuotas, pagado_por_factura, tolerancia=TOLERANCIA_PENDIENTE):
+    """
+    Reparte en cascada lo pagado de cada factura sobre sus cuotas, sin bucles por fila.
+    `df_cuotas` necesita 'id_factura' y 'monto_cuota' y debe venir ordenado por factura y
+    nro_cuota; `pagado_por_factura` es {id_factura: monto pagado}. Trabaja en centavos enteros:
+    acumulado = suma acumulada de monto_cuota (negativos = 0) dentro de la factura y
+    pagado = min(monto, max(pagado_factura - (acumulado - monto), 0)).
+    Devuelve una copia con 'monto_cuota', 'monto_pagado', 'monto_pendiente' en float y la
+    columna booleana 'pendiente' (saldo mayor que `tolerancia`).
+    """
+    df = df_cuotas.copy()
+    if isinstance(pagado_por_factura, pd.Series): pagado_por_factura = pagado_por_factura.to_dict()
+    if df.empty:
+        for col in ('monto_pagado', 'monto_pendiente'): df[col] = pd.Series(dtype=float)
+        df['pendiente'] = pd.Series(dtype=bool)
+        return df
+    monto = np.maximum(a_centavos(df['monto_cuota']), 0)
+    acumulado = pd.Series(monto, index=df.index).groupby(df['id_factura'].to_numpy()).cumsum().to_numpy()
+    claves = list(pagado_por_factura)
+    pagado_factura = pd.Series(a_centavos([pagado_por_factura[clave] for clave in claves]), index=claves)
+    pagado_factura = df['id_factura'].map(pagado_factura).fillna(0).astype(np.int64).to_numpy()
+    pagado = np.minimum(monto, np.maximum(pagado_factura - (acumulado - monto), 0))
+    pendiente = monto - pagado
+    df['monto_cuota'] = monto / 100
+    df['monto_pagado'] = pagado / 100
+    df['monto_pendiente'] = pendiente / 100
+    df['pendiente'] = pendiente > int(a_centavos([tolerancia])[0])
+    return df
+
+def a_reporte(df):
+    """Renombra a COLUMNAS_REPORTE (en ese orden) y devuelve (df_reporte, totales en Decimal)."""
+    df_reporte = df.reindex(columns=list(COLUMNAS_REPORTE)).rename(columns=COLUMNAS_REPORTE).reset_index(drop=True)
+    totales = {'num_cuotas': len(df_reporte)}
+    for clave, col in (('total_monto_cuota', 'monto_cuota'), ('total_monto_pagado', 'monto_pagado'), ('total_monto_pendiente', 'monto_pendiente')):
+        totales[clave] = Decimal(int(a_centavos(df[col]).sum())) / 100 if len(df) else Decimal('0.0')
+    return df_reporte, totales
+
+def pendientes_sql(cursor, fecha_corte):
+    """Cuotas pendientes calculadas en el servidor con funciones de ventana."""
+    print(f"[DB] Calculando saldos de cuotas al {fecha_corte} en el servidor (funciones de ventana)...")
+    cursor.execute(SQL_CUOTAS_PENDIENTES, {'fecha_corte': fecha_corte, 'tolerancia': TOLERANCIA_PENDIENTE})
+    df = pd.DataFrame(cursor.fetchall(), columns=['id_factura', 'nro_cuota', 'monto_cuota', 'fecha_vencimiento_cuota', 'monto_pagado',
+                                                 'monto_pendiente', 'num_factura', 'fecha_factura', 'nombre_cliente', 'nombre_vendedor'])
+    for col in ('monto_cuota', 'monto_pagado', 'monto_pendiente'): df[col] = a_centavos(df[col]) / 100
+    return df
+
+def pendientes_python(cursor, fecha_corte):
+    """Cuotas pendientes repartiendo los pagos en Python (para servidores sin funciones de ventana)."""
+    print(f"[DB] Obteniendo pagos conciliados hasta {fecha_corte}...")
+    cursor.execute(SQL_PAGOS_FACTURA, {'fecha_corte': fecha_corte})
+    pagos_por_factura = {p['id_factura']: p['total_pagado_fecha_corte'] for p in cursor.fetchall()}
+    print(f"[INFO] {len(pagos_por_factura)} facturas con pagos encontrados hasta la fecha.")
+
+    print("[DB] Obteniendo definiciones de cuotas y datos relacionados...")
+    cursor.execute(SQL_CUOTAS_INFO)
+    todas_las_cuotas = cursor.fetchall()
+    print(f"[INFO] {len(todas_las_cuotas)} registros de cuotas encontrados en total.")
+
+    print("[INFO] Calculando saldos de cuotas a la fecha de corte...")
+    df = saldos_a_fecha(pd.DataFrame(todas_las_cuotas), pagos_por_factura)
+    return df[df['pendiente']]
+
+# --- Lógica Principal ---
+def calcular_cuotas_pendientes(cursor, fecha_corte, motor=MOTOR_SALDOS):
+    """
+    Devuelve (df, totales) de las cuotas con saldo pendiente a `fecha_corte`: df con
+    COLUMNAS_REPORTE (montos en float) y totales = {'num_cuotas', 'total_monto_cuota',
+    'total_monto_pagado', 'total_monto_pendiente'} en Decimal.
+    `cursor` debe ser dictionary=True. `motor`: 'sql', 'python' o 'auto' (según el servidor).
+    """
+    if motor == "auto":
+        motor = "sql" if soporta_funciones_ventana(cursor) else "python"
+        if motor == "python": print("[WARN] El servidor no soporta funciones de ventana. Se calcula en Python.")
+    if motor == "sql": df = pendientes_sql(cursor, fecha_corte)
+    elif motor == "python": df = pendientes_python(cursor, fecha_corte)
+    else: raise ValueError(f"Motor de saldos desconocido: '{motor}' (use 'auto', 'sql' o 'python').")
+
+    df_reporte, totales = a_reporte(df)
+    print(f"[INFO] Cálculo de saldos completado ({motor}): {totales['num_cuotas']} cuotas pendientes.")
+    return df_reporte, totales
+
+def calcular_cuotas_pendientes_fechas(cursor, fechas_corte):
+    """
+    {fecha_corte: (df, totales)} como calcular_cuotas_pendientes() para varias fechas, con una
+    sola lectura de cuotas y de conciliaciones (hasta la fecha mayor). Las fechas se recorren en
+    orden y lo pagado por factura se acumula en centavos con las conciliaciones de cada tramo.
+    """
+    fechas = sorted(set(fechas_corte))
+    print(f"[DB] Obteniendo conciliaciones hasta {fechas[-1]} ({len(fechas)} fechas de corte)...")
+    cursor.execute(SQL_PAGOS_FECHADOS, {'fecha_corte': fechas[-1]})
+    pagos = pd.DataFrame(cursor.fetchall(), columns=['id_factura', 'fecha_aplicacion', 'monto'])
+    pagos['monto'] = a_centavos(pagos['monto'])
+    pagos['fecha_aplicacion'] = pd.to_datetime(pagos['fecha_aplicacion'])
+    pagos = pagos.sort_values('fecha_aplicacion', kind='stable').reset_index(drop=True)
+    print(f"[INFO] {len(pagos)} registros de conciliación (por factura y día).")
+
+    print("[DB] Obteniendo definiciones de cuotas y datos relacionados...")
+    cursor.execute(SQL_CUOTAS_INFO)
+    df_cuotas = pd.DataFrame(cursor.fetchall())
+    print(f"[INFO] {len(df_cuotas)} registros de cuotas encontrados en total.")
+
+    # Misma comparación que MySQL: una fecha DATE equivale a las 00:00:00 de ese día
+    limites = pagos['fecha_aplicacion'].searchsorted(pd.to_datetime(fechas), side='right')
+    pagado = pd.Series(dtype=np.int64) # Centavos pagados por factura hasta la fecha en curso
+    resultados, desde = {}, 0
+    for fecha_corte, hasta in zip(fechas, limites):
+        tramo = pagos.iloc[desde:hasta]
+        if not tramo.empty: pagado = pagado.add(tramo.groupby('id_factura')['monto'].sum(), fill_value=0)
+        desde = hasta
+        df = saldos_a_fecha(df_cuotas, pagado / 100)
+        resultados[fecha_corte] = a_reporte(df[df['pendiente']])
+        print(f"[INFO] {fecha_corte}: {resultados[fecha_corte][1]['num_cuotas']} cuotas pendientes.")
+    return resultados
+
+def tabla_antiguedad(df_reporte, fecha_corte):
+    """
+    Saldo pendiente por vendedor (filas) y rango de días vencidos a `fecha_corte` (columnas de
+    RANGOS_ANTIGUEDAD, más 'Sin Vencimiento' si hace falta), con columna y fila 'Total'.
+    """
+    if df_reporte.empty: return pd.DataFrame()
+    dias = (pd.Timestamp(fecha_corte) - pd.to_datetime(df_reporte["Fecha Vencimiento Cuota"])).dt.days
+    limites = [-np.inf] + [hasta for hasta in RANGOS_ANTIGUEDAD.values() if hasta is not None] + [np.inf]
+    rango = pd.cut(dias, bins=limites, labels=list(RANGOS_ANTIGUEDAD))
+    if rango.isna().any(): rango = rango.cat.add_categories("Sin Vencimiento").fillna("Sin Vencimiento")
+    tabla = pd.DataFrame({"Vendedor": df_reporte["Vendedor"].fillna(SIN_VENDEDOR), "Rango": rango,
+                          "Pendiente": df_reporte["Monto Pendiente (a fecha corte)"]})
+    tabla = tabla.pivot_table(index="Vendedor", columns="Rango", values="Pendiente", aggfunc="sum", fill_value=0, observed=False)
+    tabla.columns = [str(col) for col in tabla.columns]
+    tabla["Total"] = tabla.sum(axis=1)
+    tabla.loc["Total"] = tabla.sum()
+    return tabla.round(2)
+
+def pivote_fechas(resultados):
+    """Saldo pendiente por vendedor (filas) y fecha de corte (columnas) a partir de calcular_cuotas_pendientes_fechas()."""
+    columnas = {}
+    for fecha_corte, (df_reporte, _) in sorted(resultados.items()):
+        columnas[fecha_corte.strftime("%Y-%m-%d")] = (df_reporte.assign(Vendedor=df_reporte["Vendedor"].fillna(SIN_VENDEDOR))
+                                                       .groupby("Vendedor")["Monto Pendiente (a fecha corte)"].sum())
+    pivote = pd.DataFrame(columnas).fillna(0)
+    pivote.loc["Total"] = pivote.sum()
+    return pivote.round(2)